@@ -0,0 +1,40 @@
+"""Add codec for converted Slices
+
+Revision ID: a3c8f1d2b7e4
+Revises: 5e3f98d24b75
+Create Date: 2026-10-18 09:12:43.518204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import ENUM
+
+from medtagger.storage import create_session
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3c8f1d2b7e4'
+down_revision = '5e3f98d24b75'
+branch_labels = None
+depends_on = None
+
+session = create_session()
+slice_codec_enum = ENUM('PNG', 'WEBP', 'RAW_ZLIB', name='slicecodec', create_type=False)
+
+
+def upgrade():
+    slice_codec_enum.create(op.get_bind(), checkfirst=False)
+    op.add_column('Datasets', sa.Column('slices_codec', slice_codec_enum, server_default='PNG', nullable=False))
+    op.add_column('Datasets', sa.Column('slices_compression_level', sa.Integer(), nullable=True))
+
+    session.set_keyspace('medtagger')
+    session.execute('ALTER TABLE processed_slices ADD codec text')
+
+
+def downgrade():
+    session.set_keyspace('medtagger')
+    session.execute('ALTER TABLE processed_slices DROP codec')
+
+    op.drop_column('Datasets', 'slices_compression_level')
+    op.drop_column('Datasets', 'slices_codec')
+    slice_codec_enum.drop(op.get_bind(), checkfirst=False)
@@ -0,0 +1,29 @@
+"""Add random key for Scans
+
+Revision ID: a3e7c1f9b5d2
+Revises: f2c6a8e4d1b9
+Create Date: 2026-10-18 21:12:43.518206
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3e7c1f9b5d2'
+down_revision = 'f2c6a8e4d1b9'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Volatile default is evaluated for each existing row, so all Scans get their own random keys
+    op.add_column('Scans', sa.Column('random_key', sa.Float(), nullable=False, server_default=sa.text('random()')))
+    op.create_index('ix_Scans_status_random_key', 'Scans', ['status', 'random_key'], unique=False)
+    op.create_index('ix_Labels_scan_id_owner_id_task_id', 'Labels', ['scan_id', 'owner_id', 'task_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_Labels_scan_id_owner_id_task_id', table_name='Labels')
+    op.drop_index('ix_Scans_status_random_key', table_name='Scans')
+    op.drop_column('Scans', 'random_key')
@@ -0,0 +1,34 @@
+"""Add chunks and tiles for Slices' images
+
+Revision ID: c7d2e9a4f1b3
+Revises: a3c8f1d2b7e4
+Create Date: 2026-10-18 14:27:05.913482
+
+"""
+from medtagger.storage import create_session
+
+
+# revision identifiers, used by Alembic.
+revision = 'c7d2e9a4f1b3'
+down_revision = 'a3c8f1d2b7e4'
+branch_labels = None
+depends_on = None
+
+session = create_session()
+new_tables = ('original_slices_chunks', 'processed_slices_chunks', 'processed_slices_tiles')
+
+
+def upgrade():
+    session.set_keyspace('medtagger')
+    session.execute('ALTER TABLE original_slices ADD chunks int')
+    session.execute('ALTER TABLE processed_slices ADD (chunks int, tile_size int)')
+    for table in new_tables:
+        session.execute('CREATE TABLE IF NOT EXISTS {} (id text PRIMARY KEY, image blob)'.format(table))
+
+
+def downgrade():
+    session.set_keyspace('medtagger')
+    for table in new_tables:
+        session.execute('DROP TABLE IF EXISTS {}'.format(table))
+    session.execute('ALTER TABLE processed_slices DROP (chunks, tile_size)')
+    session.execute('ALTER TABLE original_slices DROP chunks')
@@ -0,0 +1,28 @@
+"""Add previews for processed Slices
+
+Revision ID: d4b8f2c6e0a7
+Revises: c7d2e9a4f1b3
+Create Date: 2026-10-18 16:03:41.270158
+
+"""
+from medtagger.storage import create_session
+
+
+# revision identifiers, used by Alembic.
+revision = 'd4b8f2c6e0a7'
+down_revision = 'c7d2e9a4f1b3'
+branch_labels = None
+depends_on = None
+
+session = create_session()
+
+
+def upgrade():
+    session.set_keyspace('medtagger')
+    session.execute('CREATE TABLE IF NOT EXISTS processed_slices_previews (id text PRIMARY KEY, image blob, '
+                    'codec text)')
+
+
+def downgrade():
+    session.set_keyspace('medtagger')
+    session.execute('DROP TABLE IF EXISTS processed_slices_previews')
@@ -0,0 +1,29 @@
+"""Add packed volumes for Scans
+
+Revision ID: e9a1c5d3b7f2
+Revises: d4b8f2c6e0a7
+Create Date: 2026-10-18 17:41:12.604839
+
+"""
+from medtagger.storage import create_session
+
+
+# revision identifiers, used by Alembic.
+revision = 'e9a1c5d3b7f2'
+down_revision = 'd4b8f2c6e0a7'
+branch_labels = None
+depends_on = None
+
+session = create_session()
+
+
+def upgrade():
+    session.set_keyspace('medtagger')
+    session.execute('CREATE TABLE IF NOT EXISTS scan_volumes (id text PRIMARY KEY, size bigint, chunk_size int)')
+    session.execute('CREATE TABLE IF NOT EXISTS scan_volumes_chunks (id text PRIMARY KEY, image blob)')
+
+
+def downgrade():
+    session.set_keyspace('medtagger')
+    session.execute('DROP TABLE IF EXISTS scan_volumes_chunks')
+    session.execute('DROP TABLE IF EXISTS scan_volumes')
@@ -0,0 +1,24 @@
+"""Add index for ordered Slices
+
+Revision ID: f2c6a8e4d1b9
+Revises: e9a1c5d3b7f2
+Create Date: 2026-10-18 19:05:27.881614
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2c6a8e4d1b9'
+down_revision = 'e9a1c5d3b7f2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_Slices_scan_id_orientation_location', 'Slices', ['scan_id', 'orientation', 'location'],
+                    unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_Slices_scan_id_orientation_location', table_name='Slices')
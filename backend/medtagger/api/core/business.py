@@ -1,5 +1,19 @@
 """Module responsible for business logic in all Core endpoint."""
-from typing import Dict
+import logging
+from typing import Any, Dict, List
+
+from medtagger import config, database, storage
+from medtagger.health import HealthCheck
+from medtagger.repositories import labels as LabelsRepository
+
+logger = logging.getLogger(__name__)
+
+configuration = config.AppConfiguration()
+health_check_ttl = configuration.getint('api', 'health_check_ttl', fallback=5)
+health_checks: List[HealthCheck] = [
+    HealthCheck('database', database.is_alive, ttl=health_check_ttl),
+    HealthCheck('storage', storage.is_alive, ttl=health_check_ttl),
+]
 
 
 def success() -> Dict[str, bool]:
@@ -10,3 +24,40 @@ def success() -> Dict[str, bool]:
     return {
         'success': True,
     }
+
+
+def get_health() -> Dict[str, Any]:
+    """Return health of all services that MedTagger depends on.
+
+    :return: dictionary with key 'healthy' and status of each service (with percentiles of its latency)
+    """
+    health: Dict[str, Any] = {health_check.name: health_check.get_status() for health_check in health_checks}
+    health['healthy'] = all(health[health_check.name]['alive'] for health_check in health_checks)
+    return health
+
+
+def warm_up_labeled_scans_cache() -> Dict[str, int]:
+    """Load Scans labeled by all Users into the cache of this process.
+
+    :return: dictionary with number of cached entries
+    """
+    entries = LabelsRepository.warm_up_labeled_scans_cache()
+    logger.info('Labeled Scans cache was warmed up with %d entries.', entries)
+    return {
+        'entries': entries,
+        'inconsistent_entries': 0,
+    }
+
+
+def check_labeled_scans_cache() -> Dict[str, int]:
+    """Check if Scans labeled by Users, cached in this process, are consistent with Labels in database.
+
+    :return: dictionary with number of checked entries and number of inconsistent ones (which were invalidated)
+    """
+    entries, inconsistent_keys = LabelsRepository.check_labeled_scans_cache()
+    for user_id, task_id in inconsistent_keys:
+        logger.warning('Cached Scans labeled by User %s in Task %s were inconsistent.', user_id, task_id)
+    return {
+        'entries': entries,
+        'inconsistent_entries': len(inconsistent_keys),
+    }
@@ -7,3 +7,25 @@ from medtagger.api import api
 out__status = api.model('Status model', {
     'success': fields.Boolean(description='Should be True if everything is all right.'),
 })
+
+out__latency = api.model('Latency model', {
+    'p50': fields.Float(description='Median latency of health checks (in milliseconds)'),
+    'p90': fields.Float(description='90th percentile of latency of health checks (in milliseconds)'),
+    'p99': fields.Float(description='99th percentile of latency of health checks (in milliseconds)'),
+})
+
+out__service_health = api.model('Service health model', {
+    'alive': fields.Boolean(description='Should be True if service responded to the last health check.'),
+    'latency': fields.Nested(out__latency),
+})
+
+out__health = api.model('Health model', {
+    'healthy': fields.Boolean(description='Should be True if all services are alive.'),
+    'database': fields.Nested(out__service_health),
+    'storage': fields.Nested(out__service_health),
+})
+
+out__labeled_scans_cache = api.model('Labeled Scans cache model', {
+    'entries': fields.Integer(description='Number of cached Users\' Scans (for each User and Task).'),
+    'inconsistent_entries': fields.Integer(description='Number of entries that did not match Labels in database.'),
+})
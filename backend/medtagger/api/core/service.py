@@ -23,6 +23,53 @@ class Status(Resource):
         return business.success()
 
 
+@core_ns.route('/health')
+class Health(Resource):
+    """Health endpoint that checks if all services used by API are alive."""
+
+    @staticmethod
+    @core_ns.marshal_with(serializers.out__health)
+    @core_ns.doc(description='Checks if database and storage are alive. Results are cached for a few seconds.')
+    @core_ns.doc(responses={200: 'All services are alive', 503: 'Some of the services are not available'})
+    def get() -> Any:
+        """Return health of all services used by API."""
+        health = business.get_health()
+        return health, 200 if health['healthy'] else 503
+
+
+@core_ns.route('/labeled-scans-cache')
+class LabeledScansCache(Resource):
+    """Endpoint that manages cache of Scans labeled by Users.
+
+    NOTE: Cache is kept separately by each API process, so these operations affect only the single (random) process
+          that handles the request. Other processes keep their own entries, which only pre-filter Scans for Users.
+    """
+
+    @staticmethod
+    @login_required
+    @role_required('admin')
+    @core_ns.marshal_with(serializers.out__labeled_scans_cache)
+    @core_ns.doc(security='token')
+    @core_ns.doc(description='Checks if cached Scans labeled by Users match Labels (inconsistent ones are dropped). '
+                             'Affects only the API process that handles the request.')
+    @core_ns.doc(responses={200: 'Success'})
+    def get() -> Any:
+        """Check consistency of cached Scans labeled by Users."""
+        return business.check_labeled_scans_cache()
+
+    @staticmethod
+    @login_required
+    @role_required('admin')
+    @core_ns.marshal_with(serializers.out__labeled_scans_cache)
+    @core_ns.doc(security='token')
+    @core_ns.doc(description='Loads Scans labeled by all Users into the cache. '
+                             'Affects only the API process that handles the request.')
+    @core_ns.doc(responses={200: 'Success'})
+    def post() -> Any:
+        """Warm up cache of Scans labeled by Users."""
+        return business.warm_up_labeled_scans_cache()
+
+
 @core_ns.route('/check-authentication')
 class CheckAuthentication(Resource):
     """Endpoint gives the possibility to check authorization mechanism."""
@@ -1,7 +1,8 @@
 """Module responsible for business logic in all Scans endpoints."""
 import io
 import logging
-from typing import Callable, Iterable, Dict, List, Tuple, Any
+from itertools import islice
+from typing import Callable, Iterable, Iterator, Dict, List, Optional, Tuple, Any
 
 from cassandra import WriteTimeout
 from sqlalchemy.exc import IntegrityError
@@ -10,9 +11,10 @@ from PIL import Image
 
 from medtagger.api.utils import get_current_user
 from medtagger.api.exceptions import NotFoundException, InvalidArgumentsException
+from medtagger.api.scans.schedulers import scan_scheduler
 from medtagger.exceptions import InternalErrorException
-from medtagger.database.models import Scan, Slice, Label, LabelTag, SliceOrientation, BrushLabelElement
-from medtagger.definitions import LabelTool
+from medtagger.database.models import Scan, Slice, Label, LabelTag, SliceOrientation
+from medtagger.definitions import LabelTool, SliceCodec
 from medtagger.repositories import (
     labels as LabelsRepository,
     label_tags as LabelTagsRepository,
@@ -21,12 +23,16 @@ from medtagger.repositories import (
     datasets as DatasetsRepository,
     tasks as TasksRepository,
 )
-from medtagger.storage.models import BrushLabelElement as StorageBrushLabelElement
-from medtagger.workers.storage import parse_dicom_and_update_slice
-from medtagger.types import ScanID, LabelPosition, LabelShape, LabelingTime, LabelID, Point
+from medtagger.storage.models import ProcessedSlice, ProcessedSliceTile, ScanVolume
+from medtagger.storage.volumes import VolumeInfo
+from medtagger.workers.storage import schedule_slices_parsing, parse_dicoms_and_update_slices
+from medtagger.types import ScanID, SliceID, LabelPosition, LabelShape, LabelingTime, LabelID, Point, \
+    UploadedSlice, TilePosition, PredefinedBrushLabelElement
 
 logger = logging.getLogger(__name__)
 
+SLICES_UPLOAD_CHUNK_SIZE = 50
+
 LabelElementHandler = Callable[[Dict[str, Any], LabelID, Dict[str, bytes]], None]
 
 
@@ -66,7 +72,8 @@ def get_random_scan(task_key: str) -> Scan:
         raise InvalidArgumentsException('Task key {} is invalid!'.format(task_key))
 
     user = get_current_user()
-    scan = ScansRepository.get_random_scan(task, user)
+    labeled_scans_ids = LabelsRepository.get_labeled_scans_ids(user.id, task.id)
+    scan = scan_scheduler.get_next_scan(task, user, labeled_scans_ids)
     if not scan:
         raise NotFoundException('Could not find any Scan for this task!')
 
@@ -77,36 +84,103 @@ def get_random_scan(task_key: str) -> Scan:
     return scan
 
 
-def get_slices_for_scan(scan_id: ScanID, begin: int, count: int,
-                        orientation: SliceOrientation = SliceOrientation.Z) -> Iterable[Tuple[Slice, bytes]]:
+def get_slices_for_scan(scan_id: ScanID, begin: int, count: int,  # pylint: disable=too-many-arguments
+                        orientation: SliceOrientation = SliceOrientation.Z, resolution: Optional[int] = None,
+                        reversed_order: bool = False) -> Iterable[Tuple[int, bytes, SliceCodec]]:
     """Fetch multiple slices for given Scan.
 
+    All images are fetched concurrently, but they are returned one by one (in order) as soon as they arrive.
+
     :param scan_id: ID of a given Scan
     :param begin: first Slice index (included)
     :param count: number of Slices that will be returned
     :param orientation: orientation for Slices (by default set to Z axis)
-    :return: generator for Slices and its images
+    :param resolution: (optional) resolution of previews that should be returned instead of full images
+    :param reversed_order: (optional) return Slices in reversed order (starting with the last one)
+    :return: generator for Slices' indices, their images and codecs used to encode them
     """
-    slices = SlicesRepository.get_slices_by_scan_id(scan_id, orientation=orientation)
-    for _slice in slices[begin:begin + count]:
-        image = SlicesRepository.get_slice_converted_image(_slice.id)
-        yield _slice, image
+    slices_ids = SlicesRepository.get_ordered_slices_ids(scan_id, orientation=orientation)[begin:begin + count]
+    indices = range(begin, begin + len(slices_ids))
+    if reversed_order:
+        slices_ids, indices = slices_ids[::-1], indices[::-1]
+    images = SlicesRepository.iterate_slices_converted_images_with_codec(slices_ids, resolution=resolution)
+    for index, (image, codec) in zip(indices, images):
+        yield index, image, codec
+
 
+def count_slices_for_scan(scan_id: ScanID, orientation: SliceOrientation = SliceOrientation.Z) -> int:
+    """Return number of Slices in given Scan and orientation.
 
-def get_predefined_brush_label_elements(scan_id: ScanID, task_id: int,
-                                        begin: int, count: int) -> Iterable[Tuple[BrushLabelElement, bytes]]:
+    :param scan_id: ID of a given Scan
+    :param orientation: orientation for Slices (by default set to Z axis)
+    :return: number of Slices
+    """
+    return len(SlicesRepository.get_ordered_slices_ids(scan_id, orientation=orientation))
+
+
+def get_slice_tile(scan_id: ScanID, slice_id: SliceID, position: TilePosition) -> Tuple[bytes, SliceCodec]:
+    """Fetch a single tile of converted Slice's image.
+
+    :param scan_id: ID of a Scan to which Slice belongs
+    :param slice_id: ID of a Slice
+    :param position: row & column of a tile
+    :return: tuple with encoded tile and codec that was used to encode it
+    """
+    _get_slice_in_scan(scan_id, slice_id)
+    try:
+        return SlicesRepository.get_slice_converted_tile(slice_id, position)
+    except (ProcessedSlice.DoesNotExist, ProcessedSliceTile.DoesNotExist):
+        raise NotFoundException('Tile {} of Slice "{}" not found.'.format(tuple(position), slice_id))
+
+
+def _get_slice_in_scan(scan_id: ScanID, slice_id: SliceID) -> Slice:
+    """Return Slice for given slice_id only if it belongs to given Scan."""
+    try:
+        _slice = SlicesRepository.get_slice_by_id(slice_id)
+    except NoResultFound:
+        raise NotFoundException('Slice "{}" not found.'.format(slice_id))
+    if _slice.scan_id != scan_id:
+        raise NotFoundException('Slice "{}" not found in Scan "{}".'.format(slice_id, scan_id))
+    return _slice
+
+
+def get_packed_volume_info(scan_id: ScanID) -> VolumeInfo:
+    """Return information (e.g. size) about packed volume with all Slices of given Scan.
+
+    :param scan_id: ID of a given Scan
+    :return: information about packed volume
+    """
+    get_scan(scan_id)
+    try:
+        return ScansRepository.get_packed_volume_info(scan_id)
+    except ScanVolume.DoesNotExist:
+        raise NotFoundException('Packed volume for Scan "{}" not found.'.format(scan_id))
+
+
+def iterate_packed_volume(scan_id: ScanID, info: VolumeInfo, start: int, stop: int) -> Iterator[bytes]:
+    """Fetch given range of bytes from packed volume of given Scan lazily.
+
+    :param scan_id: ID of a given Scan
+    :param info: information about packed volume (see `get_packed_volume_info()`)
+    :param start: index of the first byte (included)
+    :param stop: index of the last byte (excluded)
+    :return: generator of consecutive parts of given range
+    """
+    return ScansRepository.iterate_packed_volume(scan_id, info, start, stop)
+
+
+def get_predefined_brush_label_elements(scan_id: ScanID, task_key: str,
+                                        begin: int, count: int) -> List[PredefinedBrushLabelElement]:
     """Fetch Predefined Brush Label Elements for given Scan and Task.
 
     :param scan_id: ID of a given Scan
-    :param task_id: ID of a given Task
+    :param task_key: key of a given Task
     :param begin: first Slice index
     :param count: number of Slices for which Label Elements will be returned
-    :return: generator for Brush Label Elements and its images
+    :return: list of Brush Label Elements (with their images) ordered by their Slice index
     """
-    label_elements = LabelsRepository.get_predefined_brush_label_elements(scan_id, task_id, begin, count)
-    for label_element in label_elements:
-        storage_brush_label_element = StorageBrushLabelElement.get(id=label_element.id)
-        yield label_element, storage_brush_label_element.image
+    label_elements = LabelsRepository.get_predefined_brush_label_elements(scan_id, task_key)
+    return [label_element for label_element in label_elements if begin <= label_element.slice_index < begin + count]
 
 
 def validate_label_payload(label: Dict, task_key: str, files: Dict[str, bytes]) -> None:
@@ -179,6 +253,9 @@ def add_label(scan_id: ScanID, task_key: str, elements: List[Dict],   # pylint:
         raise NotFoundException('Could not find Scan for that id!')
     for element in elements:
         add_label_element(element, label.id, files)
+    if not is_predefined:
+        LabelsRepository.mark_scan_as_labeled(user.id, label.task_id, scan_id)
+        scan_scheduler.on_label_added(label.task_id, scan_id)
     return label
 
 
@@ -273,10 +350,56 @@ def add_new_slice(scan_id: ScanID, image: bytes) -> Slice:
     except WriteTimeout:
         SlicesRepository.delete_slice(_slice)
         raise InternalErrorException('Timeout during saving original image to the Storage.')
-    parse_dicom_and_update_slice.delay(_slice.id)
+
+    number_of_slices = SlicesRepository.count_slices_by_scan_id(scan_id)
+    schedule_slices_parsing(scan_id, number_of_slices, scan.declared_number_of_slices)
     return _slice
 
 
+def add_new_slices(scan_id: ScanID, images: Iterable[Tuple[str, bytes]]) -> List[UploadedSlice]:
+    """Add multiple new Slices for given Scan.
+
+    Images are consumed in chunks, so that only a single chunk of them is kept in memory at once.
+
+    :param scan_id: ID of a Scan for which it should add new slices
+    :param images: iterable of file names and bytes representing DICOM images
+    :return: list of results for each uploaded file
+    """
+    scan = get_scan(scan_id)
+    images = iter(images)
+    uploaded_slices: List[UploadedSlice] = []
+    chunk = list(islice(images, SLICES_UPLOAD_CHUNK_SIZE))
+    while chunk:
+        uploaded_slices.extend(_add_new_slices_chunk(scan, chunk))
+        chunk = list(islice(images, SLICES_UPLOAD_CHUNK_SIZE))
+
+    if any(uploaded_slice.slice_id for uploaded_slice in uploaded_slices):
+        parse_dicoms_and_update_slices.delay(scan_id)
+    return uploaded_slices
+
+
+def _add_new_slices_chunk(scan: Scan, images: List[Tuple[str, bytes]]) -> List[UploadedSlice]:
+    """Add new Slices for a single chunk of uploaded images.
+
+    :param scan: Scan object for which it should add new slices
+    :param images: list of file names and bytes representing DICOM images
+    :return: list of results for each uploaded file
+    """
+    new_slices_ids = scan.add_slices(len(images))
+    failed_slices_ids = SlicesRepository.store_original_images({
+        slice_id: image for slice_id, (_, image) in zip(new_slices_ids, images)
+    })
+
+    uploaded_slices = []
+    for slice_id, (file_name, _) in zip(new_slices_ids, images):
+        if slice_id in failed_slices_ids:
+            SlicesRepository.delete_slice(SlicesRepository.get_slice_by_id(slice_id))
+            uploaded_slices.append(UploadedSlice(file_name, None, 'Could not save original image to the Storage.'))
+        else:
+            uploaded_slices.append(UploadedSlice(file_name, slice_id, None))
+    return uploaded_slices
+
+
 def get_paginated_scans(dataset_key: str = None, page: int = 1, per_page: int = 25) -> Tuple[List[Scan], int]:
     """Get paginated Scans for given filters.
 
@@ -308,4 +431,5 @@ def skip_scan(scan_id: ScanID) -> bool:
     """
     if not ScansRepository.increase_skip_count_of_a_scan(scan_id):
         raise NotFoundException('Scan "{}" not found.'.format(scan_id))
+    scan_scheduler.on_scan_skipped(scan_id)
     return True
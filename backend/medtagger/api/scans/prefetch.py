@@ -0,0 +1,149 @@
+"""Module responsible for prefetching Slices for WebSocket connections.
+
+Labelers scroll through a Scan in a predictable direction, so once a window of Slices was requested, the next
+window in the same direction is fetched in background (in a greenlet) and kept in a bounded cache of given
+connection. This way, the following request is served from memory. Requested Slices are sent straight from storage
+and never cached, so that they do not push out the window being prefetched at the same time.
+"""
+import logging
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+import gevent
+from gevent import Greenlet
+
+from medtagger.api.scans import business
+from medtagger.config import AppConfiguration
+from medtagger.database import Session
+from medtagger.definitions import SliceCodec, SliceOrientation
+from medtagger.types import ScanID
+
+logger = logging.getLogger(__name__)
+
+configuration = AppConfiguration()
+# By default, only a single prefetched window of the biggest size is kept, as each connection keeps its own Slices
+PREFETCH_CACHE_SIZE = configuration.getint('api', 'websocket_prefetch_cache_size', fallback=25)
+
+SliceKey = NamedTuple('SliceKey', [
+    ('scan_id', ScanID),
+    ('orientation', SliceOrientation),
+    ('resolution', Optional[int]),
+    ('index', int),
+])
+SliceWindow = NamedTuple('SliceWindow', [
+    ('scan_id', ScanID),
+    ('begin', int),
+    ('count', int),
+    ('orientation', SliceOrientation),
+    ('resolution', Optional[int]),
+])
+
+# Number of Slices served from cache (hits) or fetched on request (misses) for all connections of this process
+statistics = {'hits': 0, 'misses': 0}
+
+
+class SlicesPrefetcher:
+    """Cache of Slices for a single WebSocket connection, which is filled ahead of User's requests."""
+
+    def __init__(self, max_size: int = PREFETCH_CACHE_SIZE) -> None:
+        """Initialize Slices Prefetcher.
+
+        :param max_size: maximum number of cached Slices (prefetching is disabled if set to 0)
+        """
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._slices: Dict[SliceKey, Tuple[bytes, SliceCodec]] = {}  # Ordered from the oldest one
+        self._pending_prefetch: Optional[Greenlet] = None
+
+    def get_slices(self, window: SliceWindow, reversed_order: bool = False) -> Iterator[Tuple[int, bytes, SliceCodec]]:
+        """Return Slices in given window, fetching only the ones which were not prefetched.
+
+        Missing Slices are fetched concurrently and returned as soon as they arrive (in order), so that the first
+        Slice does not wait for the whole window.
+
+        :param window: window of Slices requested by the User
+        :param reversed_order: (optional) return Slices in reversed order (starting with the last one)
+        :return: generator of Slices' indices, their images and codecs used to encode them
+        """
+        if self._pending_prefetch:
+            self._pending_prefetch.join()
+
+        keys = _get_keys(window)[::-1] if reversed_order else _get_keys(window)
+        cached_slices = {key: self._slices[key] for key in keys if key in self._slices}
+        missing_keys = [key for key in keys if key not in cached_slices]
+        self._update_statistics(hits=len(cached_slices), misses=len(missing_keys))
+        return _merge_slices(keys, cached_slices, self._fetch(missing_keys, reversed_order))
+
+    def prefetch_next_window(self, window: SliceWindow, reversed_order: bool = False) -> None:
+        """Start fetching the window which will be probably requested after given one (in background).
+
+        :param window: window of Slices that was requested by the User
+        :param reversed_order: (optional) User scrolls through the Scan in reversed order
+        """
+        begin = max(0, window.begin - window.count) if reversed_order else window.begin + window.count
+        next_window = window._replace(begin=begin, count=min(window.count, abs(window.begin - begin)))
+        missing_keys = [key for key in _get_keys(next_window) if key not in self._slices]
+        if self.max_size and missing_keys:
+            self._pending_prefetch = gevent.spawn(self._prefetch, missing_keys)
+
+    def close(self) -> None:
+        """Stop pending prefetch and drop all cached Slices."""
+        if self._pending_prefetch:
+            self._pending_prefetch.kill(block=False)
+        self._slices.clear()
+
+    def _prefetch(self, keys: List[SliceKey]) -> None:
+        """Fetch given Slices into cache (runs in a separate greenlet)."""
+        try:
+            for _ in self._fetch(keys, cache=True):
+                pass
+            for oldest_key in list(self._slices)[:max(len(self._slices) - self.max_size, 0)]:
+                del self._slices[oldest_key]
+        except Exception:  # pylint: disable=broad-except;  Prefetch is optional, request will fetch Slices again
+            logger.exception('Could not prefetch Slices.')
+        finally:
+            Session.remove()  # Each greenlet has its own SQL Session
+
+    def _fetch(self, keys: List[SliceKey], reversed_order: bool = False,
+               cache: bool = False) -> Iterator[Tuple[SliceKey, bytes, SliceCodec]]:
+        """Fetch Slices for given keys (in a single window), storing them in cache as they arrive if requested."""
+        if not keys:
+            return
+        first_key = min(keys, key=lambda key: key.index)
+        count = max(key.index for key in keys) - first_key.index + 1
+        slices = business.get_slices_for_scan(first_key.scan_id, first_key.index, count,
+                                              orientation=first_key.orientation, resolution=first_key.resolution,
+                                              reversed_order=reversed_order)
+        requested_keys = set(keys)
+        for index, image, codec in slices:
+            key = first_key._replace(index=index)
+            if cache:
+                self._slices[key] = (image, codec)
+            if key in requested_keys:
+                yield key, image, codec
+
+    def _update_statistics(self, hits: int, misses: int) -> None:
+        """Count Slices served from cache and fetched on request."""
+        self.hits += hits
+        self.misses += misses
+        statistics['hits'] += hits
+        statistics['misses'] += misses
+
+
+def _get_keys(window: SliceWindow) -> List[SliceKey]:
+    """Return keys of all Slices in given window."""
+    return [SliceKey(window.scan_id, window.orientation, window.resolution, index)
+            for index in range(window.begin, window.begin + window.count)]
+
+
+def _merge_slices(keys: List[SliceKey], cached_slices: Dict[SliceKey, Tuple[bytes, SliceCodec]],
+                  fetched_slices: Iterator[Tuple[SliceKey, bytes, SliceCodec]]) \
+        -> Iterator[Tuple[int, bytes, SliceCodec]]:
+    """Merge cached and fetched Slices in order of given keys (Slices that do not exist are skipped)."""
+    next_fetched_slice = next(fetched_slices, None)
+    for key in keys:
+        if key in cached_slices:
+            yield (key.index, *cached_slices[key])
+        elif next_fetched_slice and next_fetched_slice[0] == key:
+            yield (key.index, *next_fetched_slice[1:])
+            next_fetched_slice = next(fetched_slices, None)
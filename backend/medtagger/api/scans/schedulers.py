@@ -0,0 +1,216 @@
+"""Module responsible for choosing the next Scan that a User should label.
+
+Scheduler can be chosen with `scan_scheduler` configuration entry:
+ - `random` picks any available Scan that was not labeled by the User yet,
+ - `coverage` prefers Scans with the lowest number of Labels in given Task (Scans that were skipped many times are
+   picked later), so that all Scans reach the number of Labels needed for Ground Truth sooner.
+"""
+import abc
+import random
+import threading
+import time
+from collections import defaultdict
+from typing import AbstractSet, Dict, Iterable, List, Optional, Tuple, Type
+
+from sqlalchemy.orm.exc import NoResultFound
+
+from medtagger.config import AppConfiguration
+from medtagger.database.models import Scan, Task, User
+from medtagger.definitions import ScanStatus
+from medtagger.repositories import scans as ScansRepository
+from medtagger.types import ScanID, TaskID
+
+configuration = AppConfiguration()
+SCAN_SCHEDULER = configuration.get('api', 'scan_scheduler', fallback='random')
+# Number of skips which lower priority of a Scan as much as a single Label
+SKIPS_PER_LABEL = configuration.getint('api', 'scan_scheduler_skips_per_label', fallback=3)
+COVERAGE_TTL = configuration.getint('api', 'scan_scheduler_coverage_ttl', fallback=300)
+
+
+class ScanScheduler(abc.ABC):
+    """Base abstract class for all Scan schedulers."""
+
+    @abc.abstractmethod
+    def get_next_scan(self, task: Task, user: User, labeled_scans_ids: AbstractSet[ScanID]) -> Optional[Scan]:
+        """Choose an available Scan in given Task that should be labeled next by given User.
+
+        :param task: Task from which Scan should be chosen
+        :param user: User who will label the Scan (Scans already labeled by this User are never returned)
+        :param labeled_scans_ids: IDs of Scans known to be labeled by the User (they may be outdated, e.g. cached)
+        :return: Scan object (or None if there is no such Scan)
+        """
+        raise NotImplementedError
+
+    def on_label_added(self, task_id: TaskID, scan_id: ScanID) -> None:
+        """Take into account new Label for given Scan in given Task (it was already committed)."""
+
+    def on_scan_skipped(self, scan_id: ScanID) -> None:
+        """Take into account that given Scan was skipped (it was already committed)."""
+
+
+class RandomScanScheduler(ScanScheduler):
+    """Scheduler which picks any available Scan with equal probability."""
+
+    def get_next_scan(self, task: Task, user: User, labeled_scans_ids: AbstractSet[ScanID]) -> Optional[Scan]:
+        """Choose random available Scan in given Task."""
+        return ScansRepository.get_random_scan(task, user, labeled_scans_ids)
+
+
+class ScansCoverage:
+    """Available Scans of a single Task grouped by their priority (the lower, the sooner Scan should be labeled).
+
+    Priority of a Scan is its number of Labels, increased by one for each `SKIPS_PER_LABEL` skips. As priorities
+    are small integers, Scans are kept in buckets (lists with positions of their Scans), so that updating priority
+    of a Scan and choosing a random Scan with the lowest priority do not depend on the number of Scans.
+    """
+
+    def __init__(self, scans: Iterable[Tuple[ScanID, int, int]]) -> None:
+        """Initialize coverage of Scans in a Task.
+
+        :param scans: tuples with Scan ID, number of its Labels and its skip count
+        """
+        self.loaded_at = time.monotonic()
+        self._labels: Dict[ScanID, int] = {}
+        self._skips: Dict[ScanID, int] = {}
+        self._priorities: Dict[ScanID, int] = {}
+        self._buckets: Dict[int, List[ScanID]] = defaultdict(list)
+        self._positions: Dict[ScanID, int] = {}  # Position of each Scan in its bucket
+        for scan_id, labels, skips in scans:
+            self._labels[scan_id] = labels
+            self._skips[scan_id] = skips
+            self._move(scan_id)
+
+    def choose(self, excluded_scans_ids: AbstractSet[ScanID]) -> Optional[ScanID]:
+        """Return random Scan with the lowest priority that is not excluded (or None if there is no such Scan)."""
+        for priority in sorted(self._buckets):
+            bucket = self._buckets[priority]
+            offset = random.randrange(len(bucket))
+            for index in range(len(bucket)):
+                scan_id = bucket[(offset + index) % len(bucket)]
+                if scan_id not in excluded_scans_ids:
+                    return scan_id
+        return None
+
+    def add_label(self, scan_id: ScanID) -> None:
+        """Increase number of Labels for given Scan (if it is available)."""
+        if scan_id in self._labels:
+            self._labels[scan_id] += 1
+            self._move(scan_id)
+
+    def add_skip(self, scan_id: ScanID) -> None:
+        """Increase skip count for given Scan (if it is available)."""
+        if scan_id in self._skips:
+            self._skips[scan_id] += 1
+            self._move(scan_id)
+
+    def remove(self, scan_id: ScanID) -> None:
+        """Remove Scan that is no longer available."""
+        if scan_id in self._priorities:
+            self._remove_from_bucket(scan_id)
+            del self._labels[scan_id], self._skips[scan_id]
+
+    def _move(self, scan_id: ScanID) -> None:
+        """Move Scan to the bucket for its current priority."""
+        priority = self._labels[scan_id] + self._skips[scan_id] // max(SKIPS_PER_LABEL, 1)
+        if self._priorities.get(scan_id) == priority:
+            return
+        if scan_id in self._priorities:
+            self._remove_from_bucket(scan_id)
+        self._priorities[scan_id] = priority
+        self._positions[scan_id] = len(self._buckets[priority])
+        self._buckets[priority].append(scan_id)
+
+    def _remove_from_bucket(self, scan_id: ScanID) -> None:
+        """Remove Scan from its bucket by replacing it with the last Scan from this bucket."""
+        priority = self._priorities.pop(scan_id)
+        bucket = self._buckets[priority]
+        position = self._positions.pop(scan_id)
+        last_scan_id = bucket.pop()
+        if last_scan_id != scan_id:
+            bucket[position] = last_scan_id
+            self._positions[last_scan_id] = position
+        if not bucket:
+            del self._buckets[priority]
+
+
+class CoverageScanScheduler(ScanScheduler):
+    """Scheduler which prefers Scans with the lowest number of Labels in given Task.
+
+    NOTE: Coverage of each Task is kept within the process and updated with Labels and skips handled by the same
+          process. Changes made by other processes are taken into account once coverage expires (after its TTL).
+    """
+
+    def __init__(self, ttl: float = COVERAGE_TTL) -> None:
+        """Initialize scheduler.
+
+        :param ttl: number of seconds after which coverage of a Task is loaded again
+        """
+        self.ttl = ttl
+        self._coverages: Dict[TaskID, ScansCoverage] = {}
+        self._lock = threading.Lock()
+
+    def get_next_scan(self, task: Task, user: User, labeled_scans_ids: AbstractSet[ScanID]) -> Optional[Scan]:
+        """Choose available Scan in given Task with the lowest number of Labels."""
+        coverage = self._get_coverage(task)
+        excluded_scans_ids = set(labeled_scans_ids)
+        while True:
+            with self._lock:
+                scan_id = coverage.choose(excluded_scans_ids)
+            if not scan_id:
+                return None
+            scan = _get_available_scan(scan_id)
+            if not scan:
+                with self._lock:
+                    coverage.remove(scan_id)
+            elif ScansRepository.is_scan_labeled_by_user(scan_id, user, task):
+                excluded_scans_ids.add(scan_id)  # Known IDs were outdated (e.g. Label was added by another process)
+            else:
+                return scan
+
+    def on_label_added(self, task_id: TaskID, scan_id: ScanID) -> None:
+        """Lower priority of given Scan in given Task."""
+        with self._lock:
+            coverage = self._coverages.get(task_id)
+            if coverage:
+                coverage.add_label(scan_id)
+
+    def on_scan_skipped(self, scan_id: ScanID) -> None:
+        """Lower priority of given Scan in all Tasks."""
+        with self._lock:
+            for coverage in self._coverages.values():
+                coverage.add_skip(scan_id)
+
+    def _get_coverage(self, task: Task) -> ScansCoverage:
+        """Return coverage of given Task, loading it again if it has expired."""
+        coverage = self._coverages.get(task.id)
+        if not coverage or time.monotonic() - coverage.loaded_at >= self.ttl:
+            coverage = ScansCoverage(ScansRepository.get_available_scans_coverage(task))
+            with self._lock:
+                self._coverages[task.id] = coverage
+        return coverage
+
+
+SCAN_SCHEDULERS: Dict[str, Type[ScanScheduler]] = {
+    'random': RandomScanScheduler,
+    'coverage': CoverageScanScheduler,
+}
+
+
+def create_scan_scheduler() -> ScanScheduler:
+    """Create Scan scheduler chosen in the configuration."""
+    if SCAN_SCHEDULER not in SCAN_SCHEDULERS:
+        schedulers = ', '.join(SCAN_SCHEDULERS)
+        raise ValueError('Unknown scan scheduler "{}". Use one of: {}.'.format(SCAN_SCHEDULER, schedulers))
+    return SCAN_SCHEDULERS[SCAN_SCHEDULER]()
+
+
+def _get_available_scan(scan_id: ScanID) -> Optional[Scan]:
+    """Fetch Scan if it still exists and is available."""
+    try:
+        scan = ScansRepository.get_scan_by_id(scan_id)
+    except NoResultFound:
+        return None
+    return scan if scan.status == ScanStatus.AVAILABLE else None
+
+
+scan_scheduler = create_scan_scheduler()
@@ -132,6 +132,16 @@ out__new_slice = api.model('Newly created Slice model', {
     'slice_id': fields.String(description='Slice\'s ID', attribute='id'),
 })
 
+out__uploaded_slice = api.model('Uploaded Slice model', {
+    'file_name': fields.String(description='Name of uploaded file'),
+    'slice_id': fields.String(description='Slice\'s ID (empty if file could not be uploaded)'),
+    'error': fields.String(description='Reason why file could not be uploaded'),
+})
+
+out__new_slices = api.model('Newly created Slices model', {
+    'slices': fields.List(fields.Nested(out__uploaded_slice)),
+})
+
 args__scans = reqparse.RequestParser()
 args__scans.add_argument('dataset_key', type=str, help='Dataset\'s key')
 args__scans.add_argument('page', type=int, default=1, help='Page which should be fetched')
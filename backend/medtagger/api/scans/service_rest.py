@@ -2,12 +2,15 @@
 import json
 from typing import Any
 
-from flask import request
+from flask import Response, request
 from flask_restplus import Resource
 from jsonschema import validate, ValidationError, Draft4Validator
 from jsonschema.exceptions import best_match
+from werkzeug.datastructures import ContentRange
 
-from medtagger.types import ScanID
+from medtagger.codecs import MIME_TYPES
+from medtagger.config import AppConfiguration
+from medtagger.types import ScanID, SliceID, TilePosition
 from medtagger.api import api
 from medtagger.api.exceptions import InvalidArgumentsException
 from medtagger.api.scans import business, serializers
@@ -16,6 +19,11 @@ from medtagger.api.scans.serializers import elements_schema
 
 scans_ns = api.namespace('scans', 'Methods related with scans')
 
+configuration = AppConfiguration()
+# Whole multipart body is parsed before any of its Slices is stored, so each batch has to be limited
+SLICES_BATCH_MAX_FILES = configuration.getint('api', 'slices_batch_max_files', fallback=100)
+SLICES_BATCH_MAX_MEGABYTES = configuration.getint('api', 'slices_batch_max_megabytes', fallback=100)
+
 
 @scans_ns.route('')
 class Scans(Resource):
@@ -192,3 +200,98 @@ class ScanSlices(Resource):
         image_data = image.read()
         new_slice = business.add_new_slice(scan_id, image_data)
         return new_slice, 201
+
+
+@scans_ns.route('/<string:scan_id>/slices/batch')
+@scans_ns.param('scan_id', 'Scan identifier')
+class ScanSlicesBatch(Resource):
+    """Endpoint that allows for uploading multiple Slices to given Scan in a single request."""
+
+    @staticmethod
+    @login_required
+    @scans_ns.marshal_with(serializers.out__new_slices)
+    @scans_ns.doc(security='token')
+    @scans_ns.doc(description='Returns upload results for each sent file.')
+    @scans_ns.doc(responses={201: 'Success', 400: 'Invalid arguments', 404: 'Could not find scan'})
+    def post(scan_id: ScanID) -> Any:
+        """Upload multiple Slices for given Scan.
+
+        This endpoint needs a multipart/form-data content where each part contains a single DICOM file.
+        Result for each of the files is returned in the same order as files were sent.
+
+        NOTE: The whole request body is parsed (and buffered in memory or temporary files) before any Slice is
+              stored, so requests are limited to `SLICES_BATCH_MAX_FILES` files and `SLICES_BATCH_MAX_MEGABYTES`
+              megabytes (checked with Content-Length header before the body is read).
+
+        Here is an example CURL command that sends multiple Slices:
+
+            $> curl -v
+                    -H "Content-Type:multipart/form-data"
+                    -H "Authorization: Bearer MEDTAGGER_API_TOKEN"
+                    -F "image=@slice_1.dcm"
+                    -F "image=@slice_2.dcm"
+                     http://localhost:51000/api/v1/scans/c5102707-cb36-4869-8041-f00421c03fa1/slices/batch
+        """
+        if (request.content_length or 0) > SLICES_BATCH_MAX_MEGABYTES * 1024 * 1024:
+            raise InvalidArgumentsException('Request cannot be bigger than {} MB.'.format(SLICES_BATCH_MAX_MEGABYTES))
+        files = [image for _, image in request.files.items(multi=True)]
+        if not files:
+            raise InvalidArgumentsException('Request does not contain any files.')
+        if len(files) > SLICES_BATCH_MAX_FILES:
+            raise InvalidArgumentsException('Request cannot contain more than {} files.'.format(SLICES_BATCH_MAX_FILES))
+
+        images = ((image.filename, image.read()) for image in files)
+        uploaded_slices = business.add_new_slices(scan_id, images)
+        return {'slices': uploaded_slices}, 201
+
+
+@scans_ns.route('/<string:scan_id>/volume')
+@scans_ns.param('scan_id', 'Scan identifier')
+class PackedVolume(Resource):
+    """Endpoint that returns packed volume with all Slices of given Scan."""
+
+    @staticmethod
+    @login_required
+    @scans_ns.doc(security='token')
+    @scans_ns.doc(description='Returns packed volume (supports HTTP Range requests for a single range of bytes).')
+    @scans_ns.doc(responses={200: 'Success', 206: 'Partial content', 404: 'Could not find scan or its volume',
+                             416: 'Range not satisfiable'})
+    def get(scan_id: ScanID) -> Any:
+        """Stream packed volume with all Slices in Z orientation, so that the whole Scan can be fetched at once.
+
+        Volume starts with length of its JSON header (unsigned 32bit little-endian integer) and the header itself,
+        which contains shape of the volume, its spacing and IDs of Slices in their order. The rest of the volume
+        is a zlib stream with 8bit pixels of all Slices.
+        """
+        info = business.get_packed_volume_info(scan_id)
+        byte_range = request.range.range_for_length(info.size) if request.range else (0, info.size)
+        if byte_range is None:
+            return Response(status=416, headers={'Content-Range': 'bytes */{}'.format(info.size)})
+
+        start, stop = byte_range
+        response = Response(business.iterate_packed_volume(scan_id, info, start, stop),
+                            mimetype='application/octet-stream', headers={'Accept-Ranges': 'bytes'})
+        response.content_length = stop - start
+        if request.range:
+            response.status_code = 206
+            response.content_range = ContentRange('bytes', start, stop, info.size)
+        return response
+
+
+@scans_ns.route('/<string:scan_id>/slices/<string:slice_id>/tiles/<int:row>/<int:column>')
+@scans_ns.param('scan_id', 'Scan identifier')
+@scans_ns.param('slice_id', 'Slice identifier')
+@scans_ns.param('row', 'Row of a tile (counted from the top)')
+@scans_ns.param('column', 'Column of a tile (counted from the left)')
+class SliceTile(Resource):
+    """Endpoint that returns a single tile of very large Slice."""
+
+    @staticmethod
+    @login_required
+    @scans_ns.doc(security='token')
+    @scans_ns.doc(description='Returns encoded tile of a Slice (codec is sent in `X-Slice-Codec` header).')
+    @scans_ns.doc(responses={200: 'Success', 404: 'Could not find Slice or its tile'})
+    def get(scan_id: ScanID, slice_id: SliceID, row: int, column: int) -> Any:
+        """Return tile in given position of a Slice that was stored with tiles."""
+        tile, codec = business.get_slice_tile(scan_id, slice_id, TilePosition(row, column))
+        return Response(tile, mimetype=MIME_TYPES[codec], headers={'X-Slice-Codec': codec.value})
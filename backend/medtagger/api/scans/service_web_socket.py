@@ -1,6 +1,8 @@
 """Module responsible for definition of Scans service available via WebSockets."""
-from typing import Dict
+import logging
+from typing import Dict, Optional
 
+import flask
 from flask_socketio import Namespace, emit
 
 from medtagger.api import web_socket
@@ -8,7 +10,11 @@ from medtagger.database.models import SliceOrientation
 from medtagger.types import ScanID
 from medtagger.api.exceptions import InvalidArgumentsException
 from medtagger.api.scans import business
-from medtagger.repositories import tasks as TasksRepository
+from medtagger.api.scans.prefetch import SlicesPrefetcher, SliceWindow, statistics as prefetch_statistics
+from medtagger.codecs import encode_slices_batch
+from medtagger.storage import previews
+
+logger = logging.getLogger(__name__)
 
 
 class Slices(Namespace):
@@ -16,6 +22,23 @@ class Slices(Namespace):
 
     MAX_NUMBER_OF_SLICES_PER_REQUEST = 25
 
+    def __init__(self, namespace: str) -> None:
+        """Initialize namespace with no prefetched Slices."""
+        super().__init__(namespace)
+        self._prefetchers: Dict[str, SlicesPrefetcher] = {}
+
+    def on_disconnect(self) -> None:
+        """Drop Slices prefetched for the connection that was closed."""
+        prefetcher = self._prefetchers.pop(flask.request.sid, None)
+        if prefetcher:
+            prefetcher.close()
+            logger.info('Prefetched Slices served %d times (%d misses).', prefetcher.hits, prefetcher.misses)
+
+    @staticmethod
+    def on_request_prefetch_statistics() -> None:
+        """Send number of Slices served from prefetched ones (hits) and fetched on request (misses)."""
+        emit('prefetch_statistics', prefetch_statistics)
+
     def on_request_slices(self, request: Dict) -> None:
         """Handle slices request triggered  by `request_slices` event."""
         assert request.get('scan_id'), 'ScanID is required!'
@@ -27,35 +50,57 @@ class Slices(Namespace):
         count = request.get('count', 1)
         reversed_order = request.get('reversed', False)
         request_orientation = request.get('orientation', SliceOrientation.Z.value)
-        self._raise_on_invalid_request_slices(count, request_orientation)
+        resolution = request.get('resolution')
+        batched = request.get('batched', False)
+        self._raise_on_invalid_request_slices(count, request_orientation, resolution)
 
         orientation = SliceOrientation[request_orientation]
-        self._send_slices(scan_id, begin, count, orientation, reversed_order)
+        self._send_slices(scan_id, begin, count, orientation, reversed_order, resolution, batched)
         if orientation == SliceOrientation.Z:
             self._send_predefined_labels(scan_id, begin, count, task_key, reversed_order)
 
-    @staticmethod
-    def _send_slices(scan_id: ScanID, begin: int, count: int, orientation: SliceOrientation,
-                     reversed_order: bool = False) -> None:
+    def _send_slices(self, scan_id: ScanID, begin: int, count: int,  # pylint: disable=too-many-arguments
+                     orientation: SliceOrientation, reversed_order: bool = False,
+                     resolution: Optional[int] = None, batched: bool = False) -> None:
         """Send Slices to the User using WebSocket.
 
+        By default, each Slice is sent as a separate `slice` event. In batched mode, the whole window is sent as a
+        single binary `slices` event (see `medtagger.codecs.encode_slices_batch()`).
+
         :param scan_id: ID of a Scan
         :param begin: first Slice index to be sent
         :param count: number of Slices to be sent
         :param orientation: orientation of Slices for this Scan
         :param reversed_order: (optional) emit Slices in reversed order
+        :param resolution: (optional) send previews in given resolution instead of full images
+        :param batched: (optional) send all Slices in a single binary message
         """
-        slices = list(business.get_slices_for_scan(scan_id, begin, count, orientation=orientation))
-        slices_to_send = reversed(list(enumerate(slices))) if reversed_order else enumerate(slices)
-        last_in_batch = begin if reversed_order else begin + len(slices) - 1
-        for index, (_slice, image) in slices_to_send:
+        # Slices are emitted as soon as they arrive, while the next window is prefetched in background
+        prefetcher = self._prefetchers.setdefault(flask.request.sid, SlicesPrefetcher())
+        window = SliceWindow(scan_id, begin, count, orientation, resolution)
+        slices = prefetcher.get_slices(window, reversed_order)
+        prefetcher.prefetch_next_window(window, reversed_order)
+        if batched:
+            emit('slices', encode_slices_batch({'scan_id': scan_id, 'resolution': resolution}, slices))
+            return
+
+        last_in_batch = begin if reversed_order else self._get_last_index(scan_id, begin, count, orientation)
+        for index, image, codec in slices:
             emit('slice', {
                 'scan_id': scan_id,
-                'index': begin + index,
+                'index': index,
                 'last_in_batch': last_in_batch,
                 'image': image,
+                'codec': codec.value,
+                'resolution': resolution,
             })
 
+    @staticmethod
+    def _get_last_index(scan_id: ScanID, begin: int, count: int, orientation: SliceOrientation) -> int:
+        """Return index of the last Slice in given window that exists in a Scan."""
+        number_of_slices = business.count_slices_for_scan(scan_id, orientation)
+        return begin + min(count, max(number_of_slices - begin, 0)) - 1
+
     @staticmethod
     def _send_predefined_labels(scan_id: ScanID, begin: int, count: int, task_key: str,
                                 reversed_order: bool = False) -> None:
@@ -67,27 +112,32 @@ class Slices(Namespace):
         :param task_key: key of a Task for which Predefined Labels should be sent
         :param reversed_order: (optional) emit Label Elements in reversed order
         """
-        task = TasksRepository.get_task_by_key(task_key)
-        label_elements = list(business.get_predefined_brush_label_elements(scan_id, task.id, begin, count))
-        label_elements_to_send = reversed(list(label_elements)) if reversed_order else label_elements
-        for label_element, image in label_elements_to_send:
+        label_elements = business.get_predefined_brush_label_elements(scan_id, task_key, begin, count)
+        label_elements_to_send = reversed(label_elements) if reversed_order else label_elements
+        for label_element in label_elements_to_send:
             emit('brush_labels', {
                 'scan_id': scan_id,
-                'tag_key': label_element.tag.key,
+                'tag_key': label_element.tag_key,
                 'index': label_element.slice_index,
-                'image': image,
+                'image': label_element.image,
             })
 
-    def _raise_on_invalid_request_slices(self, count: int, orientation: str) -> None:
+    def _raise_on_invalid_request_slices(self, count: int, orientation: str, resolution: Optional[int]) -> None:
         """Validate incoming request and raise an exception if there are issues with given arguments.
 
         :param count: number of slices that should be returned
         :param orientation: Slice's orientation as a string
+        :param resolution: resolution of previews (or None for full images)
         """
         # Make sure that passed orientation is proper one
         if orientation not in SliceOrientation.__members__:
             raise InvalidArgumentsException('Invalid Slice orientation.')
 
+        # Previews are available only in resolutions that were configured for conversion
+        if resolution is not None and resolution not in previews.RESOLUTIONS:
+            resolutions = ', '.join(str(resolution) for resolution in previews.RESOLUTIONS)
+            raise InvalidArgumentsException('Invalid resolution. Use one of: {}.'.format(resolutions))
+
         # Make sure that nobody will fetch whole scan at once. It could freeze our backend application.
         if count > self.MAX_NUMBER_OF_SLICES_PER_REQUEST:
             message = 'Cannot return more than {} slices per request.'.format(self.MAX_NUMBER_OF_SLICES_PER_REQUEST)
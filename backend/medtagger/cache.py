@@ -0,0 +1,95 @@
+"""Module responsible for caching results of frequent queries within a single process."""
+import threading
+import time
+from typing import Callable, Dict, Generic, Hashable, List, Tuple, TypeVar
+
+Key = TypeVar('Key', bound=Hashable)
+Value = TypeVar('Value')
+
+
+class LRUCache(Generic[Key, Value]):
+    """Thread-safe cache which keeps a limited number of the most recently used entries for a limited time.
+
+    NOTE: Each process keeps its own entries, so entries changed by other processes are refreshed only after
+          their time to live expires. Changes made within the same process should invalidate entries explicitly.
+    """
+
+    def __init__(self, max_size: int, ttl: float) -> None:
+        """Initialize LRU Cache.
+
+        :param max_size: maximum number of entries (cache is disabled if set to 0)
+        :param ttl: number of seconds after which entry is loaded again
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: Dict[Key, Tuple[float, Value]] = {}  # Ordered from the least recently used one
+        self._lock = threading.Lock()
+        self._version = 0  # Incremented on each invalidation
+
+    def get_or_load(self, key: Key, load: Callable[[], Value]) -> Value:
+        """Return cached value for given key or load it (and cache it) if it is missing or expired.
+
+        :param key: key of an entry
+        :param load: function that loads value for given key
+        :return: cached or loaded value
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and time.monotonic() - entry[0] < self.ttl:
+                self._entries[key] = self._entries.pop(key)
+                return entry[1]
+            version = self._version
+
+        # Value is loaded without holding the lock, so that slow loads do not block other keys. It is not cached
+        # if any entry was invalidated in the meantime, as it may have been loaded before that change.
+        value = load()
+        with self._lock:
+            if version == self._version:
+                self._put(key, value)
+        return value
+
+    def put(self, key: Key, value: Value) -> None:
+        """Cache given value for given key (e.g. to warm up the cache).
+
+        :param key: key of an entry
+        :param value: value that should be cached
+        """
+        with self._lock:
+            self._put(key, value)
+
+    def update(self, key: Key, function: Callable[[Value], Value]) -> None:
+        """Replace cached value for given key (if it is cached) with a result of given function.
+
+        :param key: key of an entry
+        :param function: function that returns new value for given cached one (it should not modify given value)
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry:
+                self._entries[key] = (entry[0], function(entry[1]))
+            self._version += 1  # Values that are being loaded right now may not include this update
+
+    def items(self) -> List[Tuple[Key, Value]]:
+        """Return all entries that have not expired yet (from the least recently used one)."""
+        with self._lock:
+            now = time.monotonic()
+            return [(key, value) for key, (loaded_at, value) in self._entries.items() if now - loaded_at < self.ttl]
+
+    def invalidate(self, key: Key) -> None:
+        """Remove entry for given key (if it is cached)."""
+        with self._lock:
+            self._entries.pop(key, None)
+            self._version += 1
+
+    def clear(self) -> None:
+        """Remove all entries."""
+        with self._lock:
+            self._entries.clear()
+            self._version += 1
+
+    def _put(self, key: Key, value: Value) -> None:
+        """Cache given value as the most recently used one and evict the least recently used entries (under lock)."""
+        self._entries.pop(key, None)
+        self._entries[key] = (time.monotonic(), value)
+        while len(self._entries) > self.max_size:
+            del self._entries[next(iter(self._entries))]
@@ -0,0 +1,149 @@
+"""Module responsible for encoding and decoding converted Slices with available codecs."""
+import io
+import json
+import struct
+import zlib
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+from medtagger.definitions import SliceCodec
+
+# Compression level has a different meaning for each codec:
+#  - PNG: zlib's compression level (0-9),
+#  - WEBP: compression effort (0-6), where higher values are slower but produce smaller images,
+#  - RAW_ZLIB: zlib's compression level (0-9).
+DEFAULT_COMPRESSION_LEVELS = {
+    SliceCodec.PNG: 6,
+    SliceCodec.WEBP: 4,
+    SliceCodec.RAW_ZLIB: 6,
+}
+MAX_COMPRESSION_LEVELS = {
+    SliceCodec.PNG: 9,
+    SliceCodec.WEBP: 6,
+    SliceCodec.RAW_ZLIB: 9,
+}
+# Packed volume starts with length of its JSON header (unsigned 32bit little-endian integer)
+VOLUME_HEADER_LENGTH = struct.Struct('<I')
+# The same applies to a batch of Slices sent as a single WebSocket message
+BATCH_HEADER_LENGTH = struct.Struct('<I')
+MIME_TYPES = {
+    SliceCodec.PNG: 'image/png',
+    SliceCodec.WEBP: 'image/webp',
+    SliceCodec.RAW_ZLIB: 'application/octet-stream',
+}
+
+
+def encode_slice(slice_pixels: np.ndarray, codec: SliceCodec = SliceCodec.PNG,
+                 compression_level: Optional[int] = None) -> bytes:
+    """Encode given Slice's pixel array with given codec.
+
+    :param slice_pixels: Slice's 8bit pixel array
+    :param codec: (optional) codec that should be used (PNG by default)
+    :param compression_level: (optional) compression level for given codec (codec's default if not set)
+    :return: bytes with encoded Slice
+    """
+    if compression_level is None:
+        compression_level = DEFAULT_COMPRESSION_LEVELS[codec]
+    compression_level = min(max(compression_level, 0), MAX_COMPRESSION_LEVELS[codec])
+
+    if codec == SliceCodec.RAW_ZLIB:
+        return zlib.compress(np.ascontiguousarray(slice_pixels, dtype=np.uint8).tobytes(), compression_level)
+
+    image = io.BytesIO()
+    if codec == SliceCodec.WEBP:
+        # For lossless WebP both quality & method describe the compression effort
+        effort = 100 * compression_level // MAX_COMPRESSION_LEVELS[codec]
+        Image.fromarray(slice_pixels, 'L').save(image, 'WEBP', lossless=True, quality=effort, method=compression_level)
+    else:
+        Image.fromarray(slice_pixels, 'L').save(image, 'PNG', compress_level=compression_level)
+    return image.getvalue()
+
+
+def decode_slice(image: bytes, codec: SliceCodec, shape: Tuple[int, int]) -> np.ndarray:
+    """Decode Slice's pixel array from bytes encoded with given codec.
+
+    :param image: bytes with encoded Slice
+    :param codec: codec that was used to encode this Slice
+    :param shape: height and width of the Slice (needed only for raw pixels)
+    :return: Slice's 8bit pixel array
+    """
+    if codec == SliceCodec.RAW_ZLIB:
+        return np.frombuffer(zlib.decompress(image), dtype=np.uint8).reshape(shape)
+    return np.asarray(Image.open(io.BytesIO(image)).convert('L'))
+
+
+def encode_volume(header: Dict[str, Any], slices_pixels: Iterable[np.ndarray],
+                  compression_level: int = DEFAULT_COMPRESSION_LEVELS[SliceCodec.RAW_ZLIB]) -> Iterator[bytes]:
+    """Pack all Slices of a Scan into a single stream, which can be downloaded and decoded at once.
+
+    Packed volume consists of header's length, JSON header and 8bit pixels of all Slices compressed as a single
+    zlib stream. Slices are compressed one by one, so the whole volume is never kept in memory.
+
+    :param header: JSON serializable header (e.g. shape of the volume)
+    :param slices_pixels: 8bit pixel arrays of all Slices
+    :param compression_level: (optional) zlib's compression level (0-9)
+    :return: generator of consecutive parts of packed volume
+    """
+    encoded_header = json.dumps(header).encode()
+    yield VOLUME_HEADER_LENGTH.pack(len(encoded_header)) + encoded_header
+    compressor = zlib.compressobj(compression_level)
+    for slice_pixels in slices_pixels:
+        yield compressor.compress(np.ascontiguousarray(slice_pixels, dtype=np.uint8).tobytes())
+    yield compressor.flush()
+
+
+def decode_volume(volume: bytes) -> Tuple[Dict[str, Any], np.ndarray]:
+    """Decode header and pixels of all Slices from packed volume.
+
+    :param volume: bytes with packed volume (see `encode_volume()`)
+    :return: tuple with header and 3D array with 8bit pixels of all Slices (of shape given in the header)
+    """
+    header_length, = VOLUME_HEADER_LENGTH.unpack_from(volume)
+    header_end = VOLUME_HEADER_LENGTH.size + header_length
+    header = json.loads(volume[VOLUME_HEADER_LENGTH.size:header_end].decode())
+    pixels = np.frombuffer(zlib.decompress(volume[header_end:]), dtype=np.uint8)
+    return header, pixels.reshape(header['shape'])
+
+
+def encode_slices_batch(header: Dict[str, Any], slices: Iterable[Tuple[int, bytes, SliceCodec]]) -> bytes:
+    """Pack multiple encoded Slices into a single binary message.
+
+    Batch consists of header's length, JSON header and concatenated images of all Slices. Header lists indices of
+    Slices, offsets of their images (from the end of the header) and codecs used to encode them.
+
+    :param header: JSON serializable header (e.g. ID of a Scan)
+    :param slices: Slices' indices, their images and codecs used to encode them
+    :return: bytes with packed Slices
+    """
+    indices: List[int] = []
+    offsets: List[int] = []
+    codecs: List[str] = []
+    images: List[bytes] = []
+    offset = 0
+    for index, image, codec in slices:
+        indices.append(index)
+        offsets.append(offset)
+        codecs.append(codec.value)
+        images.append(image)
+        offset += len(image)
+
+    encoded_header = json.dumps({**header, 'indices': indices, 'offsets': offsets, 'codecs': codecs}).encode()
+    return b''.join([BATCH_HEADER_LENGTH.pack(len(encoded_header)), encoded_header, *images])
+
+
+def decode_slices_batch(batch: bytes) -> Tuple[Dict[str, Any], List[Tuple[int, bytes, SliceCodec]]]:
+    """Decode header and all Slices from a batch.
+
+    :param batch: bytes with packed Slices (see `encode_slices_batch()`)
+    :return: tuple with header and list of Slices' indices, their images and codecs used to encode them
+    """
+    header_length, = BATCH_HEADER_LENGTH.unpack_from(batch)
+    header_end = BATCH_HEADER_LENGTH.size + header_length
+    header = json.loads(batch[BATCH_HEADER_LENGTH.size:header_end].decode())
+    images = memoryview(batch)[header_end:]
+    ends = header['offsets'][1:] + [len(images)]
+    slices = [(index, bytes(images[begin:end]), SliceCodec(codec))
+              for index, begin, end, codec in zip(header['indices'], header['offsets'], ends, header['codecs'])]
+    return header, slices
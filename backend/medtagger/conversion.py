@@ -1,65 +1,208 @@
 """Module responsible for conversion of Dicom files."""
-from typing import List, Any, Optional
+from tempfile import TemporaryFile
+from typing import Any, Iterable, Iterator, Optional, Tuple
 
 import numpy as np
-import SimpleITK as sitk
-from scipy import ndimage
+from PIL import Image
 
-from medtagger.definitions import DicomTag
-from medtagger.dicoms import read_float, read_list
+from medtagger.definitions import SliceOrientation
+from medtagger.dicoms import read_dicom_pixels
+from medtagger.types import TilePosition
 
+AIR_HOUNSFIELD_UNITS = -1000
+REFORMAT_CHUNK_SIZE = 32  # Number of reformatted Slices interpolated at once
 
-def convert_slice_to_normalized_8bit_array(dicom_file: sitk.Image) -> np.ndarray:
-    """Convert Dicom file to 8bit pixel array.
 
-    :param: dicom_file: Dicom file that will be converted to a pixel array
-    :return numpy array of pixels
+def allocate_volume(shape: Tuple[int, ...], dtype: Any, directory: Optional[str] = None) -> np.ndarray:
+    """Allocate uninitialized 3D volume either in memory or in a temporary file (memory-mapped).
+
+    Memory-mapped volume is backed by an anonymous file (removed right away), so its pages can always be written
+    back to disk and its size is not limited by memory available for the worker.
+
+    :param shape: shape of the volume
+    :param dtype: type of volume's values
+    :param directory: (optional) directory for temporary file, volume will be kept in memory if not set
+    :return: 3D numpy array (or memory-mapped array)
     """
-    pixel_array = sitk.GetArrayFromImage(dicom_file)[0]
-    pixel_array[pixel_array < -1000] = -1000  # Set all smaller values to Air
-    pixel_array_normalized = (pixel_array - np.min(pixel_array)) / (np.max(pixel_array) - np.min(pixel_array))
-    pixel_array = np.uint8(pixel_array_normalized * 255)
-    return pixel_array
+    if directory is None:
+        return np.empty(shape, dtype=dtype)
+    with TemporaryFile(dir=directory) as volume_file:
+        return np.memmap(volume_file, dtype=dtype, mode='w+', shape=shape)
+
+
+def convert_dicoms_to_volume(dicom_images: Iterable[bytes], number_of_slices: int,
+                             directory: Optional[str] = None) -> np.ndarray:
+    """Read pixels of all Dicom images into a single, preallocated 3D volume.
+
+    Volume keeps pixels as int16 (which is enough for Hounsfield Units) and switches to float32 only if any
+    of the Slices cannot be represented with integers.
+
+    :param dicom_images: bytes with all Dicom images related with given Scan (ordered by their location)
+    :param number_of_slices: number of Dicom images
+    :param directory: (optional) directory for memory-mapped volume, volume will be kept in memory if not set
+    :return: 3D numpy array with pixels from all Slices
+    """
+    volume = np.empty((0, 0, 0), dtype=np.int16)
+    for index, dicom_image in enumerate(dicom_images):
+        slice_pixels = read_dicom_pixels(dicom_image)
+        if index == 0:
+            volume = allocate_volume((number_of_slices,) + slice_pixels.shape, np.int16, directory)
+        if slice_pixels.dtype == np.float32 and volume.dtype == np.int16:
+            volume = _copy_volume(volume, np.float32, directory, number_of_slices=index)
+        volume[index] = slice_pixels
+    return volume
+
+
+def _copy_volume(volume: np.ndarray, dtype: Any, directory: Optional[str], number_of_slices: int) -> np.ndarray:
+    """Copy first Slices of given volume into a new volume with different type (Slice by Slice)."""
+    new_volume = allocate_volume(volume.shape, dtype, directory)
+    for index in range(number_of_slices):
+        new_volume[index] = volume[index]
+    return new_volume
 
 
-def convert_scan_to_normalized_8bit_array(dicom_files: List[sitk.Image], output_x_size: Optional[int] = None) \
-        -> np.ndarray:
-    """Convert list of Dicom files to 8bit pixel array with output X axis size.
+def normalize_volume_slices(volume: np.ndarray) -> Iterator[np.ndarray]:
+    """Convert 3D volume to 8bit Slices with the same intensity scaling for all of them.
 
-    :param dicom_files: list of Dicom files related with given Scan
-    :param output_x_size: (optional) X axis size for output shape
+    NOTE: Input volume is clipped in place and processed Slice by Slice, so that there are no volume-sized
+          temporary arrays. Only single normalized Slice is created at once.
+
+    :param volume: 3D numpy array with pixels from all Slices
+    :return: generator for 2D numpy arrays with normalized pixels
+    """
+    lowest, highest = _clip_volume_and_get_window(volume)
+    scale = 255.0 / (highest - lowest) if highest > lowest else 0.0
+    buffer = np.empty(volume.shape[1:], dtype=np.float32)
+    for slice_pixels in volume:
+        np.subtract(slice_pixels, lowest, out=buffer)
+        np.multiply(buffer, scale, out=buffer)
+        yield buffer.astype(np.uint8)
+
+
+def _clip_volume_and_get_window(volume: np.ndarray) -> Tuple[float, float]:
+    """Set all values smaller than Air to Air (in place) and return the lowest & the highest value in the volume."""
+    lowest, highest = np.inf, -np.inf
+    for slice_pixels in volume:
+        np.maximum(slice_pixels, AIR_HOUNSFIELD_UNITS, out=slice_pixels)
+        lowest = min(lowest, float(slice_pixels.min()))
+        highest = max(highest, float(slice_pixels.max()))
+    return lowest, highest
+
+
+def convert_volume_to_normalized_8bit_array(volume: np.ndarray, directory: Optional[str] = None) -> np.ndarray:
+    """Convert 3D volume to 8bit pixel array with the same intensity scaling for all of its Slices.
+
+    :param volume: 3D numpy array with pixels from all Slices
+    :param directory: (optional) directory for memory-mapped output, output will be kept in memory if not set
     :return: 3D numpy array with normalized pixels
     """
-    dicom_files = sorted(dicom_files, key=lambda _slice: read_float(_slice, DicomTag.SLICE_LOCATION), reverse=True)
-    thickness = _get_scan_slice_thickness(dicom_files)
-    spacing = float((read_list(dicom_files[0], DicomTag.PIXEL_SPACING) or [])[0])
+    normalized_volume = allocate_volume(volume.shape, np.uint8, directory)
+    for index, normalized_slice_pixels in enumerate(normalize_volume_slices(volume)):
+        normalized_volume[index] = normalized_slice_pixels
+    return normalized_volume
+
+
+def get_reformatted_shape(volume_shape: Tuple[int, ...], orientation: SliceOrientation, thickness: float,
+                          spacing: float, max_size: Optional[int] = None) -> Tuple[int, int, int]:
+    """Return shape of Slices that will be reformatted from a volume in given orientation.
+
+    :param volume_shape: shape of volume with Slices in Z orientation
+    :param orientation: orientation of reformatted Slices (either X or Y)
+    :param thickness: distance between two consecutive Slices in Z orientation
+    :param spacing: distance between two consecutive pixels in a Slice in Z orientation
+    :param max_size: (optional) maximum number of pixels in X & Y axes (volume will be subsampled to fit it)
+    :return: number of reformatted Slices, their height and width
+    """
+    depth, height, width = volume_shape
+    step = _get_subsampling_step(height, width, max_size)
+    reformatted_height = max(1, int(round(depth * thickness / (spacing * step))))
+    subsampled_height, subsampled_width = len(range(0, height, step)), len(range(0, width, step))
+    if orientation == SliceOrientation.Y:
+        return subsampled_height, reformatted_height, subsampled_width
+    return subsampled_width, reformatted_height, subsampled_height
+
+
+def reformat_volume(normalized_volume: np.ndarray, orientation: SliceOrientation, thickness: float, spacing: float,
+                    max_size: Optional[int] = None) -> Iterator[np.ndarray]:
+    """Reformat 8bit volume into Slices in X or Y orientation (multi-planar reformat).
+
+    Slices are interpolated (linearly) only along the thickness axis, so that they keep real proportions of the Scan.
+    Other axes are only subsampled to fit given maximum size. Volume is processed in chunks of REFORMAT_CHUNK_SIZE
+    Slices, so it is never loaded into memory at once (and can be memory-mapped).
+
+    :param normalized_volume: 3D numpy array with normalized Slices in Z orientation (ordered by their location)
+    :param orientation: orientation of reformatted Slices (either X or Y)
+    :param thickness: distance between two consecutive Slices in Z orientation
+    :param spacing: distance between two consecutive pixels in a Slice in Z orientation
+    :param max_size: (optional) maximum number of pixels in X & Y axes (volume will be subsampled to fit it)
+    :return: generator for 2D numpy arrays with reformatted Slices (see `get_reformatted_shape()` for their shape)
+    """
+    _, height, width = normalized_volume.shape
+    step = _get_subsampling_step(height, width, max_size)
+    _, reformatted_height, _ = get_reformatted_shape(normalized_volume.shape, orientation, thickness, spacing, max_size)
+    interpolation = _get_interpolation_weights(len(normalized_volume), reformatted_height)
+
+    # Reformatted Slices start at the top of the Scan. Let's also move their axis to the front, so that they can be
+    # taken in the same way for both orientations.
+    axis = 1 if orientation == SliceOrientation.Y else 2
+    volume = np.moveaxis(normalized_volume[::-1, ::step, ::step], axis, 0)
+    for begin in range(0, len(volume), REFORMAT_CHUNK_SIZE):
+        yield from _interpolate_along_second_axis(volume[begin:begin + REFORMAT_CHUNK_SIZE], *interpolation)
 
-    # Read all Dicom images and retrieve pixel values for each slice
-    pixel_array = np.array(np.stack(sitk.GetArrayFromImage(_slice)[0] for _slice in dicom_files))
-    pixel_array[pixel_array < -1000] = -1000  # Set all smaller values to Air
 
-    # Calculate scale factor that should be applied to the input 3D scan
-    real_shape = np.array([thickness, spacing, spacing]) * pixel_array.shape  # Shape after applying voxel's size
-    # `scale` tell us how much should we rescale real shape, so that X axis will be equal given size
-    scale = output_x_size / real_shape[2] if output_x_size else 1.0
-    after_rescale = real_shape * scale  # Shape which should be an output after the scaling
-    scale_factor = after_rescale / pixel_array.shape  # Calculate how much each of the axis should be scaled up/down
-    pixel_array = ndimage.zoom(pixel_array, scale_factor)  # Scale all images up/down
+def _get_subsampling_step(height: int, width: int, max_size: Optional[int]) -> int:
+    """Return step for subsampling pixels in X & Y axes, so that they will fit given maximum size."""
+    return max(1, int(np.ceil(max(height, width) / max_size))) if max_size else 1
+
+
+def _get_interpolation_weights(input_size: int, output_size: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Return indices of lower & upper neighbours and fixed-point weights of upper ones for linear interpolation."""
+    positions = np.linspace(0, input_size - 1, output_size)
+    lower_indices = np.floor(positions).astype(np.intp)
+    upper_indices = np.minimum(lower_indices + 1, input_size - 1)
+    upper_weights = np.round((positions - lower_indices) * 256).astype(np.uint16)
+    return lower_indices, upper_indices, upper_weights
+
+
+def _interpolate_along_second_axis(chunk: np.ndarray, lower_indices: np.ndarray, upper_indices: np.ndarray,
+                                   upper_weights: np.ndarray) -> np.ndarray:
+    """Interpolate 8bit chunk of Slices along the thickness axis with fixed-point arithmetic (no float copies)."""
+    upper_weights = upper_weights.reshape((1, -1, 1))
+    interpolated_chunk = chunk[:, lower_indices].astype(np.uint16)
+    interpolated_chunk *= 256 - upper_weights
+    interpolated_chunk += chunk[:, upper_indices] * upper_weights
+    interpolated_chunk += 128  # Round to the nearest integer
+    interpolated_chunk >>= 8
+    return interpolated_chunk.astype(np.uint8)
+
+
+def split_into_tiles(slice_pixels: np.ndarray, tile_size: int) -> Iterator[Tuple[TilePosition, np.ndarray]]:
+    """Split Slice into square tiles (in row-major order), so that its regions can be fetched separately.
+
+    :param slice_pixels: 2D numpy array with Slice
+    :param tile_size: size of a single tile (tiles at the right & bottom edges may be smaller)
+    :return: generator of tiles' positions and views on their pixels
+    """
+    height, width = np.shape(slice_pixels)
+    for top in range(0, height, tile_size):
+        for left in range(0, width, tile_size):
+            position = TilePosition(top // tile_size, left // tile_size)
+            yield position, slice_pixels[top:top + tile_size, left:left + tile_size]
 
-    pixel_array_normalized = (pixel_array - np.min(pixel_array)) / (np.max(pixel_array) - np.min(pixel_array))
-    pixel_array = np.uint8(pixel_array_normalized * 255)
-    return pixel_array
 
+def downscale_slice(slice_pixels: np.ndarray, max_size: int) -> np.ndarray:
+    """Downscale Slice (keeping its proportions), so that its longer side will fit given maximum size.
 
-def _get_scan_slice_thickness(dicom_files: List[Any]) -> float:
-    """Calculate Scan's Slice thickness.
+    Pixels are averaged over the area of each downscaled pixel, so that preview does not have aliasing artifacts.
 
-    :param dicom_files: list of all Dicom files related to given Scan
-    :return: float value with Scan's Slice thickness
+    :param slice_pixels: 2D numpy array with 8bit Slice
+    :param max_size: maximum number of pixels in X & Y axes
+    :return: 2D numpy array with downscaled Slice (or the same Slice if it already fits given size)
     """
-    try:
-        first_location = read_float(dicom_files[0], DicomTag.SLICE_LOCATION) or 0.0
-        second_location = read_float(dicom_files[1], DicomTag.SLICE_LOCATION) or 0.0
-        return abs(second_location - first_location)
-    except IndexError:
-        return 1.0  # It seems that there is only one Slice. Thickness >=1.0 will be fine for all of the computations.
+    height, width = np.shape(slice_pixels)
+    scale = max_size / max(height, width)
+    if scale >= 1:
+        return slice_pixels
+    size = (max(1, int(round(width * scale))), max(1, int(round(height * scale))))
+    image = Image.fromarray(np.ascontiguousarray(slice_pixels, dtype=np.uint8), 'L')
+    return np.asarray(image.resize(size, Image.BOX))
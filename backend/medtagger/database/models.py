@@ -1,9 +1,10 @@
 """Module responsible for defining all of the relational database models."""
 # pylint: disable=too-few-public-methods,too-many-instance-attributes
 import uuid
-from typing import List, Dict, cast, Optional, Any
+from typing import List, Dict, Tuple, cast, Optional, Any
 
-from sqlalchemy import Column, Integer, Text, Float, String, ForeignKey, Boolean, Enum, Table, and_, event, false
+from sqlalchemy import Column, Integer, Text, Float, String, ForeignKey, Boolean, Enum, Table, Index, and_, event, \
+    false, text
 from sqlalchemy.dialects.postgresql import JSONB, ARRAY
 from sqlalchemy.engine import Connection
 from sqlalchemy.orm import relationship
@@ -12,12 +13,15 @@ from sqlalchemy.orm.mapper import Mapper
 from medtagger.database.utils import ArrayOfEnum
 from medtagger.database import Base, db_transaction_session
 from medtagger.definitions import ScanStatus, SliceStatus, SliceOrientation, LabelVerificationStatus, \
-    LabelElementStatus, LabelTool
+    LabelElementStatus, LabelTool, SliceCodec
+from medtagger.storage import blobs, chunks, previews, tiles, volumes
 from medtagger.storage.models import BrushLabelElement as StorageBrushLabelElement, OriginalSlice, ProcessedSlice
 from medtagger.types import UserID, ScanID, SliceID, LabelID, LabelElementID, SliceLocation, SlicePosition, \
     LabelPosition, LabelShape, LabelingTime, LabelTagID, ActionID, SurveyID, SurveyElementID, SurveyElementKey, \
     ActionResponseID, SurveyResponseID, PointID, TaskID
 
+SLICES_INSERT_BATCH_SIZE = 1000  # Keeps number of bound parameters in a single INSERT way below PostgreSQL's limit
+
 #########################
 #
 #  Users related models
@@ -107,17 +111,24 @@ class Dataset(Base):
     key: str = Column(String(50), nullable=False, unique=True)
     name: str = Column(String(100), nullable=False)
     disabled: bool = Column(Boolean, nullable=False, server_default='f')
+    slices_codec: SliceCodec = Column(Enum(SliceCodec), nullable=False, server_default=SliceCodec.PNG.value)
+    slices_compression_level: Optional[int] = Column(Integer, nullable=True)
 
     tasks: List['Task'] = relationship('Task', back_populates='datasets', secondary=datasets_tasks)
 
-    def __init__(self, key: str, name: str) -> None:
+    def __init__(self, key: str, name: str, slices_codec: SliceCodec = SliceCodec.PNG,
+                 slices_compression_level: Optional[int] = None) -> None:
         """Initialize Dataset.
 
         :param key: unique key representing Dataset
         :param name: name which describes this Dataset
+        :param slices_codec: (optional) codec used for converted Slices in this Dataset
+        :param slices_compression_level: (optional) compression level for above codec
         """
         self.key = key
         self.name = name
+        self.slices_codec = slices_codec
+        self.slices_compression_level = slices_compression_level
 
     def __repr__(self) -> str:
         """Return string representation for Dataset."""
@@ -180,10 +191,15 @@ class Scan(Base):
     """Definition of a Scan."""
 
     __tablename__ = 'Scans'
+    __table_args__ = (
+        # Random Scan is sampled by seeking to a random key among available Scans (instead of sorting all of them)
+        Index('ix_Scans_status_random_key', 'status', 'random_key'),
+    )
     id: ScanID = Column(String, primary_key=True)
     status: ScanStatus = Column(Enum(ScanStatus), nullable=False, default=ScanStatus.NEW)
     declared_number_of_slices: int = Column(Integer, nullable=False)
     skip_count: int = Column(Integer, nullable=False, default=0)
+    random_key: float = Column(Float, nullable=False, server_default=text('random()'))
 
     dataset_id: int = Column(Integer, ForeignKey('Datasets.id'))
     dataset: Dataset = relationship('Dataset')
@@ -242,6 +258,36 @@ class Scan(Base):
             session.add(new_slice)
         return new_slice
 
+    def add_slices(self, number_of_slices: int, orientation: SliceOrientation = SliceOrientation.Z,
+                   locations: Optional[List[SliceLocation]] = None, size: Optional[Tuple[int, int]] = None) \
+            -> List[SliceID]:
+        """Add multiple new Slices into this Scan with bulk inserts within a single transaction.
+
+        NOTE: Slices are inserted without ORM's Unit of Work, so that it takes only a single
+              `INSERT ... VALUES` statement for each batch of `SLICES_INSERT_BATCH_SIZE` Slices.
+
+        :param number_of_slices: number of Slices that should be added
+        :param orientation: (optional) orientation of all new Slices
+        :param locations: (optional) locations for each of new Slices
+        :param size: (optional) height & width of all new Slices
+        :return: list of IDs for new Slices
+        """
+        slices_ids = [SliceID(str(uuid.uuid4())) for _ in range(number_of_slices)]
+        height, width = size or (None, None)
+        all_values = [{
+            'id': slices_ids[index],
+            'scan_id': self.id,
+            'orientation': orientation,
+            'location': locations[index] if locations else None,
+            'height': height,
+            'width': width,
+        } for index in range(number_of_slices)]
+        with db_transaction_session() as session:
+            for batch_begin in range(0, number_of_slices, SLICES_INSERT_BATCH_SIZE):
+                batch_values = all_values[batch_begin:batch_begin + SLICES_INSERT_BATCH_SIZE]
+                session.execute(Slice.__table__.insert().values(batch_values))
+        return slices_ids
+
     def update_status(self, status: ScanStatus) -> 'Scan':
         """Update Scan's status.
 
@@ -257,6 +303,10 @@ class Slice(Base):
     """Definition of a Slice."""
 
     __tablename__ = 'Slices'
+    __table_args__ = (
+        # Slices of a Scan are always fetched in a single orientation, ordered by their location
+        Index('ix_Slices_scan_id_orientation_location', 'scan_id', 'orientation', 'location'),
+    )
     id: SliceID = Column(String, primary_key=True)
     status: SliceStatus = Column(Enum(SliceStatus), nullable=False, default=SliceStatus.NEW)
     orientation: SliceOrientation = Column(Enum(SliceOrientation), nullable=False, default=SliceOrientation.Z)
@@ -333,6 +383,10 @@ class Label(Base):
     """Definition of a Label."""
 
     __tablename__ = 'Labels'
+    __table_args__ = (
+        # Scans already labeled by a User are excluded while sampling a random Scan for them
+        Index('ix_Labels_scan_id_owner_id_task_id', 'scan_id', 'owner_id', 'task_id'),
+    )
     id: LabelID = Column(String, primary_key=True)
     comment: Optional[str] = Column(String, nullable=True)
     labeling_time: LabelingTime = Column(Float, nullable=True)
@@ -827,15 +881,21 @@ class SurveyResponse(ActionResponse):
 @event.listens_for(BrushLabelElement, 'before_delete')
 def delete_brush_element_from_storage(mapper: Mapper, connection: Connection, target: Slice) -> None:
     """Delete BrushLabelElement from storage."""
-    brush_label_element = StorageBrushLabelElement.get(id=target.id)
-    brush_label_element.delete()
+    blobs.delete_one(StorageBrushLabelElement, target.id)
+
+
+# pylint: disable=unused-argument
+@event.listens_for(Scan, 'before_delete')
+def delete_packed_volume_from_storage(mapper: Mapper, connection: Connection, target: Scan) -> None:
+    """Delete packed volume of a Scan from storage (it may not exist, e.g. for Scans that were not converted)."""
+    volumes.delete_one(target.id)
 
 
 # pylint: disable=unused-argument
 @event.listens_for(Slice, 'before_delete')
 def delete_original_and_processed_slice_from_storage(mapper: Mapper, connection: Connection, target: Slice) -> None:
-    """Delete original and processed Slices from storage."""
-    original_slice = OriginalSlice.get(id=target.id)
-    original_slice.delete()
-    processed_slice = ProcessedSlice.get(id=target.id)
-    processed_slice.delete()
+    """Delete original and processed Slices from storage (they may not exist yet, e.g. for partial uploads)."""
+    chunks.delete_one(OriginalSlice, target.id)
+    tiles.delete_all(target.id, target.height, target.width)
+    previews.delete_all(target.id)
+    chunks.delete_one(ProcessedSlice, target.id)
@@ -13,6 +13,10 @@ class DicomTag(Enum):
     PIXEL_SPACING = '0028|0030'
     ROWS = '0028|0010'
     COLUMNS = '0028|0011'
+    SAMPLES_PER_PIXEL = '0028|0002'
+    NUMBER_OF_FRAMES = '0028|0008'
+    BITS_ALLOCATED = '0028|0100'
+    PIXEL_REPRESENTATION = '0028|0103'
     MODALITY = '0008|0060'
 
 
@@ -71,3 +75,11 @@ class LabelTool(Enum):
     BRUSH = 'BRUSH'
     POINT = 'POINT'
     CHAIN = 'CHAIN'
+
+
+class SliceCodec(Enum):
+    """Define available codecs for converted Slices."""
+
+    PNG = 'PNG'
+    WEBP = 'WEBP'  # Lossless WebP
+    RAW_ZLIB = 'RAW_ZLIB'  # Raw 8bit pixels compressed with zlib
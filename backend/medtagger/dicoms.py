@@ -1,15 +1,340 @@
 """Helpers for parsing DICOM images."""
-from typing import List, Union, Optional
+import struct
+import zlib
+from tempfile import NamedTemporaryFile
+from typing import Dict, Iterable, List, Union, Optional, Tuple
 
+import numpy as np
 import SimpleITK as sitk
 
 from medtagger.definitions import DicomTag
+from medtagger.exceptions import InvalidDicomException
 
+PREAMBLE_LENGTH = 128
+DICOM_PREFIX = b'DICM'
+UNDEFINED_LENGTH = 0xFFFFFFFF
 
-def read_int(dicom: Union[sitk.Image, sitk.ImageFileReader], tag: DicomTag) -> Optional[int]:
+FILE_META_GROUP = 0x0002
+IDENTIFYING_GROUP = 0x0008
+ITEMS_GROUP = 0xFFFE
+TRANSFER_SYNTAX_UID_TAG = 0x00020010
+PIXEL_DATA_TAG = 0x7FE00010
+ITEM_TAG = 0xFFFEE000
+ITEM_DELIMITATION_TAG = 0xFFFEE00D
+SEQUENCE_DELIMITATION_TAG = 0xFFFEE0DD
+
+IMPLICIT_VR_LITTLE_ENDIAN = '1.2.840.10008.1.2'
+EXPLICIT_VR_LITTLE_ENDIAN = '1.2.840.10008.1.2.1'
+EXPLICIT_VR_BIG_ENDIAN = '1.2.840.10008.1.2.2'
+DEFLATED_EXPLICIT_VR_LITTLE_ENDIAN = '1.2.840.10008.1.2.1.99'
+
+EXPLICIT_VRS = {b'AE', b'AS', b'AT', b'CS', b'DA', b'DS', b'DT', b'FL', b'FD', b'IS', b'LO', b'LT', b'OB', b'OD',
+                b'OF', b'OL', b'OV', b'OW', b'PN', b'SH', b'SL', b'SQ', b'SS', b'ST', b'SV', b'TM', b'UC', b'UI',
+                b'UL', b'UN', b'UR', b'US', b'UT', b'UV'}
+LONG_LENGTH_VRS = {'OB', 'OD', 'OF', 'OL', 'OV', 'OW', 'SQ', 'SV', 'UC', 'UN', 'UR', 'UT', 'UV'}
+NUMERIC_VRS = {'US': 'H', 'SS': 'h', 'UL': 'I', 'SL': 'i', 'FL': 'f', 'FD': 'd'}
+
+# Implicit VR encoding does not store VRs in the file, so we've got to know them for all supported Tags
+DICOM_TAGS_VRS = {
+    DicomTag.SLICE_LOCATION: 'DS',
+    DicomTag.IMAGE_POSITION_PATIENT: 'DS',
+    DicomTag.RESCALE_INTERCEPT: 'DS',
+    DicomTag.RESCALE_SLOPE: 'DS',
+    DicomTag.RESCALE_TYPE: 'LO',
+    DicomTag.PIXEL_SPACING: 'DS',
+    DicomTag.ROWS: 'US',
+    DicomTag.COLUMNS: 'US',
+    DicomTag.SAMPLES_PER_PIXEL: 'US',
+    DicomTag.NUMBER_OF_FRAMES: 'IS',
+    DicomTag.BITS_ALLOCATED: 'US',
+    DicomTag.PIXEL_REPRESENTATION: 'US',
+    DicomTag.MODALITY: 'CS',
+}
+
+# Tags needed to decode native (uncompressed) Pixel Data
+PIXEL_DATA_TAGS = (DicomTag.ROWS, DicomTag.COLUMNS, DicomTag.SAMPLES_PER_PIXEL, DicomTag.BITS_ALLOCATED,
+                   DicomTag.PIXEL_REPRESENTATION, DicomTag.RESCALE_INTERCEPT, DicomTag.RESCALE_SLOPE)
+SUPPORTED_BITS_ALLOCATED = {8, 16, 32}
+INT16_RANGE = np.iinfo(np.int16)
+
+
+class DicomHeader:
+    """DICOM header parsed directly from memory.
+
+    It follows metadata interface of SimpleITK's image & reader, so all of the `read_*` helpers can use it.
+    """
+
+    def __init__(self, metadata: Dict[str, str]) -> None:
+        """Initialize DICOM header.
+
+        :param metadata: mapping of DICOM Tags (in "gggg|eeee" format) to their string values
+        """
+        self._metadata = metadata
+
+    def __repr__(self) -> str:
+        """Return string representation for DICOM header."""
+        return '<{}: {}>'.format(self.__class__.__name__, self._metadata)
+
+    def HasMetaDataKey(self, key: str) -> bool:  # pylint: disable=invalid-name;  Follows SimpleITK interface
+        """Return boolean information if given Tag was found in DICOM header."""
+        return key in self._metadata
+
+    def GetMetaData(self, key: str) -> str:  # pylint: disable=invalid-name;  Follows SimpleITK interface
+        """Return value for given Tag or raise RuntimeError (just like SimpleITK does)."""
+        try:
+            return self._metadata[key]
+        except KeyError:
+            raise RuntimeError('Tag "{}" was not found in DICOM header.'.format(key))
+
+
+DicomMetadata = Union[sitk.Image, sitk.ImageFileReader, DicomHeader]
+
+
+class _DatasetReader:
+    """Sequential reader of Data Elements stored in DICOM dataset."""
+
+    def __init__(self, data: bytes, offset: int, explicit_vr: bool, byteorder: str) -> None:
+        """Initialize reader for a dataset that starts at given offset.
+
+        :param data: bytes with DICOM dataset
+        :param offset: offset of the first Data Element
+        :param explicit_vr: boolean information if dataset is encoded with Explicit VR
+        :param byteorder: either '<' (little endian) or '>' (big endian)
+        """
+        self.data = data
+        self.offset = offset
+        self.explicit_vr = explicit_vr
+        self.byteorder = byteorder
+
+    def read_transfer_syntax(self) -> str:
+        """Read File Meta Information group and return Transfer Syntax UID of the dataset that follows it."""
+        transfer_syntax = EXPLICIT_VR_LITTLE_ENDIAN
+        while self.peek_group() == FILE_META_GROUP:
+            tag, vr, length = self._read_element_header()
+            if tag == TRANSFER_SYNTAX_UID_TAG:
+                transfer_syntax = self._read_value(vr, length)
+            else:
+                self._skip_value(vr, length)
+        return transfer_syntax.strip(' ')
+
+    def read_tags(self, tags: Dict[int, DicomTag]) -> Dict[str, str]:
+        """Read values for given Tags and stop as soon as all of them were passed (way before Pixel Data).
+
+        :param tags: mapping of numeric Tags to DICOM Tags that should be read
+        :return: mapping of DICOM Tags (in "gggg|eeee" format) to their string values
+        """
+        metadata: Dict[str, str] = {}
+        last_tag = min(max(tags, default=0), PIXEL_DATA_TAG - 1)
+        while len(metadata) < len(tags) and self.offset < len(self.data):
+            if self.peek_tag() > last_tag:
+                break  # Data Elements are sorted by their Tags, so there is nothing more to read
+            tag, vr, length = self._read_element_header()
+            if tag in tags:
+                dicom_tag = tags[tag]
+                metadata[dicom_tag.value] = self._read_value(vr or DICOM_TAGS_VRS[dicom_tag], length)
+            else:
+                self._skip_value(vr, length)
+        return metadata
+
+    def read_pixel_data_location(self) -> Tuple[int, int]:
+        """Skip all Data Elements until Pixel Data and return offset and length of its value.
+
+        NOTE: Length is undefined for encapsulated (compressed) Pixel Data.
+        """
+        while self.offset < len(self.data):
+            tag, vr, length = self._read_element_header()
+            if tag == PIXEL_DATA_TAG:
+                return self.offset, length
+            self._skip_value(vr, length)
+        raise InvalidDicomException('DICOM file does not contain any Pixel Data.')
+
+    def peek_group(self) -> int:
+        """Return group of the next Data Element without moving the reader."""
+        return self.peek_tag() >> 16
+
+    def peek_tag(self) -> int:
+        """Return Tag of the next Data Element without moving the reader."""
+        group, element = struct.unpack_from(self.byteorder + 'HH', self.data, self.offset)
+        return group << 16 | element
+
+    def _read_element_header(self) -> Tuple[int, str, int]:
+        """Read header of the next Data Element (or Item) and return its Tag, VR and length of its value.
+
+        NOTE: VR is an empty string for Implicit VR encoding and for Items.
+        """
+        group, element = struct.unpack_from(self.byteorder + 'HH', self.data, self.offset)
+        tag = group << 16 | element
+        if group == ITEMS_GROUP or not self.explicit_vr:
+            length = struct.unpack_from(self.byteorder + 'I', self.data, self.offset + 4)[0]
+            self.offset += 8
+            return tag, '', length
+
+        vr = self.data[self.offset + 4:self.offset + 6].decode('ascii')
+        if vr in LONG_LENGTH_VRS:
+            length = struct.unpack_from(self.byteorder + 'I', self.data, self.offset + 8)[0]
+            self.offset += 12
+        else:
+            length = struct.unpack_from(self.byteorder + 'H', self.data, self.offset + 6)[0]
+            self.offset += 8
+        return tag, vr, length
+
+    def _read_value(self, vr: str, length: int) -> str:
+        """Read value of current Data Element and convert it to string (the same way as SimpleITK does)."""
+        value = self.data[self.offset:self.offset + length]
+        if len(value) != length:
+            raise InvalidDicomException('DICOM header is truncated.')
+        self.offset += length
+
+        if vr in NUMERIC_VRS:
+            number_format = NUMERIC_VRS[vr]
+            count = length // struct.calcsize(number_format)
+            numbers = struct.unpack_from(self.byteorder + number_format * count, value)
+            return '\\'.join(str(number) for number in numbers)
+        return value.decode('latin-1').rstrip('\x00')
+
+    def _skip_value(self, vr: str, length: int) -> None:
+        """Skip value of current Data Element (including nested Sequences)."""
+        if length != UNDEFINED_LENGTH:
+            self.offset += length
+        elif vr == 'UN':
+            # Values of unknown VR with undefined length are always encoded with Implicit VR (PS3.5 6.2.2)
+            explicit_vr, self.explicit_vr = self.explicit_vr, False
+            self._skip_until(SEQUENCE_DELIMITATION_TAG)
+            self.explicit_vr = explicit_vr
+        else:
+            self._skip_until(SEQUENCE_DELIMITATION_TAG)
+
+    def _skip_until(self, delimitation_tag: int) -> None:
+        """Skip all Data Elements (or Items) until given delimitation Tag closes value of undefined length."""
+        while True:
+            tag, vr, length = self._read_element_header()
+            if tag == delimitation_tag:
+                return
+            if tag == ITEM_TAG and length == UNDEFINED_LENGTH:
+                self._skip_until(ITEM_DELIMITATION_TAG)
+            else:
+                self._skip_value(vr, length)
+
+
+def read_dicom_header(data: bytes, tags: Iterable[DicomTag] = tuple(DicomTag)) -> DicomHeader:
+    """Parse DICOM header directly from memory without reading any pixel data.
+
+    :param data: bytes with DICOM file
+    :param tags: (optional) DICOM Tags which should be read (by default all of them supported by MedTagger)
+    :return: DICOM header with values for all of the given Tags found in the file
+    """
+    try:
+        reader = _open_dataset(data)
+        return DicomHeader(reader.read_tags(_get_numeric_tags(tags)))
+    except (struct.error, UnicodeDecodeError, zlib.error, RecursionError) as exception:
+        raise InvalidDicomException('Could not parse DICOM header.') from exception
+
+
+def read_dicom_pixels(data: bytes) -> np.ndarray:
+    """Read pixels of DICOM image (or its first frame) with Modality rescale applied (eg. Hounsfield Units).
+
+    Native (uncompressed) Pixel Data is read directly from memory. Compressed images are decoded by SimpleITK.
+
+    :param data: bytes with DICOM file
+    :return: 2D numpy array with int16 pixels (or float32 pixels if they do not fit into int16)
+    """
+    try:
+        pixels = _read_native_pixels(data)
+    except (struct.error, UnicodeDecodeError, zlib.error, RecursionError, ValueError) as exception:
+        raise InvalidDicomException('Could not read DICOM pixels.') from exception
+    if pixels is None:
+        return _read_pixels_with_simpleitk(data)
+    return pixels
+
+
+def _get_numeric_tags(tags: Iterable[DicomTag]) -> Dict[int, DicomTag]:
+    """Return mapping of numeric Tags to given DICOM Tags."""
+    return {int(tag.value.replace('|', ''), 16): tag for tag in tags}
+
+
+def _read_native_pixels(data: bytes) -> Optional[np.ndarray]:
+    """Read native Pixel Data directly from memory or return None if it has to be decoded by SimpleITK."""
+    reader = _open_dataset(data)
+    header = DicomHeader(reader.read_tags(_get_numeric_tags(PIXEL_DATA_TAGS)))
+    dtype = _get_pixels_dtype(header, reader.byteorder)
+    if not dtype:
+        return None
+
+    offset, length = reader.read_pixel_data_location()
+    if length == UNDEFINED_LENGTH:
+        return None  # Pixel Data is encapsulated, so it is compressed
+
+    rows, columns = read_int(header, DicomTag.ROWS) or 0, read_int(header, DicomTag.COLUMNS) or 0
+    pixels = np.frombuffer(reader.data, dtype=dtype, count=rows * columns, offset=offset)
+    return _apply_modality_rescale(pixels.reshape(rows, columns), header)
+
+
+def _get_pixels_dtype(header: DicomHeader, byteorder: str) -> Optional[np.dtype]:
+    """Return numpy's type for single-sample pixels or None if such pixels are not supported."""
+    bits_allocated = read_int(header, DicomTag.BITS_ALLOCATED) or 0
+    if (read_int(header, DicomTag.SAMPLES_PER_PIXEL) or 1) != 1 or bits_allocated not in SUPPORTED_BITS_ALLOCATED:
+        return None
+    kind = 'i' if read_int(header, DicomTag.PIXEL_REPRESENTATION) == 1 else 'u'
+    return np.dtype('{}{}{}'.format(byteorder, kind, bits_allocated // 8))
+
+
+def _apply_modality_rescale(pixels: np.ndarray, header: DicomHeader) -> np.ndarray:
+    """Apply Rescale Slope & Intercept to the stored pixels (the same way as SimpleITK does)."""
+    slope = read_float(header, DicomTag.RESCALE_SLOPE) or 1.0
+    intercept = read_float(header, DicomTag.RESCALE_INTERCEPT) or 0.0
+    rescaled_pixels = pixels * np.float32(slope) + np.float32(intercept)
+    if slope.is_integer() and intercept.is_integer() and \
+            INT16_RANGE.min <= rescaled_pixels.min() and rescaled_pixels.max() <= INT16_RANGE.max:
+        return rescaled_pixels.astype(np.int16)
+    return rescaled_pixels.astype(np.float32, copy=False)
+
+
+def _read_pixels_with_simpleitk(data: bytes) -> np.ndarray:
+    """Decode pixels with SimpleITK, which can read only files stored on a hard drive."""
+    with NamedTemporaryFile(suffix='.dcm') as temp_file:
+        temp_file.write(data)
+        temp_file.flush()
+        try:
+            image = sitk.ReadImage(temp_file.name)
+        except RuntimeError as exception:
+            raise InvalidDicomException('Could not read DICOM pixels.') from exception
+    pixels = sitk.GetArrayFromImage(image)[0]
+    return pixels if pixels.dtype == np.int16 else pixels.astype(np.float32)
+
+
+def _open_dataset(data: bytes) -> _DatasetReader:
+    """Prepare reader for the dataset stored in given DICOM file (with or without preamble)."""
+    offset = PREAMBLE_LENGTH + len(DICOM_PREFIX) if data[PREAMBLE_LENGTH:].startswith(DICOM_PREFIX) else 0
+    meta_reader = _DatasetReader(data, offset, explicit_vr=True, byteorder='<')
+    group = meta_reader.peek_group()
+    if group == FILE_META_GROUP:
+        transfer_syntax = meta_reader.read_transfer_syntax()
+        return _create_dataset_reader(data, meta_reader.offset, transfer_syntax)
+
+    # Some (mostly older) DICOM files are stored without File Meta Information, so let's guess their encoding
+    if group != IDENTIFYING_GROUP:
+        raise InvalidDicomException('Given file does not look like a DICOM.')
+    explicit_vr = data[offset + 4:offset + 6] in EXPLICIT_VRS
+    return _DatasetReader(data, offset, explicit_vr=explicit_vr, byteorder='<')
+
+
+def _create_dataset_reader(data: bytes, offset: int, transfer_syntax: str) -> _DatasetReader:
+    """Prepare reader for the dataset encoded with given Transfer Syntax."""
+    if transfer_syntax == IMPLICIT_VR_LITTLE_ENDIAN:
+        return _DatasetReader(data, offset, explicit_vr=False, byteorder='<')
+    if transfer_syntax == EXPLICIT_VR_BIG_ENDIAN:
+        return _DatasetReader(data, offset, explicit_vr=True, byteorder='>')
+    if transfer_syntax == DEFLATED_EXPLICIT_VR_LITTLE_ENDIAN:
+        # Deflated dataset is compressed with raw Deflate algorithm (without any zlib header)
+        return _DatasetReader(zlib.decompress(data[offset:], -zlib.MAX_WBITS), 0, explicit_vr=True, byteorder='<')
+    # All other Transfer Syntaxes (including compressed Pixel Data) use Explicit VR Little Endian for the header
+    return _DatasetReader(data, offset, explicit_vr=True, byteorder='<')
+
+
+def read_int(dicom: DicomMetadata, tag: DicomTag) -> Optional[int]:
     """Read an integer value from DICOM image.
 
-    :param dicom: either a DICOM image or reader for DICOM image
+    :param dicom: either a DICOM image, reader for DICOM image or DICOM header parsed in memory
     :param tag: DICOM Tag which should be read for this image
     :return: integer value for given Tag or default value
     """
@@ -19,10 +344,10 @@ def read_int(dicom: Union[sitk.Image, sitk.ImageFileReader], tag: DicomTag) -> O
         return None
 
 
-def read_float(dicom: Union[sitk.Image, sitk.ImageFileReader], tag: DicomTag) -> Optional[float]:
+def read_float(dicom: DicomMetadata, tag: DicomTag) -> Optional[float]:
     """Read a float value from DICOM image.
 
-    :param dicom: either a DICOM image or reader for DICOM image
+    :param dicom: either a DICOM image, reader for DICOM image or DICOM header parsed in memory
     :param tag: DICOM Tag which should be read for this image
     :return: float value for given Tag or default value
     """
@@ -32,10 +357,10 @@ def read_float(dicom: Union[sitk.Image, sitk.ImageFileReader], tag: DicomTag) ->
         return None
 
 
-def read_string(dicom: Union[sitk.Image, sitk.ImageFileReader], tag: DicomTag) -> Optional[str]:
+def read_string(dicom: DicomMetadata, tag: DicomTag) -> Optional[str]:
     """Read a string value from DICOM image.
 
-    :param dicom: either a DICOM image or reader for DICOM image
+    :param dicom: either a DICOM image, reader for DICOM image or DICOM header parsed in memory
     :param tag: DICOM Tag which should be read for this image
     :return: string value for given Tag or default value
     """
@@ -45,10 +370,10 @@ def read_string(dicom: Union[sitk.Image, sitk.ImageFileReader], tag: DicomTag) -
         return None
 
 
-def read_list(dicom: Union[sitk.Image, sitk.ImageFileReader], tag: DicomTag) -> Optional[List]:
+def read_list(dicom: DicomMetadata, tag: DicomTag) -> Optional[List]:
     """Read a list value from DICOM image.
 
-    :param dicom: either a DICOM image or reader for DICOM image
+    :param dicom: either a DICOM image, reader for DICOM image or DICOM header parsed in memory
     :param tag: DICOM Tag which should be read for this image
     :return: list value for given Tag or default value
     """
@@ -23,3 +23,9 @@ class InternalErrorException(MedTaggerException):
     """Exception designed to use to indicate internal errors (like DB/Storage error)."""
 
     pass  # pylint: disable=unnecessary-pass
+
+
+class InvalidDicomException(MedTaggerException):
+    """Exception designed to use while given bytes could not be parsed as a DICOM file."""
+
+    pass  # pylint: disable=unnecessary-pass
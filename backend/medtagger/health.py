@@ -0,0 +1,64 @@
+"""Module responsible for checking health of services that MedTagger depends on."""
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Iterable
+
+import numpy as np
+
+LATENCY_PERCENTILES = (50, 90, 99)
+LATENCY_HISTORY_SIZE = 100
+
+
+class HealthCheck:  # pylint: disable=too-few-public-methods
+    """Health check of a single service with cached result and history of its latency.
+
+    Service is checked at most once per given time to live. All callers within that time (also the ones waiting
+    for the pending check) receive the same cached result, so that frequent polling does not overload the service.
+    """
+
+    def __init__(self, name: str, probe: Callable[[], bool], ttl: float) -> None:
+        """Initialize Health Check.
+
+        :param name: name of the checked service
+        :param probe: function that returns boolean information if service is alive
+        :param ttl: number of seconds for which result of a check is cached
+        """
+        self.name = name
+        self.probe = probe
+        self.ttl = ttl
+        self._latencies: Deque[float] = deque(maxlen=LATENCY_HISTORY_SIZE)
+        self._lock = threading.Lock()
+        self._checked_at = -float('inf')
+        self._status: Dict[str, Any] = {}
+
+    def get_status(self) -> Dict[str, Any]:
+        """Return status of the service, checking it again only if cached result has expired.
+
+        :return: dictionary with information if service is alive and percentiles of its latency (in milliseconds)
+        """
+        with self._lock:
+            if time.monotonic() - self._checked_at >= self.ttl:
+                self._check()
+            return self._status
+
+    def _check(self) -> None:
+        """Check if service is alive and note down latency of this check."""
+        start_time = time.perf_counter()
+        alive = self.probe()
+        self._latencies.append((time.perf_counter() - start_time) * 1000)
+        self._checked_at = time.monotonic()
+        self._status = {
+            'alive': alive,
+            'latency': get_latency_percentiles(self._latencies),
+        }
+
+
+def get_latency_percentiles(latencies: Iterable[float]) -> Dict[str, float]:
+    """Return percentiles of given latencies.
+
+    :param latencies: latencies of previous checks
+    :return: dictionary with percentiles (e.g. 'p90') as keys
+    """
+    values = np.percentile(list(latencies), LATENCY_PERCENTILES)
+    return {'p{}'.format(percentile): float(value) for percentile, value in zip(LATENCY_PERCENTILES, values)}
@@ -1,8 +1,9 @@
 """Module responsible for definition of DatasetsRepository."""
-from typing import List
+from typing import List, Optional
 
 from medtagger.database import db_connection_session, db_transaction_session
 from medtagger.database.models import Dataset
+from medtagger.definitions import SliceCodec
 from medtagger.exceptions import InternalErrorException
 
 
@@ -25,28 +26,38 @@ def get_dataset_by_key(key: str) -> Dataset:
     return dataset
 
 
-def add_new_dataset(key: str, name: str) -> Dataset:
+def add_new_dataset(key: str, name: str, slices_codec: SliceCodec = SliceCodec.PNG,
+                    slices_compression_level: Optional[int] = None) -> Dataset:
     """Add new Dataset to the database.
 
     :param key: key that will identify such Dataset
     :param name: name that will be used in the Use Interface for such Dataset
+    :param slices_codec: (optional) codec used for converted Slices in this Dataset
+    :param slices_compression_level: (optional) compression level for above codec
     :return: Dataset object
     """
-    dataset = Dataset(key, name)
+    dataset = Dataset(key, name, slices_codec, slices_compression_level)
     with db_transaction_session() as session:
         session.add(dataset)
     return dataset
 
 
-def update(key: str, name: str) -> Dataset:
+def update(key: str, name: str, slices_codec: SliceCodec = SliceCodec.PNG,
+           slices_compression_level: Optional[int] = None) -> Dataset:
     """Update Dataset in the database.
 
+    NOTE: New codec will be used only for Scans converted from now on.
+
     :param key: key that will identify such Dataset
     :param name: new name for given Dataset
+    :param slices_codec: (optional) codec used for converted Slices in this Dataset
+    :param slices_compression_level: (optional) compression level for above codec
     :return: Dataset object
     """
     dataset = get_dataset_by_key(key)
     dataset.name = name
+    dataset.slices_codec = slices_codec
+    dataset.slices_compression_level = slices_compression_level
     dataset.save()
     return dataset
 
@@ -1,14 +1,33 @@
 """Module responsible for definition of LabelsRepository."""
-from typing import List, Optional
+from collections import defaultdict
+from functools import partial
+from typing import Dict, FrozenSet, List, Optional, Set, Tuple
 
 from sqlalchemy.sql.expression import func
 
-from medtagger.database import db_transaction_session
+from medtagger.cache import LRUCache
+from medtagger.config import AppConfiguration
+from medtagger.database import db_connection_session, db_transaction_session
 from medtagger.database.models import Label, LabelTag, User, RectangularLabelElement, BrushLabelElement, \
     PointLabelElement, ChainLabelElement, ChainLabelElementPoint, Task, Scan
 from medtagger.definitions import LabelVerificationStatus
+from medtagger.storage import blobs
 from medtagger.storage.models import BrushLabelElement as BrushLabelElementStorage
-from medtagger.types import LabelID, LabelPosition, LabelShape, LabelElementID, ScanID, LabelingTime, Point
+from medtagger.types import LabelID, LabelPosition, LabelShape, LabelElementID, ScanID, LabelingTime, Point, \
+    PredefinedBrushLabelElement, UserID, TaskID
+
+configuration = AppConfiguration()
+# Entries are keyed by Scan, Task and version of their Predefined Labels (so that changes made by any process are
+# visible right away), while outdated entries are evicted as the least recently used ones
+PredefinedLabelsKey = Tuple[ScanID, str, Tuple]
+predefined_brush_label_elements_cache: LRUCache[PredefinedLabelsKey, List[PredefinedBrushLabelElement]] = LRUCache(
+    max_size=configuration.getint('api', 'predefined_labels_cache_size', fallback=32),
+    ttl=configuration.getint('api', 'predefined_labels_cache_ttl', fallback=600),
+)
+labeled_scans_cache: LRUCache[Tuple[UserID, TaskID], FrozenSet[ScanID]] = LRUCache(
+    max_size=configuration.getint('api', 'labeled_scans_cache_size', fallback=1024),
+    ttl=configuration.getint('api', 'labeled_scans_cache_ttl', fallback=600),
+)
 
 
 def get_all_labels() -> List[Label]:
@@ -49,24 +68,114 @@ def get_predefined_label_for_scan_in_task(scan: Scan, task: Task) -> Optional[La
     return query.first()
 
 
-def get_predefined_brush_label_elements(scan_id: ScanID, task_id: int,
-                                        begin: int, count: int) -> List[BrushLabelElement]:
-    """Fetch Predefined Brush Label Elements for given Scan and Task.
+def get_predefined_brush_label_elements(scan_id: ScanID, task_key: str) -> List[PredefinedBrushLabelElement]:
+    """Return Predefined Brush Label Elements (with their images) for given Scan and Task.
+
+    NOTE: Elements for the whole Scan are cached within the process (see `predefined_brush_label_elements_cache`),
+          so that scrolling through the Scan does not fetch them again for each request. Only their number and time
+          of the last change of their Labels are checked, so that Labels added by other processes are not missed.
 
     :param scan_id: ID of a given Scan
-    :param task_id: ID of a given Task
-    :param begin: first Slice index
-    :param count: number of Slices for which Label Elements will be returned
-    :return: list of Brush Label Elements
+    :param task_key: key of a given Task
+    :return: list of Brush Label Elements ordered by their Slice index
     """
-    query = BrushLabelElement.query
-    query = query.join(Label)
-    query = query.filter(Label.is_predefined)
-    query = query.filter(Label.scan_id == scan_id)
-    query = query.filter(Label.task_id == task_id)
-    query = query.filter(BrushLabelElement.slice_index >= begin)
-    query = query.filter(BrushLabelElement.slice_index < begin + count)
-    return query.all()
+    version = _get_predefined_brush_label_elements_version(scan_id, task_key)
+    load = partial(_get_predefined_brush_label_elements, scan_id, task_key)
+    return predefined_brush_label_elements_cache.get_or_load((scan_id, task_key, version), load)
+
+
+def _get_predefined_brush_label_elements_version(scan_id: ScanID, task_key: str) -> Tuple:
+    """Fetch number of Predefined Brush Label Elements and time of the last change of their Labels."""
+    with db_connection_session() as session:
+        query = session.query(BrushLabelElement)
+        query = query.with_entities(func.count(BrushLabelElement.id),
+                                    func.max(Label._modified))  # pylint: disable=protected-access
+        query = query.join(Label).join(Task)
+        query = query.filter(Label.is_predefined)
+        query = query.filter(Label.scan_id == scan_id)
+        query = query.filter(Task.key == task_key)
+        return tuple(query.one())
+
+
+def _get_predefined_brush_label_elements(scan_id: ScanID, task_key: str) -> List[PredefinedBrushLabelElement]:
+    """Fetch Predefined Brush Label Elements with keys of their Tags and fetch all their images concurrently."""
+    with db_connection_session() as session:
+        query = session.query(BrushLabelElement)
+        query = query.with_entities(BrushLabelElement.id, BrushLabelElement.slice_index, LabelTag.key)
+        query = query.join(Label).join(Task).join(LabelTag, BrushLabelElement.tag_id == LabelTag.id)
+        query = query.filter(Label.is_predefined)
+        query = query.filter(Label.scan_id == scan_id)
+        query = query.filter(Task.key == task_key)
+        query = query.order_by(BrushLabelElement.slice_index)
+        label_elements = query.all()
+
+    images = blobs.get_many(BrushLabelElementStorage, [label_element.id for label_element in label_elements])
+    return [PredefinedBrushLabelElement(element_id, slice_index, tag_key, images[element_id][0])
+            for element_id, slice_index, tag_key in label_elements if element_id in images]
+
+
+def get_labeled_scans_ids(user_id: UserID, task_id: TaskID) -> FrozenSet[ScanID]:
+    """Return IDs of Scans that were already labeled by given User in given Task (Predefined Labels are skipped).
+
+    NOTE: IDs are cached within the process (see `labeled_scans_cache`) and updated once new Label is added (see
+          `mark_scan_as_labeled()`), so that choosing next Scan for the User does not query all of their Labels.
+          Labels added by other processes may be missing, so these IDs should be used only as a pre-filter.
+
+    :param user_id: ID of a User
+    :param task_id: ID of a Task
+    :return: set of Scan IDs
+    """
+    load = partial(_get_labeled_scans_ids, user_id, task_id)
+    return labeled_scans_cache.get_or_load((user_id, task_id), load)
+
+
+def mark_scan_as_labeled(user_id: UserID, task_id: TaskID, scan_id: ScanID) -> None:
+    """Add Scan to cached IDs of Scans labeled by given User in given Task (if they are cached).
+
+    :param user_id: ID of a User
+    :param task_id: ID of a Task
+    :param scan_id: ID of a Scan for which Label was added
+    """
+    labeled_scans_cache.update((user_id, task_id), lambda scans_ids: scans_ids | {scan_id})
+
+
+def warm_up_labeled_scans_cache() -> int:
+    """Load IDs of Scans labeled by all Users in all Tasks into the cache with a single query.
+
+    :return: number of cached entries (pairs of User and Task)
+    """
+    labeled_scans_ids: Dict[Tuple[UserID, TaskID], Set[ScanID]] = defaultdict(set)
+    with db_connection_session() as session:
+        query = session.query(Label).with_entities(Label.owner_id, Label.task_id, Label.scan_id)
+        query = query.filter(~Label.is_predefined)
+        for user_id, task_id, scan_id in query.all():
+            labeled_scans_ids[(user_id, task_id)].add(scan_id)
+
+    for key, scans_ids in labeled_scans_ids.items():
+        labeled_scans_cache.put(key, frozenset(scans_ids))
+    return min(len(labeled_scans_ids), labeled_scans_cache.max_size)
+
+
+def check_labeled_scans_cache() -> Tuple[int, List[Tuple[UserID, TaskID]]]:
+    """Compare cached IDs of labeled Scans with Labels in database and invalidate entries that are not consistent.
+
+    :return: tuple with number of checked entries and keys (pairs of User and Task) of inconsistent ones
+    """
+    entries = labeled_scans_cache.items()
+    inconsistent_keys = [key for key, scans_ids in entries if scans_ids != _get_labeled_scans_ids(*key)]
+    for key in inconsistent_keys:
+        labeled_scans_cache.invalidate(key)
+    return len(entries), inconsistent_keys
+
+
+def _get_labeled_scans_ids(user_id: UserID, task_id: TaskID) -> FrozenSet[ScanID]:
+    """Fetch IDs of Scans labeled by given User in given Task (without ORM objects)."""
+    with db_connection_session() as session:
+        query = session.query(Label).with_entities(Label.scan_id)
+        query = query.filter(Label.owner_id == user_id)
+        query = query.filter(Label.task_id == task_id)
+        query = query.filter(~Label.is_predefined)
+        return frozenset(label.scan_id for label in query.all())
 
 
 # pylint: disable=too-many-arguments;  They are needed to fulfill Label model needs
@@ -126,7 +235,7 @@ def add_new_brush_label_element(label_id: LabelID, slice_index: int, width: int,
 
     with db_transaction_session() as session:
         session.add(brush_label_element)
-    BrushLabelElementStorage.create(id=brush_label_element.id, image=image)
+    blobs.put_one(BrushLabelElementStorage, brush_label_element.id, (image,))
     return brush_label_element.id
 
 
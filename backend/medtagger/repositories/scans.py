@@ -1,13 +1,20 @@
 """Module responsible for definition of ScansRepository."""
-from typing import List, Tuple
+import random
+from typing import AbstractSet, Iterable, Iterator, List, Optional, Set, Tuple
 
+from sqlalchemy import and_
+from sqlalchemy.orm import Query
 from sqlalchemy.sql.expression import func
 
 from medtagger.database import db_connection_session, db_transaction_session
 from medtagger.database.models import Dataset, Scan, Slice, User, Label, Task, datasets_tasks
 from medtagger.definitions import ScanStatus, SliceStatus
+from medtagger.storage import volumes
 from medtagger.types import ScanID
 
+# Scans labeled by a User are excluded with NOT IN only if there are few of them (NOT EXISTS is used otherwise)
+MAX_EXCLUDED_SCANS_IN_QUERY = 100
+
 
 def get_paginated_scans(dataset_key: str = None, page: int = 1, per_page: int = 25) -> Tuple[List[Scan], int]:
     """Fetch and return all Scans filtered by given parameters.
@@ -38,27 +45,89 @@ def get_scan_by_id(scan_id: ScanID) -> Scan:
     return Scan.query.filter(Scan.id == scan_id).one()
 
 
-def get_random_scan(task: Task = None, user: User = None) -> Scan:
+def get_random_scan(task: Task = None, user: User = None,
+                    labeled_scans_ids: AbstractSet[ScanID] = frozenset()) -> Optional[Scan]:
     """Fetch random Scan from database.
 
+    Scan is sampled by seeking to the first available Scan with a random key greater than a randomly picked value
+    (wrapping around to the lowest one), so that all matching Scans do not have to be sorted for each request.
+
+    Scans labeled by the User are always excluded in SQL. Known IDs of such Scans (e.g. cached ones) are excluded
+    directly if there are few of them, but as they may be outdated, chosen Scan is checked against Labels of the User
+    afterwards. Otherwise (or if such check failed), all Labels of the User are checked with an anti-join.
+
     :param task: (optional) Task from which scan should be fetched
     :param user: (optional) User for which Scan should be randomized
-    :return: Label object
+    :param labeled_scans_ids: (optional) IDs of Scans known to be labeled by the User (used only as a pre-filter)
+    :return: Scan object (or None if there is no such Scan)
+    """
+    random_key = random.random()
+    if user and len(labeled_scans_ids) > MAX_EXCLUDED_SCANS_IN_QUERY:
+        return _get_first_scan_after_key(_get_available_scans_query(task, user), random_key)
+
+    scan = _get_first_scan_after_key(_get_available_scans_query(task, excluded_scans_ids=labeled_scans_ids), random_key)
+    if scan and user and is_scan_labeled_by_user(scan.id, user, task):
+        # Known IDs were outdated (e.g. Label was added by another process), so they cannot be trusted anymore
+        scan = _get_first_scan_after_key(_get_available_scans_query(task, user), random_key)
+    return scan
+
+
+def _get_first_scan_after_key(query: Query, random_key: float) -> Optional[Scan]:
+    """Return Scan with the lowest random key not lower than given one (wrapping around to the lowest one)."""
+    scan = query.filter(Scan.random_key >= random_key).order_by(Scan.random_key).first()
+    if not scan:
+        scan = query.filter(Scan.random_key < random_key).order_by(Scan.random_key).first()
+    return scan
+
+
+def is_scan_labeled_by_user(scan_id: ScanID, user: User, task: Task = None) -> bool:
+    """Check if given Scan was labeled by given User (Predefined Labels are skipped).
+
+    :param scan_id: ID of a Scan
+    :param user: User who may have labeled the Scan
+    :param task: (optional) Task in which the Scan should have been labeled
+    :return: boolean information if there is such Label
     """
+    labels = _get_labels_of_user_query(user, task).filter(Label.scan_id == scan_id)
+    return labels.session.query(labels.exists()).scalar()
+
+
+def _get_available_scans_query(task: Task = None, user: User = None,
+                               excluded_scans_ids: AbstractSet[ScanID] = frozenset()) -> Query:
+    """Return query for available Scans in given Task, which were not labeled by given User and are not excluded."""
     query = Scan.query
     if task:
-        query = query.join(Dataset).join(datasets_tasks).join(Task)
-        query = query.filter(Task.key == task.key)
+        query = query.join(datasets_tasks, datasets_tasks.c.dataset_id == Scan.dataset_id)
+        query = query.filter(datasets_tasks.c.task_id == task.id)
     if user:
-        labeled_scans_ids = Label.query.with_entities(Label.scan_id)
-        labeled_scans_ids = labeled_scans_ids.filter(Label.owner == user)
-        if task:
-            labeled_scans_ids = labeled_scans_ids.filter(Label.task == task)
-            labeled_scans_ids = labeled_scans_ids.filter(~Label.is_predefined)
-        query = query.filter(~Scan.id.in_(labeled_scans_ids.subquery()))  # type: ignore  # "ScanID" doesn't have "in_"
-    query = query.filter(Scan.status == ScanStatus.AVAILABLE)
-    query = query.order_by(func.random())
-    return query.first()
+        query = query.filter(~_get_labels_of_user_query(user, task).filter(Label.scan_id == Scan.id).exists())
+    elif excluded_scans_ids:
+        query = query.filter(~Scan.id.in_(excluded_scans_ids))  # type: ignore  # "ScanID" doesn't have "in_"
+    return query.filter(Scan.status == ScanStatus.AVAILABLE)
+
+
+def _get_labels_of_user_query(user: User, task: Task = None) -> Query:
+    """Return query for Labels (without Predefined ones) added by given User in given Task."""
+    query = Label.query.filter(Label.owner_id == user.id)
+    if task:
+        query = query.filter(Label.task_id == task.id)
+    return query.filter(~Label.is_predefined)
+
+
+def get_available_scans_coverage(task: Task) -> List[Tuple[ScanID, int, int]]:
+    """Fetch number of Labels in given Task and skip count for each available Scan in this Task.
+
+    :param task: Task for which Scans should be fetched
+    :return: list of tuples with Scan ID, number of its Labels (Predefined Labels are skipped) and its skip count
+    """
+    with db_connection_session() as session:
+        query = session.query(Scan).with_entities(Scan.id, func.count(Label.id), Scan.skip_count)
+        query = query.join(datasets_tasks, datasets_tasks.c.dataset_id == Scan.dataset_id)
+        query = query.outerjoin(Label, and_(Label.scan_id == Scan.id, Label.task_id == task.id, ~Label.is_predefined))
+        query = query.filter(datasets_tasks.c.task_id == task.id)
+        query = query.filter(Scan.status == ScanStatus.AVAILABLE)
+        query = query.group_by(Scan.id)
+        return query.all()
 
 
 def delete_scan_by_id(scan_id: ScanID) -> None:
@@ -114,3 +183,31 @@ def increase_skip_count_of_a_scan(scan_id: ScanID) -> bool:
         query = query.filter(Scan.id == scan_id)
         updated = query.update({'skip_count': Scan.skip_count + 1})
         return bool(updated)
+
+
+def store_packed_volume(scan_id: ScanID, parts: Iterable[bytes]) -> Set[str]:
+    """Store packed volume for given Scan (replacing the previous one) using concurrent asynchronous inserts.
+
+    :param scan_id: ID of a Scan
+    :param parts: consecutive parts of packed volume
+    :return: set of IDs for chunks of the volume that could not be stored
+    """
+    volumes.delete_one(scan_id)
+    return volumes.put_one(scan_id, parts)
+
+
+def get_packed_volume_info(scan_id: ScanID) -> volumes.VolumeInfo:
+    """Return information about packed volume stored for given Scan."""
+    return volumes.get_info(scan_id)
+
+
+def iterate_packed_volume(scan_id: ScanID, info: volumes.VolumeInfo, start: int, stop: int) -> Iterator[bytes]:
+    """Return generator of consecutive parts of given range of bytes from packed volume of given Scan.
+
+    :param scan_id: ID of a Scan
+    :param info: information about packed volume of this Scan
+    :param start: index of the first byte (included)
+    :param stop: index of the last byte (excluded)
+    :return: generator of bytes fetched lazily from the Storage
+    """
+    return volumes.iterate_range(scan_id, info, start, stop)
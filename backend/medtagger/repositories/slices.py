@@ -1,10 +1,28 @@
 """Module responsible for definition of SlicesRepository."""
-from typing import List, Set
+from functools import partial
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from sqlalchemy import func
 
 from medtagger import definitions
+from medtagger.cache import LRUCache
+from medtagger.config import AppConfiguration
 from medtagger.database import db_connection_session, db_transaction_session, models as db_models
+from medtagger.storage import blobs, chunks, previews, tiles
 from medtagger.storage.models import OriginalSlice, ProcessedSlice
-from medtagger.types import SliceID, ScanID
+from medtagger.types import SliceID, ScanID, SliceMetadata, TilePosition
+
+CONVERTED_IMAGE_COLUMNS = ('image', 'codec')
+STORED_CONVERTED_IMAGE_COLUMNS = ('image', 'codec', 'tile_size')
+
+configuration = AppConfiguration()
+# Entries are keyed by Scan, orientation and version of its Slices (so that changes made by any process, e.g. by
+# workers, are visible right away), while outdated entries are evicted as the least recently used ones
+OrderedSlicesKey = Tuple[ScanID, definitions.SliceOrientation, Tuple]
+ordered_slices_ids_cache: LRUCache[OrderedSlicesKey, List[SliceID]] = LRUCache(
+    max_size=configuration.getint('api', 'slices_cache_size', fallback=256),
+    ttl=configuration.getint('api', 'slices_cache_ttl', fallback=60),
+)
 
 
 def get_slice_by_id(slice_id: SliceID) -> db_models.Slice:
@@ -26,6 +44,81 @@ def get_slices_by_scan_id(scan_id: ScanID, orientation: definitions.SliceOrienta
     return slices
 
 
+def get_ordered_slices_ids(scan_id: ScanID,
+                           orientation: definitions.SliceOrientation = definitions.SliceOrientation.Z) -> List[SliceID]:
+    """Return IDs of all Slices in given Scan and orientation ordered by their location.
+
+    NOTE: IDs are cached within the process (see `ordered_slices_ids_cache`), so that scrolling through the Scan
+          does not fetch all of its Slices for each request. Only their number and time of the last change are
+          checked, so that Slices added, converted or removed by other processes are not missed.
+
+    :param scan_id: ID of a Scan
+    :param orientation: (optional) orientation of Slices (Z by default)
+    :return: list of Slice IDs
+    """
+    version = _get_ordered_slices_ids_version(scan_id, orientation)
+    load = partial(_get_ordered_slices_ids, scan_id, orientation)
+    return ordered_slices_ids_cache.get_or_load((scan_id, orientation, version), load)
+
+
+def _get_ordered_slices_ids_version(scan_id: ScanID, orientation: definitions.SliceOrientation) -> Tuple:
+    """Fetch number of Slices in given Scan and orientation and time of the last change of any of them."""
+    with db_connection_session() as session:
+        query = session.query(db_models.Slice)
+        query = query.with_entities(func.count(db_models.Slice.id),
+                                    func.max(db_models.Slice._modified))  # pylint: disable=protected-access
+        query = query.filter(db_models.Slice.scan_id == scan_id)
+        query = query.filter(db_models.Slice.orientation == orientation)
+        return tuple(query.one())
+
+
+def _get_ordered_slices_ids(scan_id: ScanID, orientation: definitions.SliceOrientation) -> List[SliceID]:
+    """Fetch IDs of all Slices in given Scan and orientation ordered by their location (without ORM objects)."""
+    with db_connection_session() as session:
+        query = session.query(db_models.Slice).with_entities(db_models.Slice.id)
+        query = query.filter(db_models.Slice.scan_id == scan_id)
+        query = query.filter(db_models.Slice.orientation == orientation)
+        query = query.order_by(db_models.Slice.location)
+        return [_slice.id for _slice in query.all()]
+
+
+def get_slices_ids_by_status(scan_id: ScanID, status: definitions.SliceStatus) -> List[SliceID]:
+    """Fetch IDs of all Slices in given Scan that have given status.
+
+    :param scan_id: ID of a Scan
+    :param status: status of Slices that should be returned
+    :return: list of Slice IDs
+    """
+    with db_connection_session() as session:
+        query = session.query(db_models.Slice).with_entities(db_models.Slice.id)
+        query = query.filter(db_models.Slice.scan_id == scan_id)
+        query = query.filter(db_models.Slice.status == status)
+        slices = query.all()
+    return [_slice.id for _slice in slices]
+
+
+def get_new_slices_ids_for_update(scan_id: ScanID) -> List[SliceID]:
+    """Fetch IDs of all NEW Slices in given Scan and lock them until the end of current transaction.
+
+    NOTE: Slices that are already locked (e.g. parsed by another worker) are skipped instead of being waited for.
+
+    :param scan_id: ID of a Scan
+    :return: list of Slice IDs
+    """
+    with db_connection_session() as session:
+        query = session.query(db_models.Slice).with_entities(db_models.Slice.id)
+        query = query.filter(db_models.Slice.scan_id == scan_id)
+        query = query.filter(db_models.Slice.status == definitions.SliceStatus.NEW)
+        query = query.with_for_update(skip_locked=True)
+        return [_slice.id for _slice in query.all()]
+
+
+def count_slices_by_scan_id(scan_id: ScanID) -> int:
+    """Return number of all Slices (in all orientations) that were added to given Scan."""
+    with db_connection_session() as session:
+        return session.query(db_models.Slice).filter(db_models.Slice.scan_id == scan_id).count()
+
+
 def get_slices_ids_for_labeled_scans(label_elements: List[db_models.LabelElement]) -> Set[SliceID]:
     """Fetch Slices' IDs for all Scans that were labeled within given Label Elements.
 
@@ -50,27 +143,191 @@ def delete_slice(_slice: db_models.Slice) -> None:
         query.update({'declared_number_of_slices': db_models.Scan.declared_number_of_slices - 1})
         session.query(db_models.Slice).filter(db_models.Slice.id == slice_id).delete()
 
-    OriginalSlice.filter(id=slice_id).delete()
-    ProcessedSlice.filter(id=slice_id).delete()
+    chunks.delete_one(OriginalSlice, slice_id)
+    tiles.delete_all(slice_id, _slice.height, _slice.width)
+    previews.delete_all(slice_id)
+    chunks.delete_one(ProcessedSlice, slice_id)
 
 
 def get_slice_original_image(slice_id: SliceID) -> bytes:
     """Return original Dicom image as bytes."""
-    original_slice = OriginalSlice.get(id=slice_id)
-    return original_slice.image
+    image, = chunks.get_one(OriginalSlice, slice_id)
+    return image
+
+
+def get_slices_original_images(slices_ids: List[SliceID]) -> Dict[SliceID, bytes]:
+    """Return original Dicom images for all given Slices that are already available in Storage."""
+    original_slices = chunks.get_many(OriginalSlice, slices_ids)
+    return {SliceID(slice_id): image for slice_id, (image,) in original_slices.items()}
+
+
+def delete_original_images(slices_ids: Iterable[SliceID]) -> None:
+    """Remove original images of given Slices from Storage (e.g. after their Slices were removed)."""
+    for slice_id in slices_ids:
+        chunks.delete_one(OriginalSlice, slice_id)
+
+
+def iterate_slices_original_images(slices_ids: List[SliceID]) -> Iterator[bytes]:
+    """Return generator of original Dicom images for given Slices, fetched concurrently in the same order.
+
+    :param slices_ids: IDs of Slices which original images are already available in Storage
+    :return: generator of original Dicom images as bytes
+    """
+    for slice_id, row in zip(slices_ids, chunks.iterate_many(OriginalSlice, slices_ids)):
+        if row is None:
+            raise OriginalSlice.DoesNotExist('Could not find original image for Slice "{}".'.format(slice_id))
+        yield row[0]
 
 
 def get_slice_converted_image(slice_id: SliceID) -> bytes:
     """Return converted image as bytes."""
-    original_slice = ProcessedSlice.get(id=slice_id)
-    return original_slice.image
+    image, = chunks.get_one(ProcessedSlice, slice_id)
+    return image
+
+
+def get_slice_converted_image_with_codec(slice_id: SliceID) -> Tuple[bytes, definitions.SliceCodec]:
+    """Return converted image as bytes together with codec that was used to encode it."""
+    image, codec = chunks.get_one(ProcessedSlice, slice_id, columns=CONVERTED_IMAGE_COLUMNS)
+    return image, _get_codec(codec)
+
+
+def iterate_slices_converted_images_with_codec(slices_ids: List[SliceID], resolution: Optional[int] = None) \
+        -> Iterator[Tuple[bytes, definitions.SliceCodec]]:
+    """Return generator of converted images with their codecs for given Slices, fetched concurrently in order.
+
+    :param slices_ids: IDs of Slices which were already converted
+    :param resolution: (optional) resolution of previews that should be returned instead of full images
+    :return: generator of tuples with converted image as bytes and codec that was used to encode it
+    """
+    if resolution:
+        yield from _iterate_slices_previews_with_codec(slices_ids, resolution)
+        return
+
+    rows = chunks.iterate_many(ProcessedSlice, slices_ids, columns=CONVERTED_IMAGE_COLUMNS)
+    for slice_id, row in zip(slices_ids, rows):
+        if row is None:
+            raise ProcessedSlice.DoesNotExist('Could not find converted image for Slice "{}".'.format(slice_id))
+        image, codec = row
+        yield image, _get_codec(codec)
+
+
+def _iterate_slices_previews_with_codec(slices_ids: List[SliceID], resolution: int) \
+        -> Iterator[Tuple[bytes, definitions.SliceCodec]]:
+    """Return generator of previews with their codecs for given Slices, fetched concurrently in order.
+
+    Slices that do not fit given resolution (or were converted before previews were introduced) have no previews,
+    so their full images are fetched (only once such Slice is reached) and returned instead.
+
+    :param slices_ids: IDs of Slices which were already converted
+    :param resolution: resolution of previews
+    :return: generator of tuples with preview (or converted image) as bytes and codec that was used to encode it
+    """
+    rows = previews.iterate_many(slices_ids, resolution, columns=CONVERTED_IMAGE_COLUMNS)
+    for slice_id, row in zip(slices_ids, rows):
+        if row is None:
+            yield get_slice_converted_image_with_codec(slice_id)
+        else:
+            preview, codec = row
+            yield preview, _get_codec(codec)
+
+
+def _get_codec(codec: Optional[str]) -> definitions.SliceCodec:
+    """Return codec for converted image (images converted before codecs were introduced are PNGs)."""
+    return definitions.SliceCodec[codec or definitions.SliceCodec.PNG.value]
 
 
 def store_original_image(slice_id: SliceID, image: bytes) -> None:
     """Store original image into Storage."""
-    OriginalSlice.create(id=slice_id, image=image)
+    chunks.put_one(OriginalSlice, slice_id, (image,))
 
 
-def store_converted_image(slice_id: SliceID, image: bytes) -> None:
+def store_original_images(images: Dict[SliceID, bytes]) -> Set[SliceID]:
+    """Store multiple original images into Storage using concurrent asynchronous inserts.
+
+    :param images: mapping of Slice IDs to their original images
+    :return: set of Slice IDs which original images could not be stored
+    """
+    rows: Dict[str, Tuple] = {slice_id: (image,) for slice_id, image in images.items()}
+    failed_slices_ids = chunks.put_many(OriginalSlice, rows)
+    return {SliceID(slice_id) for slice_id in failed_slices_ids}
+
+
+def store_converted_image(slice_id: SliceID, image: bytes,
+                          codec: definitions.SliceCodec = definitions.SliceCodec.PNG) -> None:
     """Store converted image into Storage."""
-    ProcessedSlice.create(id=slice_id, image=image)
+    chunks.put_one(ProcessedSlice, slice_id, (image, codec.value, 0), columns=STORED_CONVERTED_IMAGE_COLUMNS)
+
+
+def store_converted_images(images: Dict[SliceID, bytes], codec: definitions.SliceCodec = definitions.SliceCodec.PNG,
+                           images_tiles: Optional[Dict[SliceID, Dict[TilePosition, bytes]]] = None,
+                           tile_size: int = 0,
+                           images_previews: Optional[Dict[SliceID, Dict[int, bytes]]] = None) -> Set[SliceID]:
+    """Store multiple converted images (with their tiles & previews) into Storage using concurrent asynchronous inserts.
+
+    Tiles and previews are stored before converted images, so that converted image is never visible without them.
+
+    :param images: mapping of Slice IDs to their converted images
+    :param codec: (optional) codec that was used to encode all of above images
+    :param images_tiles: (optional) mapping of Slice IDs to tiles of their converted images (if they were tiled)
+    :param tile_size: (optional) size of above tiles
+    :param images_previews: (optional) mapping of Slice IDs to previews of their converted images (by resolution)
+    :return: set of Slice IDs which converted images could not be stored
+    """
+    images_tiles = images_tiles or {}
+    failed_slices_ids = tiles.put_many(images_tiles.items())
+    failed_slices_ids |= previews.put_many((images_previews or {}).items(), codec.value)
+    rows: Dict[str, Tuple] = {
+        slice_id: (image, codec.value, tile_size if images_tiles.get(slice_id) else 0)
+        for slice_id, image in images.items() if slice_id not in failed_slices_ids
+    }
+    failed_slices_ids |= chunks.put_many(ProcessedSlice, rows, columns=STORED_CONVERTED_IMAGE_COLUMNS)
+    return {SliceID(slice_id) for slice_id in failed_slices_ids}
+
+
+def get_slice_converted_tile(slice_id: SliceID, position: TilePosition) -> Tuple[bytes, definitions.SliceCodec]:
+    """Return a single tile of converted image together with codec that was used to encode it.
+
+    :param slice_id: ID of a Slice which converted image was tiled
+    :param position: row & column of a tile
+    :return: tuple with encoded tile as bytes and its codec
+    """
+    codec, = blobs.get_one(ProcessedSlice, slice_id, columns=('codec',))
+    return tiles.get_one(slice_id, position), _get_codec(codec)
+
+
+def mark_slices_as_processed(slices_ids: List[SliceID]) -> None:
+    """Mark multiple Slices as PROCESSED in a single UPDATE.
+
+    :param slices_ids: IDs of Slices which converted images were stored
+    """
+    with db_transaction_session() as session:
+        query = session.query(db_models.Slice)
+        query = query.filter(db_models.Slice.id.in_(slices_ids))  # type: ignore  # "SliceID" has no attribute "in_"
+        query.update({'status': definitions.SliceStatus.PROCESSED}, synchronize_session=False)
+
+
+def update_parsed_slices(scan_id: ScanID, slices_metadata: Dict[SliceID, SliceMetadata],
+                         invalid_slices_ids: Set[SliceID]) -> None:
+    """Update metadata of parsed Slices (marking them as STORED) and remove invalid ones within a single transaction.
+
+    :param scan_id: ID of a Scan to which all of given Slices belong
+    :param slices_metadata: mapping of Slice IDs to metadata read from their Dicom files
+    :param invalid_slices_ids: IDs of Slices which files are not Dicoms (Slices that were already removed are skipped)
+    """
+    mappings = [{
+        'id': slice_id,
+        'location': metadata.location,
+        'position_x': metadata.position.x,
+        'position_y': metadata.position.y,
+        'position_z': metadata.position.z,
+        'height': metadata.height,
+        'width': metadata.width,
+        'status': definitions.SliceStatus.STORED,
+    } for slice_id, metadata in slices_metadata.items()]
+    with db_transaction_session() as session:
+        session.bulk_update_mappings(db_models.Slice, mappings)
+        query = session.query(db_models.Slice)
+        query = query.filter(db_models.Slice.id.in_(invalid_slices_ids))  # type: ignore  # "SliceID" has no "in_"
+        number_of_deleted_slices = query.delete(synchronize_session=False)
+        query = session.query(db_models.Scan).filter(db_models.Scan.id == scan_id)
+        query.update({'declared_number_of_slices': db_models.Scan.declared_number_of_slices - number_of_deleted_slices})
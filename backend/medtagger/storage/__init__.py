@@ -1,45 +1,163 @@
 """Definition of storage for MedTagger."""
-from cassandra.cluster import Cluster, Session, NoHostAvailable  # pylint: disable=no-name-in-module
-from cassandra.policies import RoundRobinPolicy
-from cassandra.cqlengine import connection
+import logging
+import threading
+import time
+from typing import Any, Dict, Optional
+from weakref import WeakKeyDictionary
+
+from cassandra.cluster import Cluster, Session  # pylint: disable=no-name-in-module
+from cassandra.query import PreparedStatement  # pylint: disable=no-name-in-module
+from cassandra.policies import DCAwareRoundRobinPolicy, HostDistance, LoadBalancingPolicy, RoundRobinPolicy, \
+    TokenAwarePolicy
+from cassandra.cqlengine import CQLEngineException, connection
 from cassandra.io.asyncorereactor import AsyncoreConnection
 from cassandra.io.geventreactor import GeventConnection
 
 from medtagger.config import AppConfiguration
 
+logger = logging.getLogger(__name__)
 
 MEDTAGGER_KEYSPACE = 'medtagger'
+COMPRESSIONS = {'auto': True, 'none': False, 'lz4': 'lz4', 'snappy': 'snappy'}
+HEALTH_CHECK_QUERY = 'SELECT now() FROM system.local'
 
 configuration = AppConfiguration()
 addresses = configuration.get('cassandra', 'addresses', 'localhost').split(',')
 port = configuration.getint('cassandra', 'port', 9042)
 default_timeout = configuration.getint('cassandra', 'default_timeout', 20)
 connect_timeout = configuration.getint('cassandra', 'connect_timeout', 20)
+max_concurrent_requests = configuration.getint('cassandra', 'max_concurrent_requests', 32)
+local_datacenter = configuration.get('cassandra', 'local_datacenter', '')
+protocol_version = configuration.getint('cassandra', 'protocol_version', 0)  # Negotiated with the Cluster if not set
+compression = configuration.get('cassandra', 'compression', 'auto')
+core_connections_per_host = configuration.getint('cassandra', 'core_connections_per_host', 0)
+max_connections_per_host = configuration.getint('cassandra', 'max_connections_per_host', 0)
+pool_state_log_interval = configuration.getint('cassandra', 'pool_state_log_interval', 0)
+health_check_timeout = configuration.getint('cassandra', 'health_check_timeout', 2)
+chunk_size = configuration.getint('cassandra', 'chunk_size', 0)  # Images are not split into chunks if not set
+
+# Statements are prepared separately for each Session, as they cannot be reused after reconnecting
+_prepared_statements: 'WeakKeyDictionary[Session, Dict[str, PreparedStatement]]' = WeakKeyDictionary()
+_pool_state_reporter: Optional[threading.Thread] = None
+_health_check_session: Optional[Session] = None  # Used only if connection was not created (e.g. in scripts)
 
 
 def create_session(use_gevent: bool = False) -> Session:
     """Create a Session object for above Cluster."""
-    connection_class = GeventConnection if use_gevent else AsyncoreConnection
-    cluster = Cluster(addresses, port=port, load_balancing_policy=RoundRobinPolicy(), connection_class=connection_class,
-                      connect_timeout=connect_timeout)
+    cluster = Cluster(addresses, **_get_cluster_options(use_gevent))
     session = cluster.connect()
     session.default_timeout = default_timeout
+    _configure_connections_per_host(cluster)
     return session
 
 
 def create_connection(use_gevent: bool = False) -> None:
     """Create a Session object for above Cluster."""
-    connection_class = GeventConnection if use_gevent else AsyncoreConnection
-    connection.setup(addresses, MEDTAGGER_KEYSPACE, port=port, load_balancing_policy=RoundRobinPolicy(),
-                     connection_class=connection_class, connect_timeout=connect_timeout)
+    connection.setup(addresses, MEDTAGGER_KEYSPACE, **_get_cluster_options(use_gevent))
     session = connection.get_session()
     session.default_timeout = default_timeout
+    _configure_connections_per_host(connection.get_cluster())
+    _start_pool_state_reporter()
+
+
+def _get_cluster_options(use_gevent: bool) -> Dict[str, Any]:
+    """Return options for the Cluster based on application configuration."""
+    if compression not in COMPRESSIONS:
+        raise ValueError('Unknown compression "{}". Use one of: {}.'.format(compression, ', '.join(COMPRESSIONS)))
+    options = {
+        'port': port,
+        'load_balancing_policy': _get_load_balancing_policy(),
+        'connection_class': GeventConnection if use_gevent else AsyncoreConnection,
+        'connect_timeout': connect_timeout,
+        'compression': COMPRESSIONS[compression],
+    }
+    if protocol_version:
+        options['protocol_version'] = protocol_version
+    return options
+
+
+def _get_load_balancing_policy() -> LoadBalancingPolicy:
+    """Return token aware policy, which sends queries straight to replicas (in local datacenter, if configured)."""
+    child_policy = DCAwareRoundRobinPolicy(local_datacenter) if local_datacenter else RoundRobinPolicy()
+    return TokenAwarePolicy(child_policy)
+
+
+def _configure_connections_per_host(cluster: Cluster) -> None:
+    """Set number of connections to each local host (only available for protocol version 1 & 2)."""
+    if not core_connections_per_host and not max_connections_per_host:
+        return
+    if cluster.protocol_version >= 3:
+        logger.warning('Connections per host are ignored for protocol version %d (it uses a single connection '
+                       'with many concurrent requests per host).', cluster.protocol_version)
+        return
+    if max_connections_per_host:
+        cluster.set_max_connections_per_host(HostDistance.LOCAL, max_connections_per_host)
+    if core_connections_per_host:
+        cluster.set_core_connections_per_host(HostDistance.LOCAL, core_connections_per_host)
+
+
+def log_pool_state(session: Session) -> None:
+    """Log number of open connections and requests in flight for each host, so that Cluster can be sized."""
+    for host, state in session.get_pool_state().items():
+        in_flights = state['in_flights']
+        logger.info('Storage pool for %s: %d open connections, %d requests in flight (at most %d on a single '
+                    'connection, limit for concurrent requests is %d).', host, state['open_count'], sum(in_flights),
+                    max(in_flights, default=0), max_concurrent_requests)
+
+
+def _start_pool_state_reporter() -> None:
+    """Start reporting state of the connection pool periodically (if enabled in configuration)."""
+    global _pool_state_reporter  # pylint: disable=global-statement,invalid-name
+    if pool_state_log_interval <= 0 or (_pool_state_reporter and _pool_state_reporter.is_alive()):
+        return
+    _pool_state_reporter = threading.Thread(target=_report_pool_state, name='StoragePoolStateReporter', daemon=True)
+    _pool_state_reporter.start()
+
+
+def _report_pool_state() -> None:
+    """Log state of the connection pool for current Session in configured intervals."""
+    while True:
+        time.sleep(pool_state_log_interval)
+        log_pool_state(connection.get_session())
+
+
+def get_prepared_statement(query: str, session: Optional[Session] = None) -> PreparedStatement:
+    """Prepare given CQL query on current Session only once and reuse it afterwards.
+
+    NOTE: Prepared statements carry routing key (partition key) of the query, so that token aware policy can send
+          them directly to the nodes that own requested rows.
+
+    :param query: CQL query with "?" as placeholders for values
+    :param session: (optional) Session on which query should be prepared (Session of current connection by default)
+    :return: prepared statement bound to given Session
+    """
+    session = session or connection.get_session()
+    session_statements = _prepared_statements.setdefault(session, {})
+    if query not in session_statements:
+        session_statements[query] = session.prepare(query)
+    return session_statements[query]
 
 
 def is_alive() -> bool:
-    """Return boolean information if Cassandra is alive or not."""
+    """Return boolean information if Cassandra is alive or not.
+
+    Session of already created connection is used (e.g. in API). Otherwise, a separate Session is created once and
+    reused by following checks (e.g. in scripts that wait for Cassandra).
+    """
     try:
-        create_session()
+        session = _get_health_check_session()
+        session.execute(get_prepared_statement(HEALTH_CHECK_QUERY, session), timeout=health_check_timeout)
         return True
-    except NoHostAvailable:
+    except Exception:  # pylint: disable=broad-except
         return False
+
+
+def _get_health_check_session() -> Session:
+    """Return Session of current connection or create a separate one if connection was not created yet."""
+    global _health_check_session  # pylint: disable=global-statement,invalid-name
+    try:
+        return connection.get_session()
+    except CQLEngineException:
+        if not _health_check_session:
+            _health_check_session = create_session()
+        return _health_check_session
@@ -0,0 +1,143 @@
+"""Concurrent access to rows with blobs (e.g. images of Slices) kept in the Storage.
+
+All queries are prepared only once and executed asynchronously, so that latency of many requests overlaps instead
+of being paid one request after another. Number of requests in flight is bounded by `max_concurrent_requests`.
+
+Unlike cqlengine models (see `medtagger.storage.models`, which define layouts of these tables), it does not build
+CQL nor Model instances for each row. Blobs are returned as `bytes` objects created by the driver, without any
+further copies or validation.
+"""
+from collections import deque
+from typing import Any, Deque, Dict, Iterable, Iterator, Mapping, Optional, Sequence, Set, Tuple, Type
+
+from cassandra.cluster import ResponseFuture  # pylint: disable=no-name-in-module
+from cassandra.concurrent import execute_concurrent_with_args  # pylint: disable=no-name-in-module
+from cassandra.cqlengine import connection
+from cassandra.cqlengine.models import Model
+from cassandra.query import PreparedStatement  # pylint: disable=no-name-in-module
+
+from medtagger import storage
+
+DEFAULT_COLUMNS = ('image',)
+
+
+def get_one(model: Type[Model], row_id: str, columns: Sequence[str] = DEFAULT_COLUMNS) -> Tuple:
+    """Fetch values of given columns for a single row.
+
+    :param model: Storage model which defines the table
+    :param row_id: ID of a row
+    :param columns: (optional) names of columns that should be fetched
+    :return: tuple with values of given columns
+    """
+    row = next(iterate_many(model, [row_id], columns))
+    if row is None:
+        raise model.DoesNotExist('Could not find row with ID "{}" in "{}".'.format(row_id, model.__table_name__))
+    return row
+
+
+def get_many(model: Type[Model], rows_ids: Iterable[str],
+             columns: Sequence[str] = DEFAULT_COLUMNS) -> Dict[str, Tuple]:
+    """Fetch values of given columns for multiple rows using concurrent asynchronous queries.
+
+    :param model: Storage model which defines the table
+    :param rows_ids: IDs of rows
+    :param columns: (optional) names of columns that should be fetched
+    :return: mapping of IDs to tuples with values of given columns (rows that do not exist are skipped)
+    """
+    rows_ids = list(rows_ids)
+    rows = iterate_many(model, rows_ids, columns)
+    return {row_id: row for row_id, row in zip(rows_ids, rows) if row is not None}
+
+
+def iterate_many(model: Type[Model], rows_ids: Iterable[str],
+                 columns: Sequence[str] = DEFAULT_COLUMNS) -> Iterator[Optional[Tuple]]:
+    """Fetch values of given columns for multiple rows lazily, in the same order as given IDs.
+
+    NOTE: Unlike `execute_concurrent()`, it does not run ahead of its consumer, so only a bounded number
+          of rows is kept in memory at once.
+
+    :param model: Storage model which defines the table
+    :param rows_ids: IDs of rows
+    :param columns: (optional) names of columns that should be fetched
+    :return: generator of tuples with values of given columns (or None if there is no row for given ID)
+    """
+    statement = _get_select_statement(model, columns)
+    session = connection.get_session()
+    pending_responses: Deque[ResponseFuture] = deque()
+    for row_id in rows_ids:
+        pending_responses.append(session.execute_async(statement, (row_id,)))
+        if len(pending_responses) >= storage.max_concurrent_requests:
+            yield _get_row_values(pending_responses.popleft(), columns)
+    while pending_responses:
+        yield _get_row_values(pending_responses.popleft(), columns)
+
+
+def put_one(model: Type[Model], row_id: str, values: Tuple, columns: Sequence[str] = DEFAULT_COLUMNS) -> None:
+    """Insert a single row.
+
+    :param model: Storage model which defines the table
+    :param row_id: ID of a row
+    :param values: values of given columns
+    :param columns: (optional) names of columns that should be inserted
+    """
+    connection.get_session().execute(_get_insert_statement(model, columns), (row_id, *values))
+
+
+def put_many(model: Type[Model], rows: Mapping[str, Tuple], columns: Sequence[str] = DEFAULT_COLUMNS) -> Set[str]:
+    """Insert multiple rows using concurrent asynchronous queries.
+
+    :param model: Storage model which defines the table
+    :param rows: mapping of IDs to tuples with values of given columns
+    :param columns: (optional) names of columns that should be inserted
+    :return: set of IDs for rows that could not be inserted
+    """
+    parameters = [(row_id, *values) for row_id, values in rows.items()]
+    results = execute_concurrent_with_args(connection.get_session(), _get_insert_statement(model, columns),
+                                           parameters, concurrency=storage.max_concurrent_requests,
+                                           raise_on_first_error=False)
+    return {row[0] for row, (success, _) in zip(parameters, results) if not success}
+
+
+def delete_one(model: Type[Model], row_id: str) -> None:
+    """Delete a single row (if it exists).
+
+    :param model: Storage model which defines the table
+    :param row_id: ID of a row
+    """
+    query = 'DELETE FROM {} WHERE id = ?'.format(_get_table_name(model))
+    connection.get_session().execute(storage.get_prepared_statement(query), (row_id,))
+
+
+def delete_many(model: Type[Model], rows_ids: Iterable[str]) -> None:
+    """Delete multiple rows (if they exist) using concurrent asynchronous queries.
+
+    :param model: Storage model which defines the table
+    :param rows_ids: IDs of rows
+    """
+    query = 'DELETE FROM {} WHERE id = ?'.format(_get_table_name(model))
+    execute_concurrent_with_args(connection.get_session(), storage.get_prepared_statement(query),
+                                 [(row_id,) for row_id in rows_ids], concurrency=storage.max_concurrent_requests)
+
+
+def _get_select_statement(model: Type[Model], columns: Sequence[str]) -> PreparedStatement:
+    """Return prepared statement which selects given columns from a single row."""
+    query = 'SELECT {} FROM {} WHERE id = ?'.format(', '.join(columns), _get_table_name(model))
+    return storage.get_prepared_statement(query)
+
+
+def _get_insert_statement(model: Type[Model], columns: Sequence[str]) -> PreparedStatement:
+    """Return prepared statement which inserts a single row with given columns."""
+    placeholders = ', '.join('?' for _ in range(len(columns) + 1))
+    query = 'INSERT INTO {} (id, {}) VALUES ({})'.format(_get_table_name(model), ', '.join(columns), placeholders)
+    return storage.get_prepared_statement(query)
+
+
+def _get_table_name(model: Type[Model]) -> str:
+    """Return name of a table (together with its keyspace) for given model."""
+    return '{}.{}'.format(model.__keyspace__, model.__table_name__)
+
+
+def _get_row_values(response: ResponseFuture, columns: Sequence[str]) -> Optional[Tuple]:
+    """Wait for response and return values of given columns (rows are returned as dictionaries by cqlengine)."""
+    row: Optional[Dict[str, Any]] = response.result().one()
+    return tuple(row[column] for column in columns) if row else None
@@ -0,0 +1,160 @@
+"""Access to images of Slices that may be split into fixed-size chunks.
+
+Images bigger than configured `chunk_size` are split into chunks kept in a separate table, where each chunk is
+stored in its own partition (with ID like "<slice_id>:<index>"). This way, very large images (e.g. 2048x2048 or
+multi-frame DICOMs) do not create large partitions, and their chunks are read concurrently from multiple nodes.
+Row in the main table keeps number of its chunks (or 0 if image was not split).
+
+NOTE: Image is always the first of given columns.
+"""
+from typing import Dict, Iterable, Iterator, List, Mapping, Optional, Sequence, Set, Tuple, Type
+
+from cassandra.cqlengine.models import Model
+
+from medtagger import storage
+from medtagger.storage import blobs
+from medtagger.storage.models import OriginalSlice, OriginalSliceChunk, ProcessedSlice, ProcessedSliceChunk
+
+CHUNK_MODELS: Dict[Type[Model], Type[Model]] = {
+    OriginalSlice: OriginalSliceChunk,
+    ProcessedSlice: ProcessedSliceChunk,
+}
+
+
+def get_one(model: Type[Model], row_id: str, columns: Sequence[str] = blobs.DEFAULT_COLUMNS) -> Tuple:
+    """Fetch values of given columns for a single row, joining its image from chunks if needed.
+
+    :param model: Storage model which defines the table
+    :param row_id: ID of a row
+    :param columns: (optional) names of columns that should be fetched
+    :return: tuple with values of given columns
+    """
+    rows = get_many(model, [row_id], columns)
+    if row_id not in rows:
+        raise model.DoesNotExist('Could not find row with ID "{}" in "{}".'.format(row_id, model.__table_name__))
+    return rows[row_id]
+
+
+def get_many(model: Type[Model], rows_ids: Iterable[str],
+             columns: Sequence[str] = blobs.DEFAULT_COLUMNS) -> Dict[str, Tuple]:
+    """Fetch values of given columns for multiple rows, joining their images from chunks if needed.
+
+    :param model: Storage model which defines the table
+    :param rows_ids: IDs of rows
+    :param columns: (optional) names of columns that should be fetched
+    :return: mapping of IDs to tuples with values of given columns (rows that do not exist are skipped)
+    """
+    rows_ids = list(rows_ids)
+    return {row_id: row for row_id, row in zip(rows_ids, iterate_many(model, rows_ids, columns)) if row}
+
+
+def iterate_many(model: Type[Model], rows_ids: Iterable[str],
+                 columns: Sequence[str] = blobs.DEFAULT_COLUMNS) -> Iterator[Optional[Tuple]]:
+    """Fetch values of given columns for multiple rows lazily, joining their images from chunks if needed.
+
+    :param model: Storage model which defines the table
+    :param rows_ids: IDs of rows
+    :param columns: (optional) names of columns that should be fetched
+    :return: generator of tuples with values of given columns (or None if there is no row for given ID)
+    """
+    rows_ids = list(rows_ids)
+    rows = blobs.iterate_many(model, rows_ids, (*columns, 'chunks'))
+    for row_id, row in zip(rows_ids, rows):
+        yield _join_chunks(model, row_id, row) if row else None
+
+
+def put_one(model: Type[Model], row_id: str, values: Tuple, columns: Sequence[str] = blobs.DEFAULT_COLUMNS) -> None:
+    """Insert a single row, splitting its image into chunks if needed.
+
+    NOTE: Unlike `put_many()`, it raises errors from the driver (e.g. `WriteTimeout`) if any of chunks or the row
+          could not be inserted.
+
+    :param model: Storage model which defines the table
+    :param row_id: ID of a row
+    :param values: values of given columns
+    :param columns: (optional) names of columns that should be inserted
+    """
+    image, *other_values = values
+    image_chunks = split_into_chunks(image)
+    if len(image_chunks) > 1:
+        for chunk_id, chunk_values in _get_chunks_rows(row_id, image_chunks).items():
+            blobs.put_one(CHUNK_MODELS[model], chunk_id, chunk_values)
+        image = b''
+    blobs.put_one(model, row_id, (image, *other_values, _get_number_of_chunks(image_chunks)), (*columns, 'chunks'))
+
+
+def put_many(model: Type[Model], rows: Mapping[str, Tuple], columns: Sequence[str] = blobs.DEFAULT_COLUMNS) -> Set[str]:
+    """Insert multiple rows using concurrent asynchronous queries, splitting their images into chunks if needed.
+
+    Chunks are inserted before rows in the main table, so that partially stored images are never visible.
+
+    :param model: Storage model which defines the table
+    :param rows: mapping of IDs to tuples with values of given columns
+    :param columns: (optional) names of columns that should be inserted
+    :return: set of IDs for rows that could not be inserted
+    """
+    chunks_rows: Dict[str, Tuple] = {}
+    rows_to_insert: Dict[str, Tuple] = {}
+    for row_id, (image, *other_values) in rows.items():
+        image_chunks = split_into_chunks(image)
+        if len(image_chunks) > 1:
+            chunks_rows.update(_get_chunks_rows(row_id, image_chunks))
+            image = b''
+        rows_to_insert[row_id] = (image, *other_values, _get_number_of_chunks(image_chunks))
+
+    failed_rows_ids = {get_row_id(chunk_id) for chunk_id in blobs.put_many(CHUNK_MODELS[model], chunks_rows)}
+    rows_to_insert = {row_id: values for row_id, values in rows_to_insert.items() if row_id not in failed_rows_ids}
+    return failed_rows_ids | blobs.put_many(model, rows_to_insert, (*columns, 'chunks'))
+
+
+def delete_one(model: Type[Model], row_id: str) -> None:
+    """Delete a single row (if it exists) together with chunks of its image.
+
+    :param model: Storage model which defines the table
+    :param row_id: ID of a row
+    """
+    row = next(blobs.iterate_many(model, [row_id], ('chunks',)))
+    if row and row[0]:
+        blobs.delete_many(CHUNK_MODELS[model], [get_chunk_id(row_id, index) for index in range(row[0])])
+    blobs.delete_one(model, row_id)
+
+
+def split_into_chunks(image: bytes) -> List[bytes]:
+    """Split image into chunks of configured size (image is not split if it is small enough)."""
+    if not storage.chunk_size or len(image) <= storage.chunk_size:
+        return [image]
+    return [image[begin:begin + storage.chunk_size] for begin in range(0, len(image), storage.chunk_size)]
+
+
+def get_chunk_id(row_id: str, index: int) -> str:
+    """Return ID of a chunk with given index for given row."""
+    return '{}:{}'.format(row_id, index)
+
+
+def get_row_id(chunk_id: str) -> str:
+    """Return ID of a row to which given chunk belongs."""
+    return chunk_id.rsplit(':', 1)[0]
+
+
+def _get_chunks_rows(row_id: str, image_chunks: List[bytes]) -> Dict[str, Tuple]:
+    """Return rows for chunks table with all given chunks of a single image."""
+    return {get_chunk_id(row_id, index): (chunk,) for index, chunk in enumerate(image_chunks)}
+
+
+def _get_number_of_chunks(image_chunks: List[bytes]) -> int:
+    """Return number of chunks noted down in the main table (0 if image was not split)."""
+    return len(image_chunks) if len(image_chunks) > 1 else 0
+
+
+def _join_chunks(model: Type[Model], row_id: str, row: Tuple) -> Tuple:
+    """Replace image in given row with an image joined from its chunks (if it was split) and skip chunks column."""
+    *values, number_of_chunks = row
+    if not number_of_chunks:
+        return tuple(values)
+
+    chunks_ids = [get_chunk_id(row_id, index) for index in range(number_of_chunks)]
+    chunks = list(blobs.iterate_many(CHUNK_MODELS[model], chunks_ids))
+    if not all(chunks):
+        raise model.DoesNotExist('Could not find all chunks of row "{}" in "{}".'.format(row_id, model.__table_name__))
+    values[0] = b''.join(chunk[0] for chunk in chunks if chunk)
+    return tuple(values)
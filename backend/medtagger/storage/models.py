@@ -1,6 +1,9 @@
-"""Definition of storage for MedTagger."""
+"""Definition of tables in the storage for MedTagger.
+
+NOTE: Rows of these tables are read and written with prepared statements from `medtagger.storage.blobs`.
+"""
 from cassandra.cqlengine.models import Model
-from cassandra.cqlengine.columns import Text, Blob
+from cassandra.cqlengine.columns import Text, Blob, Integer, BigInt
 
 from medtagger.storage import MEDTAGGER_KEYSPACE
 
@@ -13,6 +16,7 @@ class OriginalSlice(Model):
 
     id = Text(primary_key=True)
     image = Blob()
+    chunks = Integer()  # Number of chunks in `original_slices_chunks` if image was split (0 or not set otherwise)
 
 
 class ProcessedSlice(Model):
@@ -23,6 +27,71 @@ class ProcessedSlice(Model):
 
     id = Text(primary_key=True)
     image = Blob()
+    codec = Text()  # Codec used to encode this image (PNG if not set)
+    chunks = Integer()  # Number of chunks in `processed_slices_chunks` if image was split (0 or not set otherwise)
+    tile_size = Integer()  # Size of tiles in `processed_slices_tiles` if image was tiled (0 or not set otherwise)
+
+
+class OriginalSliceChunk(Model):
+    """Model representing a single chunk of original Slice image (each chunk is kept in its own partition)."""
+
+    __table_name__ = 'original_slices_chunks'
+    __keyspace__ = MEDTAGGER_KEYSPACE
+
+    id = Text(primary_key=True)  # ID of a Slice and index of the chunk, e.g. "<slice_id>:<index>"
+    image = Blob()
+
+
+class ProcessedSliceChunk(Model):
+    """Model representing a single chunk of processed Slice image (each chunk is kept in its own partition)."""
+
+    __table_name__ = 'processed_slices_chunks'
+    __keyspace__ = MEDTAGGER_KEYSPACE
+
+    id = Text(primary_key=True)  # ID of a Slice and index of the chunk, e.g. "<slice_id>:<index>"
+    image = Blob()
+
+
+class ProcessedSliceTile(Model):
+    """Model representing a single tile of processed Slice image, encoded with the same codec as whole image."""
+
+    __table_name__ = 'processed_slices_tiles'
+    __keyspace__ = MEDTAGGER_KEYSPACE
+
+    id = Text(primary_key=True)  # ID of a Slice, row and column of the tile, e.g. "<slice_id>:<row>:<column>"
+    image = Blob()
+
+
+class ProcessedSlicePreview(Model):
+    """Model representing low-resolution preview of processed Slice image (each preview in its own partition)."""
+
+    __table_name__ = 'processed_slices_previews'
+    __keyspace__ = MEDTAGGER_KEYSPACE
+
+    id = Text(primary_key=True)  # ID of a Slice and resolution of the preview, e.g. "<slice_id>:<resolution>"
+    image = Blob()
+    codec = Text()  # Codec used to encode this preview (the same as for the whole image)
+
+
+class ScanVolume(Model):
+    """Model representing packed volume with all Slices of a Scan (its content is kept in `scan_volumes_chunks`)."""
+
+    __table_name__ = 'scan_volumes'
+    __keyspace__ = MEDTAGGER_KEYSPACE
+
+    id = Text(primary_key=True)  # ID of a Scan
+    size = BigInt()  # Size of packed volume in bytes
+    chunk_size = Integer()  # Size of each chunk (except the last one) in bytes
+
+
+class ScanVolumeChunk(Model):
+    """Model representing a single chunk of packed volume (each chunk is kept in its own partition)."""
+
+    __table_name__ = 'scan_volumes_chunks'
+    __keyspace__ = MEDTAGGER_KEYSPACE
+
+    id = Text(primary_key=True)  # ID of a Scan and index of the chunk, e.g. "<scan_id>:<index>"
+    image = Blob()
 
 
 class BrushLabelElement(Model):
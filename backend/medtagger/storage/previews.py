@@ -0,0 +1,61 @@
+"""Access to low-resolution previews of processed Slices' images.
+
+Conversion workers additionally store processed images downscaled to each of configured resolutions (size of the
+longer side in pixels), so that the viewer can scroll through whole Scan quickly and fetch full images only for
+Slices in focus. Each preview is kept in its own partition (with ID like "<slice_id>:<resolution>").
+"""
+from typing import Iterable, Iterator, Mapping, Optional, Sequence, Set, Tuple
+
+from medtagger.config import AppConfiguration
+from medtagger.storage import blobs
+from medtagger.storage.models import ProcessedSlicePreview
+
+configuration = AppConfiguration()
+RESOLUTIONS = sorted({int(resolution) for resolution in
+                      configuration.get('workers', 'preview_resolutions', '128,256').split(',') if resolution})
+
+
+def get_preview_id(row_id: str, resolution: int) -> str:
+    """Return ID of a preview in given resolution for given row."""
+    return '{}:{}'.format(row_id, resolution)
+
+
+def get_row_id(preview_id: str) -> str:
+    """Return ID of a row to which given preview belongs."""
+    return preview_id.rsplit(':', 1)[0]
+
+
+def iterate_many(rows_ids: Iterable[str], resolution: int,
+                 columns: Sequence[str] = blobs.DEFAULT_COLUMNS) -> Iterator[Optional[Tuple]]:
+    """Fetch previews in given resolution for multiple processed images lazily, in the same order as given IDs.
+
+    :param rows_ids: IDs of processed Slices
+    :param resolution: resolution of previews
+    :param columns: (optional) names of columns that should be fetched
+    :return: generator of tuples with values of given columns (or None if there is no such preview)
+    """
+    previews_ids = [get_preview_id(row_id, resolution) for row_id in rows_ids]
+    return blobs.iterate_many(ProcessedSlicePreview, previews_ids, columns)
+
+
+def put_many(previews: Iterable[Tuple[str, Mapping[int, bytes]]], codec: str) -> Set[str]:
+    """Insert previews of multiple processed images using concurrent asynchronous queries.
+
+    :param previews: pairs of IDs of processed Slices and their previews (by resolution)
+    :param codec: codec that was used to encode all of above previews
+    :return: set of IDs for processed Slices which previews could not be inserted
+    """
+    rows = {
+        get_preview_id(row_id, resolution): (preview, codec)
+        for row_id, image_previews in previews for resolution, preview in image_previews.items()
+    }
+    failed_previews_ids = blobs.put_many(ProcessedSlicePreview, rows, columns=('image', 'codec'))
+    return {get_row_id(preview_id) for preview_id in failed_previews_ids}
+
+
+def delete_all(row_id: str) -> None:
+    """Delete previews of processed image in all configured resolutions (if they exist).
+
+    :param row_id: ID of processed Slice
+    """
+    blobs.delete_many(ProcessedSlicePreview, [get_preview_id(row_id, resolution) for resolution in RESOLUTIONS])
@@ -0,0 +1,67 @@
+"""Access to tiles of processed Slices' images.
+
+Processed image may additionally be split into square tiles (each of them encoded with the same codec as whole
+image), so that the viewer can fetch only a region of a very large Slice. Each tile is kept in its own partition
+(with ID like "<slice_id>:<row>:<column>"), while the row of processed Slice keeps size of its tiles.
+"""
+import math
+from typing import Dict, Iterable, Mapping, Set, Tuple
+
+from medtagger.storage import blobs
+from medtagger.storage.models import ProcessedSlice, ProcessedSliceTile
+from medtagger.types import TilePosition
+
+
+def get_tile_id(row_id: str, position: TilePosition) -> str:
+    """Return ID of a tile in given position for given row."""
+    return '{}:{}:{}'.format(row_id, *position)
+
+
+def get_row_id(tile_id: str) -> str:
+    """Return ID of a row to which given tile belongs."""
+    return tile_id.split(':', 1)[0]
+
+
+def get_tiles_positions(height: int, width: int, tile_size: int) -> Iterable[TilePosition]:
+    """Return positions of all tiles for an image of given size (in row-major order)."""
+    for row in range(math.ceil(height / tile_size)):
+        for column in range(math.ceil(width / tile_size)):
+            yield TilePosition(row, column)
+
+
+def get_one(row_id: str, position: TilePosition) -> bytes:
+    """Fetch a single tile of processed image.
+
+    :param row_id: ID of processed Slice
+    :param position: row & column of a tile
+    :return: encoded tile as bytes
+    """
+    tile, = blobs.get_one(ProcessedSliceTile, get_tile_id(row_id, position))
+    return tile
+
+
+def put_many(tiles: Iterable[Tuple[str, Mapping[TilePosition, bytes]]]) -> Set[str]:
+    """Insert tiles of multiple processed images using concurrent asynchronous queries.
+
+    :param tiles: pairs of IDs of processed Slices and their tiles (by position)
+    :return: set of IDs for processed Slices which tiles could not be inserted
+    """
+    rows: Dict[str, Tuple] = {
+        get_tile_id(row_id, position): (tile,)
+        for row_id, image_tiles in tiles for position, tile in image_tiles.items()
+    }
+    return {get_row_id(tile_id) for tile_id in blobs.put_many(ProcessedSliceTile, rows)}
+
+
+def delete_all(row_id: str, height: int, width: int) -> None:
+    """Delete all tiles of processed image (if it was tiled).
+
+    :param row_id: ID of processed Slice
+    :param height: height of processed image
+    :param width: width of processed image
+    """
+    row = next(blobs.iterate_many(ProcessedSlice, [row_id], ('tile_size',)))
+    if not row or not row[0] or not height or not width:
+        return
+    tiles_ids = [get_tile_id(row_id, position) for position in get_tiles_positions(height, width, row[0])]
+    blobs.delete_many(ProcessedSliceTile, tiles_ids)
@@ -0,0 +1,104 @@
+"""Access to packed volumes with all Slices of a Scan, which can be downloaded at once.
+
+Packed volume is written as a stream of fixed-size chunks (each of them in its own partition, with ID like
+"<scan_id>:<index>"), so that it is never kept in memory as a whole. Any range of bytes can be read back by
+fetching only the chunks which overlap with it. Row in the main table keeps size of the volume and its chunks.
+"""
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Set, Tuple
+
+from medtagger import storage
+from medtagger.storage import blobs
+from medtagger.storage.models import ScanVolume, ScanVolumeChunk
+
+VOLUME_CHUNK_SIZE = 1024 * 1024
+
+VolumeInfo = NamedTuple('VolumeInfo', [('size', int), ('chunk_size', int)])
+
+
+def get_info(row_id: str) -> VolumeInfo:
+    """Return size of packed volume and its chunks.
+
+    :param row_id: ID of a Scan
+    :return: information about stored volume
+    """
+    size, chunk_size = blobs.get_one(ScanVolume, row_id, columns=VolumeInfo._fields)
+    return VolumeInfo(size, chunk_size)
+
+
+def iterate_range(row_id: str, info: VolumeInfo, start: int, stop: int) -> Iterator[bytes]:
+    """Fetch given range of bytes from packed volume lazily (chunk by chunk).
+
+    :param row_id: ID of a Scan
+    :param info: information about stored volume (see `get_info()`)
+    :param start: index of the first byte (included)
+    :param stop: index of the last byte (excluded)
+    :return: generator of consecutive parts of given range
+    """
+    first_chunk, last_chunk = start // info.chunk_size, (stop - 1) // info.chunk_size
+    chunks_ids = [get_chunk_id(row_id, index) for index in range(first_chunk, last_chunk + 1)]
+    chunks = blobs.iterate_many(ScanVolumeChunk, chunks_ids)
+    for index, chunk in enumerate(chunks, start=first_chunk):
+        if chunk is None:
+            raise ScanVolume.DoesNotExist('Could not find chunk {} of volume "{}".'.format(index, row_id))
+        offset = index * info.chunk_size
+        yield chunk[0][max(start - offset, 0):stop - offset]
+
+
+def put_one(row_id: str, parts: Iterable[bytes]) -> Set[str]:
+    """Insert packed volume that is streamed from given parts, using concurrent asynchronous queries.
+
+    Chunks are inserted before the row in the main table, so that partially stored volume is never visible.
+
+    :param row_id: ID of a Scan
+    :param parts: consecutive parts of packed volume (of any size)
+    :return: set of IDs for chunks that could not be inserted (volume is not visible if it is not empty)
+    """
+    failed_chunks_ids: Set[str] = set()
+    batch: Dict[str, Tuple] = {}
+    size = 0
+    for chunk in _split_into_chunks(parts):
+        batch[get_chunk_id(row_id, size // VOLUME_CHUNK_SIZE)] = (chunk,)
+        size += len(chunk)
+        if len(batch) >= storage.max_concurrent_requests:
+            failed_chunks_ids |= blobs.put_many(ScanVolumeChunk, batch)
+            batch = {}
+    failed_chunks_ids |= blobs.put_many(ScanVolumeChunk, batch)
+    if not failed_chunks_ids:
+        blobs.put_one(ScanVolume, row_id, (size, VOLUME_CHUNK_SIZE), columns=VolumeInfo._fields)
+    return failed_chunks_ids
+
+
+def delete_one(row_id: str) -> None:
+    """Delete packed volume (if it exists) together with all of its chunks.
+
+    :param row_id: ID of a Scan
+    """
+    row = next(blobs.iterate_many(ScanVolume, [row_id], columns=VolumeInfo._fields))
+    blobs.delete_one(ScanVolume, row_id)
+    if row:
+        info = VolumeInfo(*row)
+        number_of_chunks = -(-info.size // info.chunk_size)
+        blobs.delete_many(ScanVolumeChunk, [get_chunk_id(row_id, index) for index in range(number_of_chunks)])
+
+
+def get_chunk_id(row_id: str, index: int) -> str:
+    """Return ID of a chunk with given index for given volume."""
+    return '{}:{}'.format(row_id, index)
+
+
+def _split_into_chunks(parts: Iterable[bytes]) -> Iterator[bytes]:
+    """Regroup stream of parts with any sizes into chunks of fixed size (the last one may be smaller)."""
+    buffer: List[bytes] = []
+    buffered_size = 0
+    for part in parts:
+        buffer.append(part)
+        buffered_size += len(part)
+        if buffered_size < VOLUME_CHUNK_SIZE:
+            continue
+        data = b''.join(buffer)
+        complete_size = buffered_size - buffered_size % VOLUME_CHUNK_SIZE
+        for begin in range(0, complete_size, VOLUME_CHUNK_SIZE):
+            yield data[begin:begin + VOLUME_CHUNK_SIZE]
+        buffer, buffered_size = [data[complete_size:]], buffered_size - complete_size
+    if buffered_size:
+        yield b''.join(buffer)
@@ -1,5 +1,5 @@
 """Module containing all custom types."""
-from typing import NewType, NamedTuple
+from typing import NewType, NamedTuple, Optional
 
 UserID = NewType('UserID', int)
 ScanID = NewType('ScanID', str)
@@ -12,9 +12,16 @@ PointID = NewType('PointID', str)
 
 SliceLocation = NewType('SliceLocation', float)
 SlicePosition = NamedTuple('SlicePosition', [('x', float), ('y', float), ('z', float)])
+UploadedSlice = NamedTuple('UploadedSlice', [('file_name', str), ('slice_id', Optional[SliceID]),
+                                             ('error', Optional[str])])
+SliceMetadata = NamedTuple('SliceMetadata', [('location', SliceLocation), ('position', SlicePosition),
+                                             ('height', int), ('width', int)])
+TilePosition = NamedTuple('TilePosition', [('row', int), ('column', int)])
 
 LabelPosition = NamedTuple('LabelPosition', [('x', float), ('y', float), ('slice_index', int)])
 LabelShape = NamedTuple('LabelShape', [('width', float), ('height', float)])
+PredefinedBrushLabelElement = NamedTuple('PredefinedBrushLabelElement', [('id', LabelElementID), ('slice_index', int),
+                                                                         ('tag_key', str), ('image', bytes)])
 
 Point = NamedTuple('Point', [('x', float), ('y', float)])
 
@@ -1,35 +1,66 @@
 """Module responsible for asynchronous data conversion."""
-import io
 import os
-from tempfile import NamedTemporaryFile
-from typing import List
+import tempfile
+from collections import deque
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from itertools import islice
+from typing import Callable, Deque, Dict, Iterable, Iterator, List, NamedTuple, Sequence, Tuple, TypeVar
 
 import numpy as np
-import SimpleITK as sitk
-from PIL import Image
 from celery.utils.log import get_task_logger
 
-from medtagger.types import ScanID
+from medtagger import storage
+from medtagger.codecs import encode_slice, encode_volume
+from medtagger.config import AppConfiguration
+from medtagger.exceptions import InternalErrorException
+from medtagger.types import ScanID, SliceID, SliceLocation, TilePosition
 from medtagger.workers import celery_app
-from medtagger.conversion import convert_slice_to_normalized_8bit_array, convert_scan_to_normalized_8bit_array
-from medtagger.definitions import ScanStatus, SliceStatus
-from medtagger.database.models import SliceOrientation, Slice, Scan
+from medtagger.conversion import convert_dicoms_to_volume, convert_volume_to_normalized_8bit_array, \
+    normalize_volume_slices, get_reformatted_shape, reformat_volume, split_into_tiles, downscale_slice
+from medtagger.definitions import DicomTag, ScanStatus, SliceCodec
+from medtagger.dicoms import read_dicom_header, read_list
+from medtagger.database.models import Dataset, SliceOrientation, Slice, Scan
 from medtagger.repositories import scans as ScansRepository, slices as SlicesRepository
+from medtagger.storage import previews
 
 logger = get_task_logger(__name__)
 
-CONVERT_IN_OTHER_AXES = False  # Disabled until Frontend will enable support for such Slices
 MAX_PREVIEW_X_SIZE = 256
 
+# Pillow & zlib release the GIL while compressing images, so threads are usually enough to use all CPU cores
+CONVERSION_POOLS = {'thread': ThreadPoolExecutor, 'process': ProcessPoolExecutor}
+STORE_BATCH_SIZE = storage.max_concurrent_requests
+MAX_PENDING_SLICES = 2 * STORE_BATCH_SIZE  # Bounds memory used by Slices waiting for conversion or storage
+
+# Converted image together with its tiles (empty if Slice is small enough to be sent as a whole) and previews
+# in lower resolutions (only the ones that are smaller than the Slice)
+ConvertedSlice = NamedTuple('ConvertedSlice', [
+    ('image', bytes),
+    ('tiles', Dict[TilePosition, bytes]),
+    ('previews', Dict[int, bytes]),
+])
+Result = TypeVar('Result')
+
+configuration = AppConfiguration()
+CONVERSION_POOL = configuration.get('workers', 'conversion_pool', fallback='thread')
+CONVERSION_POOL_SIZE = configuration.getint('workers', 'conversion_pool_size', fallback=os.cpu_count() or 1)
+CONVERSION_DIRECTORY = configuration.get('workers', 'conversion_directory', fallback=tempfile.gettempdir())
+# Disabled by default until Frontend will enable support for such Slices
+CONVERT_IN_OTHER_AXES = configuration.getboolean('workers', 'convert_in_other_axes', fallback=False)
+# Slices bigger than tile size (in pixels) are additionally stored as tiles (disabled if set to 0)
+TILE_SIZE = configuration.getint('workers', 'tile_size', fallback=0)
+# All Slices in Z axis are additionally packed into a single volume, so that whole Scan can be downloaded at once
+PACK_VOLUMES = configuration.getboolean('workers', 'pack_volumes', fallback=True)
+
 
 @celery_app.task
 def convert_scan_to_png(scan_id: ScanID) -> None:
-    """Convert DICOM Scan to PNG and save it into Storage.
+    """Convert DICOM Scan to images (with codec defined for its Dataset, PNG by default) and save it into Storage.
 
     :param scan_id: ID of a Scan
     """
     logger.info('Starting Scan (%s) conversion.', scan_id)
-    temp_files_to_remove: List[str] = []
     scan = ScansRepository.get_scan_by_id(scan_id)
     slices = SlicesRepository.get_slices_by_scan_id(scan_id)
     if scan.declared_number_of_slices == 0:
@@ -40,108 +71,179 @@ def convert_scan_to_png(scan_id: ScanID) -> None:
     logger.info('Marking Scan as processing.')
     scan.update_status(ScanStatus.PROCESSING)
 
-    # At first, collect all Dicom images for given Scan
+    # At first, read pixels of all Dicom images for given Scan into a single volume stored on disk, so that
+    # memory used by the worker does not depend on the number of Slices
     logger.info('Reading all Slices for this Scan... This may take a while...')
-    dicom_images = []
-    for _slice in slices:
-        image = SlicesRepository.get_slice_original_image(_slice.id)
-
-        # We've got to store above DICOM image bytes on disk due to the fact that SimpleITK does not support
-        # reading files from memory. It has to work on a file stored on a hard drive.
-        temp_file = NamedTemporaryFile(delete=False)
-        temp_file.write(image)
-        temp_file.close()
-
-        dicom_image = sitk.ReadImage(temp_file.name)
-        dicom_images.append(dicom_image)
-        temp_files_to_remove.append(temp_file.name)
+    dicom_images = SlicesRepository.iterate_slices_original_images([_slice.id for _slice in slices])
+    volume = convert_dicoms_to_volume(dicom_images, len(slices), directory=CONVERSION_DIRECTORY)
 
     # Correlate Dicom files with Slices and convert all Slices
-    _convert_scan_in_all_axes(dicom_images, slices, scan)
+    _convert_scan_in_all_axes(volume, slices, scan)
 
     logger.info('Marking Scan as available to use.')
     scan.update_status(ScanStatus.AVAILABLE)
 
-    # Remove all temporarily created files for applying workaround
-    for file_name in temp_files_to_remove:
-        os.unlink(file_name)
-
 
-def _convert_scan_in_all_axes(dicom_images: List[sitk.Image], slices: List[Slice], scan: Scan) -> None:
+def _convert_scan_in_all_axes(volume: np.ndarray, slices: List[Slice], scan: Scan) -> None:
     """Convert Scan in X, Y and Z axes.
 
-    NOTE: X & Y axes are now disabled (until Frontend will support it).
+    NOTE: X & Y axes are disabled by default (until Frontend will support it).
 
-    :param dicom_images: list of all Dicom images
+    :param volume: 3D numpy array (or memory-mapped array) with pixels from all Slices
     :param slices: list of all Slices in given Scan
     :param scan: Scan object to which new Slices should be added
     """
-    logger.info('Converting each Slice in Z axis.')
-    for dicom_image, _slice in zip(dicom_images, slices):
-        slice_pixels = convert_slice_to_normalized_8bit_array(dicom_image)
-        _convert_to_png_and_store(_slice, slice_pixels)
+    if not CONVERT_IN_OTHER_AXES:
+        logger.info('Converting each Slice in Z axis.')
+        _convert_and_store([_slice.id for _slice in slices], normalize_volume_slices(volume), scan.dataset)
+        if PACK_VOLUMES:
+            # Normalization is cheap compared to encoding, so let's repeat it instead of keeping normalized volume
+            _pack_and_store_volume(normalize_volume_slices(volume), volume.shape, slices, scan)
+        return
 
-    # Convert only if it's enabled
-    if CONVERT_IN_OTHER_AXES:
-        # Prepare a preview size and convert 3D scan to fit its max X's axis shape
-        logger.info('Normalizing Scan in 3D. This may take a while...')
-        normalized_scan = convert_scan_to_normalized_8bit_array(dicom_images, output_x_size=MAX_PREVIEW_X_SIZE)
+    # Other orientations are reformatted from normalized volume, so let's keep it (on disk) for later
+    logger.info('Converting each Slice in Z axis.')
+    normalized_volume = convert_volume_to_normalized_8bit_array(volume, directory=CONVERSION_DIRECTORY)
+    _convert_and_store([_slice.id for _slice in slices], normalized_volume, scan.dataset)
+    if PACK_VOLUMES:
+        _pack_and_store_volume(normalized_volume, normalized_volume.shape, slices, scan)
 
-        # Prepare Slices in other orientations
-        logger.info('Preparing Slices in other axis.')
-        _prepare_slices_in_y_orientation(normalized_scan, scan)
-        _prepare_slices_in_x_orientation(normalized_scan, scan)
+    logger.info('Preparing Slices in other axis.')
+    thickness, spacing = _get_scan_voxel_size(slices)
+    for orientation in (SliceOrientation.Y, SliceOrientation.X):
+        _prepare_reformatted_slices(normalized_volume, orientation, thickness, spacing, scan)
 
 
-def _prepare_slices_in_y_orientation(normalized_scan: np.ndarray, scan: Scan) -> None:
-    """Prepare and save Slices in Y orientation.
+def _pack_and_store_volume(slices_pixels: Iterable[np.ndarray], shape: Tuple[int, ...], slices: List[Slice],
+                           scan: Scan) -> None:
+    """Pack all Slices in Z orientation into a single compressed volume and store it for download at once.
 
-    :param normalized_scan: Numpy array with 3D normalized Scan
+    :param slices_pixels: 8bit pixel arrays of all Slices (in the same order as Slices)
+    :param shape: shape of the whole volume
+    :param slices: list of all Slices in given Scan (ordered by their location)
+    :param scan: Scan object for which volume should be stored
+    """
+    logger.info('Packing all Slices into a single volume.')
+    thickness, spacing = _get_scan_voxel_size(slices)
+    header = {
+        'shape': list(shape),
+        'spacing': [thickness, spacing, spacing],
+        'slices_ids': [_slice.id for _slice in slices],
+    }
+    failed_chunks_ids = ScansRepository.store_packed_volume(scan.id, encode_volume(header, slices_pixels))
+    if failed_chunks_ids:
+        raise InternalErrorException('Could not store {} chunks of packed volume in the Storage.'.format(
+            len(failed_chunks_ids)))
+
+
+def _get_scan_voxel_size(slices: List[Slice]) -> Tuple[float, float]:
+    """Calculate Scan's Slice thickness and pixel spacing.
+
+    :param slices: list of all Slices in given Scan (ordered by their location)
+    :return: tuple with Slice thickness and pixel spacing
+    """
+    # Thickness >=1.0 will be fine for all of the computations if there is only one Slice
+    thickness = abs(slices[1].location - slices[0].location) if len(slices) > 1 else 1.0
+    image = SlicesRepository.get_slice_original_image(slices[0].id)
+    header = read_dicom_header(image, tags=[DicomTag.PIXEL_SPACING])
+    spacing = float((read_list(header, DicomTag.PIXEL_SPACING) or [1.0])[0])
+    return thickness, spacing
+
+
+def _prepare_reformatted_slices(normalized_volume: np.ndarray, orientation: SliceOrientation, thickness: float,
+                                spacing: float, scan: Scan) -> None:
+    """Prepare and save Slices in X or Y orientation.
+
+    :param normalized_volume: 3D numpy array with normalized Slices in Z orientation
+    :param orientation: orientation of new Slices (either X or Y)
+    :param thickness: distance between two consecutive Slices in Z orientation
+    :param spacing: distance between two consecutive pixels in a Slice in Z orientation
     :param scan: Scan object to which new Slices should be added
     """
-    for y in range(normalized_scan.shape[1]):
-        location = 100.0 * y / normalized_scan.shape[1]
-        slice_pixels = normalized_scan[:, y, :]
-        _slice = scan.add_slice(SliceOrientation.Y)
-        _slice.update_location(location)
-        _slice.update_size(*slice_pixels.shape)
-        _convert_to_png_and_store(_slice, slice_pixels)
+    number_of_slices, height, width = get_reformatted_shape(normalized_volume.shape, orientation, thickness,
+                                                            spacing, max_size=MAX_PREVIEW_X_SIZE)
+    locations = [SliceLocation(100.0 * index / number_of_slices) for index in range(number_of_slices)]
+    slices_ids = scan.add_slices(number_of_slices, orientation, locations=locations, size=(height, width))
+    slices_pixels = reformat_volume(normalized_volume, orientation, thickness, spacing, max_size=MAX_PREVIEW_X_SIZE)
+    _convert_and_store(slices_ids, slices_pixels, scan.dataset)
 
 
-def _prepare_slices_in_x_orientation(normalized_scan: np.ndarray, scan: Scan) -> None:
-    """Prepare and save Slices in Y orientation.
+def _convert_and_store(slices_ids: List[SliceID], slices_pixels: Iterable[np.ndarray], dataset: Dataset) -> None:
+    """Convert given Slices' pixel arrays in a pool of workers and store them in databases.
 
-    :param normalized_scan: Numpy array with 3D normalized Scan
-    :param scan: Scan object to which new Slices should be added
+    Converted images are stored in batches with concurrent writes, while the pool keeps converting next Slices.
+    Pixel arrays are consumed lazily, so only a bounded number of Slices is kept in memory at once.
+
+    :param slices_ids: list of IDs for Slices that should be converted
+    :param slices_pixels: numpy arrays with Slices data (in the same order as Slices)
+    :param dataset: Dataset which defines codec for converted Slices
     """
-    for x in range(normalized_scan.shape[2]):
-        location = 100.0 * x / normalized_scan.shape[2]
-        slice_pixels = normalized_scan[:, :, x]
-        _slice = scan.add_slice(SliceOrientation.X)
-        _slice.update_location(location)
-        _slice.update_size(*slice_pixels.shape)
-        _convert_to_png_and_store(_slice, slice_pixels)
+    encode = partial(encode_slice, codec=dataset.slices_codec, compression_level=dataset.slices_compression_level)
+    convert = partial(_encode_slice, encode=encode, tile_size=TILE_SIZE, resolutions=previews.RESOLUTIONS)
+    with _create_conversion_pool() as pool:
+        converted_slices = zip(slices_ids, _map_lazily(pool, convert, slices_pixels))
+        batch = list(islice(converted_slices, STORE_BATCH_SIZE))
+        while batch:
+            _store_converted_images(batch, dataset.slices_codec)
+            batch = list(islice(converted_slices, STORE_BATCH_SIZE))
+
+
+def _encode_slice(slice_pixels: np.ndarray, encode: Callable[[np.ndarray], bytes], tile_size: int,
+                  resolutions: Sequence[int]) -> ConvertedSlice:
+    """Encode given Slice together with its tiles and previews (only if Slice is bigger than them).
+
+    :param slice_pixels: Slice's 8bit pixel array
+    :param encode: function that encodes pixel array with Dataset's codec
+    :param tile_size: size of a single tile in pixels (Slice is not tiled if set to 0)
+    :param resolutions: resolutions of previews (size of their longer side in pixels)
+    :return: encoded Slice with mappings of tiles' positions to encoded tiles and resolutions to encoded previews
+    """
+    tiles: Dict[TilePosition, bytes] = {}
+    if tile_size and max(slice_pixels.shape) > tile_size:
+        tiles = {position: encode(tile) for position, tile in split_into_tiles(slice_pixels, tile_size)}
+    slice_previews = {
+        resolution: encode(downscale_slice(slice_pixels, resolution))
+        for resolution in resolutions if max(slice_pixels.shape) > resolution
+    }
+    return ConvertedSlice(encode(slice_pixels), tiles, slice_previews)
 
 
-def _convert_to_png_and_store(_slice: Slice, slice_pixels: np.ndarray) -> None:
-    """Convert given Slice's pixel array and store in databases.
+def _map_lazily(pool: Executor, function: Callable[[np.ndarray], Result],
+                slices_pixels: Iterable[np.ndarray]) -> Iterator[Result]:
+    """Map function over Slices in given pool (preserving order) with bounded number of pending Slices.
 
-    :param _slice: Slice database object
-    :param slice_pixels: numpy array with Slice data
+    NOTE: Unlike `Executor.map()`, it does not submit all of the Slices at once.
     """
-    converted_image = _convert_slice_pixels_to_png(slice_pixels)
-    SlicesRepository.store_converted_image(_slice.id, converted_image)
-    _slice.update_status(SliceStatus.PROCESSED)
-    logger.info('%s converted and stored.', _slice)
+    pending_results: Deque[Future] = deque()
+    for slice_pixels in slices_pixels:
+        pending_results.append(pool.submit(function, slice_pixels))
+        if len(pending_results) >= MAX_PENDING_SLICES:
+            yield pending_results.popleft().result()
+    while pending_results:
+        yield pending_results.popleft().result()
+
+
+def _create_conversion_pool() -> Executor:
+    """Create pool of workers that will convert Slices concurrently."""
+    if CONVERSION_POOL not in CONVERSION_POOLS:
+        pools = ', '.join(CONVERSION_POOLS)
+        raise ValueError('Unknown conversion pool "{}". Use one of: {}.'.format(CONVERSION_POOL, pools))
+    return CONVERSION_POOLS[CONVERSION_POOL](max_workers=CONVERSION_POOL_SIZE)
 
 
-def _convert_slice_pixels_to_png(slice_pixels: np.ndarray) -> bytes:
-    """Convert given Slice's pixel array to the PNG format in bytes.
+def _store_converted_images(converted_slices: List[Tuple[SliceID, ConvertedSlice]], codec: SliceCodec) -> None:
+    """Store converted images (with their tiles & previews) with concurrent writes and mark their Slices as processed.
 
-    :param slice_pixels: Slice's pixel array
-    :return: bytes with Slice formatted in PNG
+    :param converted_slices: list of Slice IDs together with their converted images, tiles and previews
+    :param codec: codec that was used to encode above images
     """
-    png_image = io.BytesIO()
-    Image.fromarray(slice_pixels, 'L').save(png_image, 'PNG')
-    png_image.seek(0)
-    return png_image.getvalue()
+    converted_images = {slice_id: converted.image for slice_id, converted in converted_slices}
+    images_tiles = {slice_id: converted.tiles for slice_id, converted in converted_slices if converted.tiles}
+    images_previews = {slice_id: converted.previews for slice_id, converted in converted_slices if converted.previews}
+    failed_slices_ids = SlicesRepository.store_converted_images(converted_images, codec, images_tiles, TILE_SIZE,
+                                                                images_previews)
+    if failed_slices_ids:
+        raise InternalErrorException('Could not store {} converted images in the Storage.'.format(
+            len(failed_slices_ids)))
+    SlicesRepository.mark_slices_as_processed(list(converted_images))
+    logger.info('%d Slices converted and stored.', len(converted_images))
@@ -1,64 +1,92 @@
 """Module responsible for asynchronous data storage."""
-import os
-from tempfile import NamedTemporaryFile
+from typing import Dict
 
-import SimpleITK as sitk
 from celery.utils.log import get_task_logger
 
-from medtagger.definitions import DicomTag, SliceStatus
-from medtagger.dicoms import read_int, read_float, read_list
-from medtagger.types import ScanID, SliceID, SlicePosition, SliceLocation
+from medtagger.config import AppConfiguration
+from medtagger.database import db_transaction_session
+from medtagger.definitions import DicomTag
+from medtagger.dicoms import read_dicom_header, read_int, read_float, read_list
+from medtagger.exceptions import InvalidDicomException
+from medtagger.types import ScanID, SliceID, SlicePosition, SliceLocation, SliceMetadata
 from medtagger.workers import celery_app
 from medtagger.workers.conversion import convert_scan_to_png
 from medtagger.repositories import scans as ScansRepository, slices as SlicesRepository
 
 logger = get_task_logger(__name__)
 
+configuration = AppConfiguration()
+SLICES_BATCH_SIZE = configuration.getint('workers', 'slices_batch_size', fallback=50)
+SLICES_FLUSH_WINDOW = configuration.getint('workers', 'slices_flush_window', fallback=5)
+
+
+def schedule_slices_parsing(scan_id: ScanID, number_of_slices: int, declared_number_of_slices: int) -> None:
+    """Schedule parsing of newly uploaded Slices, so that they will be processed in batches.
+
+    Batch is parsed right away once it is full (or all declared Slices were uploaded). Otherwise, the first Slice
+    in a batch schedules parsing after a short flush window, so that Slices won't wait for the rest of the batch.
+
+    :param scan_id: ID of a Scan to which Slice was uploaded
+    :param number_of_slices: number of Slices that were already uploaded to this Scan
+    :param declared_number_of_slices: number of Slices that will be uploaded to this Scan
+    """
+    if number_of_slices >= declared_number_of_slices or number_of_slices % SLICES_BATCH_SIZE == 0:
+        parse_dicoms_and_update_slices.delay(scan_id)
+    elif number_of_slices % SLICES_BATCH_SIZE == 1:
+        parse_dicoms_and_update_slices.apply_async(args=[scan_id], countdown=SLICES_FLUSH_WINDOW)
+
 
 @celery_app.task
-def parse_dicom_and_update_slice(slice_id: SliceID) -> None:
-    """Parse DICOM from Storage and update Slice for location and position.
+def parse_dicoms_and_update_slices(scan_id: ScanID) -> None:
+    """Parse all newly uploaded DICOMs from Storage and update their Slices for location and position.
+
+    NOTE: Slices are locked until they are updated, so that tasks running at the same time for the same Scan (e.g.
+          the one scheduled after flush window and the one for a full batch) never parse the same Slices. Slices which
+          original images are not yet available in Storage will be parsed in one of the next batches.
+
+    :param scan_id: ID of a Scan
+    """
+    with db_transaction_session():  # Locks are released once Slices are updated (or if parsing failed)
+        slices_ids = SlicesRepository.get_new_slices_ids_for_update(scan_id)
+        logger.debug('Parsing %d DICOM files from Storage for given Scan ID: %s.', len(slices_ids), scan_id)
+        images = SlicesRepository.get_slices_original_images(slices_ids)
+        slices_metadata = read_slices_metadata(images)
+        invalid_slices_ids = set(images) - set(slices_metadata)
+        SlicesRepository.update_parsed_slices(scan_id, slices_metadata, invalid_slices_ids)
+    SlicesRepository.delete_original_images(invalid_slices_ids)
+    logger.info('%d Slices updated for Scan ID=%s.', len(slices_metadata), scan_id)
+
+    trigger_scan_conversion_if_needed(scan_id)
+
+
+def read_slices_metadata(images: Dict[SliceID, bytes]) -> Dict[SliceID, SliceMetadata]:
+    """Read metadata for multiple Slices from their DICOM files, skipping files that are not DICOMs.
+
+    :param images: mapping of Slice IDs to their DICOM files
+    :return: mapping of Slice IDs to their metadata
+    """
+    slices_metadata: Dict[SliceID, SliceMetadata] = {}
+    for slice_id, image in images.items():
+        try:
+            slices_metadata[slice_id] = read_slice_metadata(image)
+        except InvalidDicomException:
+            logger.error('User sent a file that is not a DICOM.')
+    return slices_metadata
+
+
+def read_slice_metadata(image: bytes) -> SliceMetadata:
+    """Read metadata for a Slice from its DICOM file.
 
-    :param slice_id: ID of a slice
+    :param image: bytes representing DICOM image
+    :return: Slice's metadata
     """
-    logger.debug('Parsing DICOM file from Storage for given Slice ID: %s.', slice_id)
-    _slice = SlicesRepository.get_slice_by_id(slice_id)
-    image = SlicesRepository.get_slice_original_image(_slice.id)
-
-    # We've got to store above DICOM image bytes on disk due to the fact that SimpleITK does not support
-    # reading files from memory. It has to work on a file stored on a hard drive.
-    temp_file = NamedTemporaryFile(delete=False)
-    temp_file.write(image)
-    temp_file.close()
-
-    try:
-        reader = sitk.ImageFileReader()
-        reader.SetFileName(temp_file.name)
-        reader.ReadImageInformation()
-
-        location = SliceLocation(read_float(reader, DicomTag.SLICE_LOCATION) or 0.0)
-        raw_position = read_list(reader, DicomTag.IMAGE_POSITION_PATIENT) or [0.0, 0.0, 0.0]
-        position = SlicePosition(*list(map(float, raw_position)))
-        height = read_int(reader, DicomTag.ROWS) or 0
-        width = read_int(reader, DicomTag.COLUMNS) or 0
-
-    except RuntimeError:
-        logger.error('User sent a file that is not a DICOM.')
-        os.unlink(temp_file.name)
-        SlicesRepository.delete_slice(_slice)
-        trigger_scan_conversion_if_needed(_slice.scan_id)
-        return
-
-    # Remove temporary file
-    os.unlink(temp_file.name)
-
-    _slice.update_location(location)
-    _slice.update_position(position)
-    _slice.update_size(height, width)
-    _slice.update_status(SliceStatus.STORED)
-    logger.info('"%s" updated.', _slice)
-
-    trigger_scan_conversion_if_needed(_slice.scan_id)
+    header = read_dicom_header(image)
+    location = SliceLocation(read_float(header, DicomTag.SLICE_LOCATION) or 0.0)
+    raw_position = read_list(header, DicomTag.IMAGE_POSITION_PATIENT) or [0.0, 0.0, 0.0]
+    position = SlicePosition(*list(map(float, raw_position)))
+    height = read_int(header, DicomTag.ROWS) or 0
+    width = read_int(header, DicomTag.COLUMNS) or 0
+    return SliceMetadata(location, position, height, width)
 
 
 def trigger_scan_conversion_if_needed(scan_id: ScanID) -> None:
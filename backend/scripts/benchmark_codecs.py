@@ -0,0 +1,99 @@
+"""Script that compares codecs available for converted Slices.
+
+How to use it?
+--------------
+Run this script with a directory that contains DICOM files of a single Scan (by default it uses test assets):
+
+    (venv) $ python3.7 scripts/benchmark_codecs.py --source=./tests/assets/example_scan/ --repeats=10
+
+For each codec and compression level it reports average encode & decode time per Slice and average size of
+ encoded Slice, so that you can choose the best codec for your Dataset (see `codec` in `.medtagger.yml`).
+
+"""
+import argparse
+import glob
+import logging
+import logging.config
+import time
+from typing import List, NamedTuple
+
+import numpy as np
+
+from medtagger.codecs import encode_slice, decode_slice, MAX_COMPRESSION_LEVELS
+from medtagger.conversion import convert_dicoms_to_volume, convert_volume_to_normalized_8bit_array
+from medtagger.definitions import SliceCodec
+
+logging.config.fileConfig('logging.conf')
+logger = logging.getLogger(__name__)
+
+DEFAULT_SOURCE_DIRECTORY = 'tests/assets/example_scan/'
+
+BenchmarkResult = NamedTuple('BenchmarkResult', [('codec', SliceCodec), ('compression_level', int),
+                                                 ('encode_time', float), ('decode_time', float), ('size', float)])
+
+
+def read_normalized_volume(source: str) -> np.ndarray:
+    """Read all DICOM files from given directory and convert them into normalized 8bit volume."""
+    images = []
+    for file_name in sorted(glob.glob(source.rstrip('/') + '/*.dcm')):
+        with open(file_name, 'rb') as dicom_file:
+            images.append(dicom_file.read())
+    volume = convert_dicoms_to_volume(images, len(images))
+    return convert_volume_to_normalized_8bit_array(volume)
+
+
+def benchmark_codec(normalized_volume: np.ndarray, codec: SliceCodec, compression_level: int,
+                    repeats: int) -> BenchmarkResult:
+    """Measure average encode & decode time and size of a Slice encoded with given codec.
+
+    :param normalized_volume: 3D numpy array with normalized Slices
+    :param codec: codec that should be measured
+    :param compression_level: compression level for given codec
+    :param repeats: number of times that each Slice will be encoded & decoded
+    :return: results of the benchmark
+    """
+    number_of_slices = len(normalized_volume) * repeats
+    shape = normalized_volume.shape[1:]
+
+    start_time = time.perf_counter()
+    images = [encode_slice(slice_pixels, codec, compression_level)
+              for _ in range(repeats) for slice_pixels in normalized_volume]
+    encode_time = (time.perf_counter() - start_time) / number_of_slices
+
+    start_time = time.perf_counter()
+    decoded_slices = [decode_slice(image, codec, shape) for image in images]
+    decode_time = (time.perf_counter() - start_time) / number_of_slices
+
+    assert all(np.array_equal(decoded_slice, slice_pixels)
+               for decoded_slice, slice_pixels in zip(decoded_slices, normalized_volume)), 'Codec is not lossless!'
+    size = sum(len(image) for image in images) / number_of_slices
+    return BenchmarkResult(codec, compression_level, encode_time, decode_time, size)
+
+
+def report_results(results: List[BenchmarkResult], raw_size: int) -> None:
+    """Log table with results of the benchmark."""
+    logger.info('%-10s %5s %12s %12s %12s %7s', 'Codec', 'Level', 'Encode [ms]', 'Decode [ms]', 'Size [KB]', 'Ratio')
+    for result in results:
+        logger.info('%-10s %5d %12.2f %12.2f %12.1f %7.2f', result.codec.value, result.compression_level,
+                    result.encode_time * 1000, result.decode_time * 1000, result.size / 1024, raw_size / result.size)
+
+
+def main() -> None:
+    """Run benchmark for all codecs."""
+    parser = argparse.ArgumentParser(description='Compare codecs available for converted Slices.')
+    parser.add_argument('--source', type=str, default=DEFAULT_SOURCE_DIRECTORY, help='Directory with DICOM files')
+    parser.add_argument('--repeats', type=int, default=5, help='Number of times that each Slice will be encoded')
+    args = parser.parse_args()
+
+    normalized_volume = read_normalized_volume(args.source)
+    logger.info('Running benchmark on %d Slices of size %dx%d...', *np.shape(normalized_volume))
+
+    results = []
+    for codec in SliceCodec:
+        for compression_level in range(MAX_COMPRESSION_LEVELS[codec] + 1):
+            results.append(benchmark_codec(normalized_volume, codec, compression_level, args.repeats))
+    report_results(results, raw_size=normalized_volume[0].size)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""Script that compares throughput of cqlengine models and prepared statements used for Slices' images.
+
+How to use it?
+--------------
+Run this script against a running Storage (it uses the same configuration as MedTagger):
+
+    (venv) $ python3.7 scripts/benchmark_storage.py --rows=1000 --size=65536
+
+It writes given number of random images into `processed_slices` table, reads them back and removes them afterwards.
+Each operation is measured for cqlengine models (row by row) and for `medtagger.storage.blobs` (prepared statements
+with concurrent asynchronous queries). All rows use IDs with `BENCHMARK_` prefix, so no Slice will be overwritten.
+
+"""
+import argparse
+import logging
+import logging.config
+import os
+import time
+from typing import Callable, Dict, List, NamedTuple, Tuple
+
+from medtagger import storage
+from medtagger.storage import blobs
+from medtagger.storage.models import ProcessedSlice
+
+logging.config.fileConfig('logging.conf')
+logger = logging.getLogger(__name__)
+
+BENCHMARK_ID_PREFIX = 'BENCHMARK_'
+
+BenchmarkResult = NamedTuple('BenchmarkResult', [('name', str), ('elapsed_time', float)])
+
+
+def write_with_models(rows: Dict[str, Tuple]) -> None:
+    """Write all rows one by one with cqlengine models."""
+    for row_id, (image, codec) in rows.items():
+        ProcessedSlice.create(id=row_id, image=image, codec=codec)
+
+
+def read_with_models(rows: Dict[str, Tuple]) -> None:
+    """Read all rows one by one with cqlengine models."""
+    for row_id in rows:
+        assert ProcessedSlice.get(id=row_id).image, 'Row was not stored!'
+
+
+def write_with_prepared_statements(rows: Dict[str, Tuple]) -> None:
+    """Write all rows with concurrent prepared statements."""
+    failed_rows_ids = blobs.put_many(ProcessedSlice, rows, columns=('image', 'codec'))
+    assert not failed_rows_ids, 'Could not store {} rows!'.format(len(failed_rows_ids))
+
+
+def read_with_prepared_statements(rows: Dict[str, Tuple]) -> None:
+    """Read all rows with concurrent prepared statements."""
+    for row in blobs.iterate_many(ProcessedSlice, list(rows), columns=('image', 'codec')):
+        assert row, 'Row was not stored!'
+
+
+def delete_rows(rows: Dict[str, Tuple]) -> None:
+    """Remove all rows written by the benchmark."""
+    for row_id in rows:
+        blobs.delete_one(ProcessedSlice, row_id)
+
+
+def measure(name: str, operation: Callable[[Dict[str, Tuple]], None], rows: Dict[str, Tuple]) -> BenchmarkResult:
+    """Measure time of a single operation done on all rows."""
+    start_time = time.perf_counter()
+    operation(rows)
+    return BenchmarkResult(name, time.perf_counter() - start_time)
+
+
+def report_results(results: List[BenchmarkResult], number_of_rows: int, size: int) -> None:
+    """Log table with results of the benchmark."""
+    logger.info('%-30s %10s %12s %10s', 'Operation', 'Time [s]', 'Rows/s', 'MB/s')
+    for result in results:
+        elapsed_time = max(result.elapsed_time, 1e-6)
+        logger.info('%-30s %10.2f %12.1f %10.2f', result.name, elapsed_time, number_of_rows / elapsed_time,
+                    number_of_rows * size / 2 ** 20 / elapsed_time)
+
+
+def main() -> None:
+    """Run benchmark for both ways of accessing the Storage."""
+    parser = argparse.ArgumentParser(description='Compare throughput of cqlengine models and prepared statements.')
+    parser.add_argument('--rows', type=int, default=1000, help='Number of rows that will be written and read')
+    parser.add_argument('--size', type=int, default=64 * 1024, help='Size of a single image in bytes')
+    args = parser.parse_args()
+
+    storage.create_connection()
+    rows: Dict[str, Tuple] = {
+        BENCHMARK_ID_PREFIX + str(index): (os.urandom(args.size), 'PNG') for index in range(args.rows)
+    }
+    logger.info('Running benchmark on %d rows of size %d bytes...', args.rows, args.size)
+
+    try:
+        results = [
+            measure('Write (cqlengine models)', write_with_models, rows),
+            measure('Read (cqlengine models)', read_with_models, rows),
+            measure('Write (prepared statements)', write_with_prepared_statements, rows),
+            measure('Read (prepared statements)', read_with_prepared_statements, rows),
+        ]
+    finally:
+        delete_rows(rows)
+    report_results(results, args.rows, args.size)
+
+
+if __name__ == '__main__':
+    main()
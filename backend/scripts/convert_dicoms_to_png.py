@@ -9,17 +9,17 @@ Then, place these data (unzipped) anywhere on your computer and run this script
 
     (venv) $ python3.7 scripts/dicoms_to_png.py --input=./dir_with_scans/ --output=./dir_with_scans/converted/
 
-Name of the converted Dicom file is a position of the scan on the z axis.
+Name of the converted Dicom file is a position of the scan on the z axis. All Slices are normalized together (the
+ same way as during conversion of uploaded Scans), so all of the files should come from a single Scan.
 """
 import os
 import argparse
 
-import SimpleITK as sitk
 from PIL import Image
 
-from medtagger.conversion import convert_slice_to_normalized_8bit_array
+from medtagger.conversion import convert_dicoms_to_volume, normalize_volume_slices
 from medtagger.definitions import DicomTag
-from medtagger.dicoms import read_list
+from medtagger.dicoms import read_dicom_header, read_list
 
 
 parser = argparse.ArgumentParser(description='Convert dicoms to png format.')
@@ -31,15 +31,18 @@ args = parser.parse_args()
 dicoms_folder_path = args.input
 converted_dicoms_folder_path = args.output
 
-dicoms = [sitk.ReadImage(dicoms_folder_path + d) for d in os.listdir(dicoms_folder_path) if
-          os.path.isfile(dicoms_folder_path + d)]
-min_position = abs(min(float((read_list(dicom, DicomTag.IMAGE_POSITION_PATIENT) or [])[2]) for dicom in dicoms))
+dicoms = []
+for file_name in os.listdir(dicoms_folder_path):
+    if os.path.isfile(dicoms_folder_path + file_name):
+        with open(dicoms_folder_path + file_name, 'rb') as dicom_file:
+            dicoms.append(dicom_file.read())
+positions = [float((read_list(read_dicom_header(dicom), DicomTag.IMAGE_POSITION_PATIENT) or [])[2]) for dicom in dicoms]
+min_position = abs(min(positions))
 
 if not os.path.exists(converted_dicoms_folder_path):
     os.mkdir(converted_dicoms_folder_path)
 
-for single_dicom in dicoms:
-    image_bytes = convert_slice_to_normalized_8bit_array(single_dicom)
-    slice_position = float((read_list(single_dicom, DicomTag.IMAGE_POSITION_PATIENT) or [])[2])
+volume = convert_dicoms_to_volume(dicoms, len(dicoms))
+for slice_position, slice_pixels in zip(positions, normalize_volume_slices(volume)):
     converted_dicom_name = '{0:.2f}'.format(slice_position + min_position)
-    Image.fromarray(image_bytes, 'L').save(converted_dicoms_folder_path + converted_dicom_name + '.png')
+    Image.fromarray(slice_pixels, 'L').save(converted_dicoms_folder_path + converted_dicom_name + '.png')
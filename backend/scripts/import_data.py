@@ -7,7 +7,7 @@ https://www.kaggle.com/c/data-science-bowl-2017/data (look for 'sample_images.7z
 
 Then, place these data (unzipped) anywhere on your computer and run this script by:
 
-    (venv) $ python3.7 scripts/import_data.py --source=./dir_with_scans/
+    (venv) $ python3.7 scripts/import_data.py --source=./dir_with_scans/ --dataset=LUNGS
 
 Please keep all scans with given structure:
 
@@ -23,44 +23,201 @@ Please keep all scans with given structure:
         |   `-- ...
         `-- ...
 
+Scans are imported in parallel by multiple processes (see `--processes`). Each imported Scan is noted down in
+a local manifest file (see `--manifest`), so if import was interrupted, you can run the very same command again
+and it will continue from the place where it stopped. Partially imported Scans are removed and imported again.
+
 """
 import os
 import argparse
 import glob
+import json
 import logging
 import logging.config
+import time
+from multiprocessing import Pool
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
 
-from medtagger.repositories import scans as ScansRepository, datasets as DatasetsRepository
-from medtagger.workers.storage import parse_dicom_and_update_slice
+from medtagger import storage
+from medtagger.database import engine
+from medtagger.database.models import Dataset
+from medtagger.exceptions import InternalErrorException
+from medtagger.repositories import scans as ScansRepository, datasets as DatasetsRepository, \
+    slices as SlicesRepository
+from medtagger.types import ScanID, SliceID
+from medtagger.workers.storage import parse_dicoms_and_update_slices
 
 
 logging.config.fileConfig('logging.conf')
 logger = logging.getLogger(__name__)
 
-parser = argparse.ArgumentParser(description='Import data to the MedTagger.')
-parser.add_argument('--source', type=str, required=True, help='Source directory')
-parser.add_argument('--dataset', type=str, required=True, help='Dataset key for these scans')
-args = parser.parse_args()
+DEFAULT_MANIFEST_FILE_NAME = '.import_manifest.jsonl'
+SLICES_CHUNK_SIZE = 50
+STORAGE_RETRIES = 3
 
+ImportedScan = NamedTuple('ImportedScan', [('directory', str), ('scan_id', ScanID), ('number_of_slices', int),
+                                           ('number_of_bytes', int)])
 
-if __name__ == '__main__':
-    logger.info('Checking Dataset...')
-    dataset = DatasetsRepository.get_dataset_by_key(args.dataset)
+dataset: Optional[Dataset] = None  # Dataset for all imported Scans, set separately in each worker process
+manifest_path = DEFAULT_MANIFEST_FILE_NAME  # Path to the manifest file, set separately in each worker process
+
+
+def load_manifest(path: str) -> Tuple[Set[str], Dict[str, ScanID]]:
+    """Load manifest with a progress of previous import.
+
+    :param path: path to the manifest file
+    :return: tuple of directories that were fully imported and Scans that were imported only partially
+    """
+    imported_directories: Set[str] = set()
+    started_scans: Dict[str, ScanID] = {}
+    if not os.path.exists(path):
+        return imported_directories, started_scans
+
+    with open(path) as manifest_file:
+        for line in manifest_file:
+            entry = json.loads(line)
+            if entry['finished']:
+                imported_directories.add(entry['directory'])
+            else:
+                started_scans[entry['directory']] = ScanID(entry['scan_id'])
+    partially_imported_scans = {directory: scan_id for directory, scan_id in started_scans.items()
+                                if directory not in imported_directories}
+    return imported_directories, partially_imported_scans
+
+
+def append_to_manifest(path: str, directory: str, scan_id: ScanID, finished: bool) -> None:
+    """Note down progress of the import in the manifest file.
+
+    Each entry is written with a single call, so that multiple processes can append to this file at once.
+
+    :param path: path to the manifest file
+    :param directory: directory with Scan that is imported
+    :param scan_id: ID of a Scan created for given directory
+    :param finished: boolean information if Scan was fully imported
+    """
+    entry = json.dumps({'directory': directory, 'scan_id': scan_id, 'finished': finished}) + '\n'
+    with open(path, 'a') as manifest_file:
+        manifest_file.write(entry)
+
+
+def initialize_worker(dataset_key: str, path: str) -> None:
+    """Initialize worker process with its own connections to the SQL DB and Storage."""
+    global dataset, manifest_path  # pylint: disable=global-statement,invalid-name
+    storage.create_connection()
+    engine.dispose()  # Recreate SQL Pool
+    dataset = DatasetsRepository.get_dataset_by_key(dataset_key)
+    manifest_path = path
+
+
+def import_scan(scan_directory: str) -> Optional[ImportedScan]:
+    """Import a single Scan from given directory.
+
+    :param scan_directory: directory with DICOM files
+    :return: information about imported Scan or None if it could not be imported
+    """
+    try:
+        return _import_scan(scan_directory)
+    except Exception:  # pylint: disable=broad-except;  Single broken Scan should not stop whole import
+        logger.exception('Could not import Scan from "%s".', scan_directory)
+        return None
+
+
+def _import_scan(scan_directory: str) -> ImportedScan:
+    """Import a single Scan from given directory and note it down in the manifest."""
+    assert dataset, 'Worker process was not initialized!'
+    slice_names = sorted(glob.glob(scan_directory + '/*.dcm'))
+    scan = ScansRepository.add_new_scan(dataset, len(slice_names), None)
+    append_to_manifest(manifest_path, scan_directory, scan.id, finished=False)
+
+    number_of_bytes = 0
+    for chunk_begin in range(0, len(slice_names), SLICES_CHUNK_SIZE):
+        images = _read_images(slice_names[chunk_begin:chunk_begin + SLICES_CHUNK_SIZE])
+        new_slices_ids = scan.add_slices(len(images))
+        _store_original_images(dict(zip(new_slices_ids, images)))
+        number_of_bytes += sum(len(image) for image in images)
 
-    source = args.source.rstrip('/')
-    for scan_directory in glob.iglob(source + '/*'):
+    parse_dicoms_and_update_slices.delay(scan.id)
+    append_to_manifest(manifest_path, scan_directory, scan.id, finished=True)
+    logger.info('Scan "%s" imported from "%s" with %d Slices.', scan.id, scan_directory, len(slice_names))
+    return ImportedScan(scan_directory, scan.id, len(slice_names), number_of_bytes)
+
+
+def _read_images(file_names: List[str]) -> List[bytes]:
+    """Read all given DICOM files into memory."""
+    images = []
+    for file_name in file_names:
+        with open(file_name, 'rb') as dicom_file:
+            images.append(dicom_file.read())
+    return images
+
+
+def _store_original_images(images: Dict[SliceID, bytes]) -> None:
+    """Store original images into Storage and retry for those which could not be stored."""
+    for _ in range(STORAGE_RETRIES):
+        images = {slice_id: images[slice_id] for slice_id in SlicesRepository.store_original_images(images)}
+        if not images:
+            return
+    raise InternalErrorException('Could not store {} original images in the Storage.'.format(len(images)))
+
+
+def remove_partially_imported_scans(partially_imported_scans: Dict[str, ScanID]) -> None:
+    """Remove Scans that were not fully imported during previous run, so they can be imported again."""
+    for directory, scan_id in partially_imported_scans.items():
+        logger.info('Removing partially imported Scan "%s" from "%s".', scan_id, directory)
+        try:
+            ScansRepository.delete_scan_by_id(scan_id)
+        except Exception:  # pylint: disable=broad-except;  Scan may not even exist in the database
+            logger.warning('Could not remove Scan "%s". Skipping...', scan_id)
+
+
+def get_directories_to_import(source: str, imported_directories: Set[str]) -> List[str]:
+    """Return all directories with Scans that were not imported yet."""
+    directories_to_import = []
+    for scan_directory in sorted(glob.iglob(source.rstrip('/') + '/*')):
         if not os.path.isdir(scan_directory):
             logger.warning('"%s" is not a directory. Skipping...', scan_directory)
-            continue
-
-        logger.info('Adding new Scan from "%s".', scan_directory)
-        slice_names = glob.glob(scan_directory + '/*.dcm')
-        number_of_slices = len(slice_names)
-        scan = ScansRepository.add_new_scan(dataset, number_of_slices, None)
-
-        for slice_name in slice_names:
-            logger.info('Adding new Slice to Scan "%s" based on "%s".', scan.id, slice_name)
-            with open(slice_name, 'rb') as slice_dicom_file:
-                _slice = scan.add_slice()
-                image = slice_dicom_file.read()
-                parse_dicom_and_update_slice.delay(_slice.id, image)
+        elif scan_directory not in imported_directories:
+            directories_to_import.append(scan_directory)
+    return directories_to_import
+
+
+def report_throughput(imported_scans: List[ImportedScan], elapsed_time: float) -> None:
+    """Log summary of the import with its throughput."""
+    number_of_slices = sum(imported_scan.number_of_slices for imported_scan in imported_scans)
+    number_of_megabytes = sum(imported_scan.number_of_bytes for imported_scan in imported_scans) / 2 ** 20
+    elapsed_time = max(elapsed_time, 1e-6)
+    logger.info('Imported %d Scans (%d Slices, %.1f MB) in %.1fs.', len(imported_scans), number_of_slices,
+                number_of_megabytes, elapsed_time)
+    logger.info('Throughput: %.1f slices/s, %.2f MB/s.', number_of_slices / elapsed_time,
+                number_of_megabytes / elapsed_time)
+
+
+def main() -> None:
+    """Import all Scans from source directory."""
+    parser = argparse.ArgumentParser(description='Import data to the MedTagger.')
+    parser.add_argument('--source', type=str, required=True, help='Source directory')
+    parser.add_argument('--dataset', type=str, required=True, help='Dataset key for these scans')
+    parser.add_argument('--processes', type=int, default=os.cpu_count(), help='Number of parallel processes')
+    parser.add_argument('--manifest', type=str, default=DEFAULT_MANIFEST_FILE_NAME,
+                        help='Path to the manifest file with progress of the import')
+    args = parser.parse_args()
+
+    logger.info('Checking Dataset...')
+    storage.create_connection()
+    DatasetsRepository.get_dataset_by_key(args.dataset)
+
+    imported_directories, partially_imported_scans = load_manifest(args.manifest)
+    remove_partially_imported_scans(partially_imported_scans)
+    directories_to_import = get_directories_to_import(args.source, imported_directories)
+    logger.info('Importing %d Scans (%d were already imported)...', len(directories_to_import),
+                len(imported_directories))
+
+    start_time = time.time()
+    with Pool(args.processes, initializer=initialize_worker, initargs=(args.dataset, args.manifest)) as pool:
+        imported_scans = [imported_scan for imported_scan in pool.imap_unordered(import_scan, directories_to_import)
+                          if imported_scan]
+    report_throughput(imported_scans, time.time() - start_time)
+
+
+if __name__ == '__main__':
+    main()
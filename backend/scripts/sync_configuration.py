@@ -1,13 +1,13 @@
 """Script for MedTagger's configuration synchronization."""
 import argparse
 import logging.config
-from typing import Dict
+from typing import Dict, Optional, Tuple
 
 import yaml
 from sqlalchemy.exc import IntegrityError
 
 from medtagger.database.models import Task
-from medtagger.definitions import LabelTool
+from medtagger.definitions import LabelTool, SliceCodec
 from medtagger.repositories import (
     datasets as DatasetsRepository,
     tasks as TasksRepository,
@@ -39,6 +39,8 @@ def _sync_datasets(configuration: Dict) -> None:
     datasets:
       - name: Kidneys
         key: KIDNEYS
+        codec: PNG  # Optional, one of: PNG (default), WEBP, RAW_ZLIB
+        compression_level: 6  # Optional, codec's default if not set
         tasks:
           - KIDNEYS_SEGMENTATION
     ```
@@ -55,13 +57,13 @@ def _sync_datasets(configuration: Dict) -> None:
 
     for dataset_key in datasets_to_add:
         dataset = next(dataset for dataset in datasets if dataset['key'] == dataset_key)
-        DatasetsRepository.add_new_dataset(dataset['key'], dataset['name'])
+        DatasetsRepository.add_new_dataset(dataset['key'], dataset['name'], *_get_slices_codec(dataset))
         logger.info('New DataSet added: %s', dataset['key'])
 
     for dataset_key in datasets_to_enable:
         dataset = next(dataset for dataset in datasets if dataset['key'] == dataset_key)
         DatasetsRepository.enable(dataset['key'])
-        DatasetsRepository.update(dataset['key'], dataset['name'])
+        DatasetsRepository.update(dataset['key'], dataset['name'], *_get_slices_codec(dataset))
         logger.info('DataSet enabled: %s', dataset['key'])
 
     for dataset_key in datasets_to_disable:
@@ -69,6 +71,11 @@ def _sync_datasets(configuration: Dict) -> None:
         logger.info('DataSet disabled: %s', dataset_key)
 
 
+def _get_slices_codec(dataset: Dict) -> Tuple[SliceCodec, Optional[int]]:
+    """Return codec and its compression level for converted Slices in given Dataset from configuration file."""
+    return SliceCodec[dataset.get('codec', SliceCodec.PNG.value)], dataset.get('compression_level')
+
+
 def _sync_tasks(configuration: Dict) -> None:
     """Synchronize Tasks from configuration file with database entries.
 
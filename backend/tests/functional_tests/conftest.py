@@ -12,7 +12,7 @@ from medtagger.api.rest import app
 from medtagger.api.users.business import set_user_role
 from medtagger.database import Base, Session, db_transaction_session
 from medtagger.database.fixtures import apply_all_fixtures
-from medtagger.repositories import roles as RolesRepository
+from medtagger.repositories import labels as LabelsRepository, roles as RolesRepository
 from medtagger.storage import models
 
 logger = logging.getLogger(__name__)
@@ -73,6 +73,7 @@ def _clear_databases() -> None:
         for table in reversed(Base.metadata.sorted_tables):
             sess.execute('TRUNCATE TABLE "{}" RESTART IDENTITY CASCADE;'.format(table.name))
     Session.close_all()
+    LabelsRepository.labeled_scans_cache.clear()  # IDs are restarted, so cached ones would point to new entries
 
     logger.info('Removing all data from Cassandra.')
     storage_session = storage.create_session()
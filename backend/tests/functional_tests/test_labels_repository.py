@@ -11,7 +11,7 @@ from medtagger.repositories import (
     labels as LabelsRepository,
     users as UsersRepository,
 )
-from medtagger.types import LabelingTime
+from medtagger.types import LabelingTime, UserID
 
 
 def test_get_predefined_label_for_scan_in_task__no_predefined_label(prepare_environment: Any) -> None:
@@ -105,7 +105,40 @@ def test_get_predefined_brush_label_elements(prepare_environment: Any) -> None:
     LabelsRepository.add_new_brush_label_element(label.id, 2, 0, 0, b'', label_tag)
 
     # Step 3. Check if there is is Predefined Label
-    brush_label_elements = LabelsRepository.get_predefined_brush_label_elements(scan.id, task.id, 0, 3)
+    brush_label_elements = LabelsRepository.get_predefined_brush_label_elements(scan.id, task.key)
     assert len(brush_label_elements) == 3
-    brush_label_elements = LabelsRepository.get_predefined_brush_label_elements(scan.id, task.id, 0, 1)
-    assert len(brush_label_elements) == 1
+    assert [label_element.slice_index for label_element in brush_label_elements] == [0, 1, 2]
+    assert all(label_element.tag_key == 'EXAMPLE_TAG' for label_element in brush_label_elements)
+    brush_label_elements = LabelsRepository.get_predefined_brush_label_elements(scan.id, 'OTHER_TASK')
+    assert not brush_label_elements
+
+    # Step 4. Check if cached Elements are refreshed once new Element is added
+    LabelsRepository.add_new_brush_label_element(label.id, 3, 0, 0, b'', label_tag)
+    brush_label_elements = LabelsRepository.get_predefined_brush_label_elements(scan.id, task.key)
+    assert [label_element.slice_index for label_element in brush_label_elements] == [0, 1, 2, 3]
+
+
+def test_warm_up_and_check_labeled_scans_cache(prepare_environment: Any) -> None:
+    """Test for loading IDs of labeled Scans into the cache and checking them against Labels in database."""
+    # Step 1. Prepare a structure for the test
+    dataset = DatasetsRepository.add_new_dataset('KIDNEYS', 'Kidneys')
+    task = TasksRepository.add_task('MARK_KIDNEYS', 'Mark Kidneys', 'path/to/image', ['KIDNEYS'], '', [], [])
+    LabelTagsRepository.add_new_tag('EXAMPLE_TAG', 'Example Tag', [LabelTool.RECTANGLE], task.id)
+    labeled_scan = ScansRepository.add_new_scan(dataset, 0)
+    predefined_scan = ScansRepository.add_new_scan(dataset, 0)
+    other_scan = ScansRepository.add_new_scan(dataset, 0)
+    user_id = UsersRepository.add_new_user(User('user@medtagger', 'HASH', 'Admin', 'Admin'))
+    user = UsersRepository.get_user_by_id(user_id)
+    LabelsRepository.add_new_label(labeled_scan.id, task.key, user, LabelingTime(0), is_predefined=False)
+    LabelsRepository.add_new_label(predefined_scan.id, task.key, user, LabelingTime(0), is_predefined=True)
+
+    # Step 2. Warm up the cache and check that Predefined Labels were skipped
+    assert LabelsRepository.warm_up_labeled_scans_cache() == 1
+    assert LabelsRepository.labeled_scans_cache.items() == [((user_id, task.id), frozenset({labeled_scan.id}))]
+    assert LabelsRepository.check_labeled_scans_cache() == (1, [])
+
+    # Step 3. Add Label without updating the cache (e.g. in another process) and check that entry is dropped
+    LabelsRepository.add_new_label(other_scan.id, task.key, user, LabelingTime(0), is_predefined=False)
+    assert LabelsRepository.check_labeled_scans_cache() == (1, [(user_id, task.id)])
+    assert not LabelsRepository.labeled_scans_cache.items()
+    assert LabelsRepository.get_labeled_scans_ids(UserID(user_id), task.id) == {labeled_scan.id, other_scan.id}
@@ -8,6 +8,7 @@ import pytest
 from cassandra import WriteTimeout
 from PIL import Image
 
+from medtagger.api.scans import service_rest
 from medtagger.database.models import SliceOrientation
 from medtagger.repositories import (
     slices as SlicesRepository,
@@ -66,6 +67,67 @@ def test_scan_upload_and_conversion(prepare_environment: Any, synchronous_celery
     # assert x_slice_image.size == (256, 186)
 
 
+def test_scan_upload_in_batch(prepare_environment: Any, synchronous_celery: Any) -> None:
+    """Test application for Scan upload with multiple Slices sent in a single request."""
+    api_client = get_api_client()
+    user_token = get_token_for_logged_in_user('admin')
+
+    # Step 1. Prepare a structure for the test
+    DatasetsRepository.add_new_dataset('KIDNEYS', 'Kidneys')
+
+    # Step 2. Add Scan to the system
+    payload = {'dataset': 'KIDNEYS', 'number_of_slices': 3}
+    response = api_client.post('/api/v1/scans', data=json.dumps(payload),
+                               headers=get_headers(token=user_token, json=True))
+    json_response = json.loads(response.data)
+    scan_id = json_response['scan_id']
+
+    # Step 3. Send all Slices at once
+    files = sorted(glob.glob('tests/assets/example_scan/*.dcm'))
+    images = [open(file, 'rb') for file in files]
+    response = api_client.post('/api/v1/scans/{}/slices/batch'.format(scan_id), data={
+        'image': [(image, 'slice_{}.dcm'.format(index)) for index, image in enumerate(images)],
+    }, headers=get_headers(token=user_token, multipart=True))
+    assert response.status_code == 201
+    json_response = json.loads(response.data)
+    assert [uploaded_slice['file_name'] for uploaded_slice in json_response['slices']] == \
+        ['slice_0.dcm', 'slice_1.dcm', 'slice_2.dcm']
+    assert all(uploaded_slice['slice_id'] for uploaded_slice in json_response['slices'])
+    assert not any(uploaded_slice['error'] for uploaded_slice in json_response['slices'])
+
+    # Step 4. Check Scan & Slices in the databases
+    z_slices = SlicesRepository.get_slices_by_scan_id(scan_id)
+    assert len(z_slices) == 3
+    z_slice = SlicesRepository.get_slice_converted_image(z_slices[0].id)
+    z_slice_image = Image.open(io.BytesIO(z_slice))
+    assert z_slice_image.size == (512, 512)
+
+
+def test_scan_upload_in_too_big_batch(prepare_environment: Any, mocker: Any) -> None:
+    """Test application for Scan upload with more Slices in a single request than it is allowed."""
+    api_client = get_api_client()
+    user_token = get_token_for_logged_in_user('admin')
+    mocker.patch.object(service_rest, 'SLICES_BATCH_MAX_FILES', 2)
+    parsing_task = mocker.patch('medtagger.api.scans.business.parse_dicoms_and_update_slices')
+
+    # Step 1. Prepare a structure for the test
+    DatasetsRepository.add_new_dataset('KIDNEYS', 'Kidneys')
+    payload = {'dataset': 'KIDNEYS', 'number_of_slices': 3}
+    response = api_client.post('/api/v1/scans', data=json.dumps(payload),
+                               headers=get_headers(token=user_token, json=True))
+    scan_id = json.loads(response.data)['scan_id']
+
+    # Step 2. Send too many Slices at once and check that none of them was added
+    files = sorted(glob.glob('tests/assets/example_scan/*.dcm'))
+    images = [open(file, 'rb') for file in files]
+    response = api_client.post('/api/v1/scans/{}/slices/batch'.format(scan_id), data={
+        'image': [(image, 'slice_{}.dcm'.format(index)) for index, image in enumerate(images)],
+    }, headers=get_headers(token=user_token, multipart=True))
+    assert response.status_code == 400
+    assert not SlicesRepository.get_slices_by_scan_id(scan_id)
+    assert not parsing_task.delay.called
+
+
 @pytest.fixture
 def fixture_problems_with_storage(mocker: Any) -> Any:
     """Fixture that mocks method related to storing original image in Cassandra."""
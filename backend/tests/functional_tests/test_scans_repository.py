@@ -0,0 +1,141 @@
+"""Tests Scans Repository."""
+from typing import Any, List, Tuple
+
+from medtagger.database.models import Scan, Task, User
+from medtagger.definitions import LabelTool, ScanStatus
+from medtagger.repositories import (
+    datasets as DatasetsRepository,
+    label_tags as LabelTagsRepository,
+    tasks as TasksRepository,
+    scans as ScansRepository,
+    labels as LabelsRepository,
+    users as UsersRepository,
+)
+from medtagger.types import LabelingTime
+
+
+def _prepare_available_scans(random_keys: List[float]) -> Tuple[Task, User, List[Scan]]:
+    """Add Task, User and available Scans with given random keys."""
+    dataset = DatasetsRepository.add_new_dataset('KIDNEYS', 'Kidneys')
+    task = TasksRepository.add_task('MARK_KIDNEYS', 'Mark Kidneys', 'path/to/image', ['KIDNEYS'], '', [], [])
+    LabelTagsRepository.add_new_tag('EXAMPLE_TAG', 'Example Tag', [LabelTool.RECTANGLE], task.id)
+    user_id = UsersRepository.add_new_user(User('user@medtagger', 'HASH', 'Admin', 'Admin'))
+    user = UsersRepository.get_user_by_id(user_id)
+    scans = []
+    for random_key in random_keys:
+        scan = ScansRepository.add_new_scan(dataset, 0)
+        scan.random_key = random_key
+        scans.append(scan.update_status(ScanStatus.AVAILABLE))
+    return task, user, scans
+
+
+def test_get_random_scan__outdated_labeled_scans(prepare_environment: Any, mocker: Any) -> None:
+    """Test for fetching random Scan when given IDs of labeled Scans are missing a Label (e.g. added elsewhere)."""
+    # Step 1. Prepare a structure for the test
+    task, user, scans = _prepare_available_scans([0.2, 0.4, 0.6])
+    mocker.patch.object(ScansRepository.random, 'random', return_value=0.3)
+
+    # Step 2. Label next Scans without passing them as labeled and check that they are checked only once
+    LabelsRepository.add_new_label(scans[1].id, task.key, user, LabelingTime(0), is_predefined=False)
+    LabelsRepository.add_new_label(scans[2].id, task.key, user, LabelingTime(0), is_predefined=False)
+    is_scan_labeled_by_user = mocker.spy(ScansRepository, 'is_scan_labeled_by_user')
+    scan = ScansRepository.get_random_scan(task, user, frozenset())
+    assert scan and scan.id == scans[0].id
+    assert is_scan_labeled_by_user.call_count == 1
+
+    # Step 3. Check that there is no Scan left once all of them were labeled
+    LabelsRepository.add_new_label(scans[0].id, task.key, user, LabelingTime(0), is_predefined=False)
+    assert not ScansRepository.get_random_scan(task, user, frozenset({scans[2].id}))
+
+
+def test_get_random_scan__many_labeled_scans(prepare_environment: Any, mocker: Any) -> None:
+    """Test for fetching random Scan when User labeled too many Scans to exclude them by their IDs."""
+    # Step 1. Prepare a structure for the test
+    task, user, scans = _prepare_available_scans([0.2, 0.4, 0.6])
+    mocker.patch.object(ScansRepository, 'MAX_EXCLUDED_SCANS_IN_QUERY', 1)
+    mocker.patch.object(ScansRepository.random, 'random', return_value=0.3)
+
+    # Step 2. Label two Scans and check that only the last one is returned
+    for labeled_scan in scans[:2]:
+        LabelsRepository.add_new_label(labeled_scan.id, task.key, user, LabelingTime(0), is_predefined=False)
+    scan = ScansRepository.get_random_scan(task, user, frozenset({scans[0].id, scans[1].id}))
+    assert scan and scan.id == scans[2].id
+
+
+def test_get_random_scan__wrap_around(prepare_environment: Any, mocker: Any) -> None:
+    """Test for fetching random Scan when there is no Scan with random key greater than the randomized one."""
+    # Step 1. Prepare a structure for the test
+    task, user, scans = _prepare_available_scans([0.2, 0.4])
+    mocker.patch.object(ScansRepository.random, 'random', return_value=0.5)
+
+    # Step 2. Check that the Scan with the lowest random key is returned
+    scan = ScansRepository.get_random_scan(task, user)
+    assert scan and scan.id == scans[0].id
+
+    # Step 3. Check that Scans before the randomized key are still excluded if they were labeled
+    LabelsRepository.add_new_label(scans[0].id, task.key, user, LabelingTime(0), is_predefined=False)
+    scan = ScansRepository.get_random_scan(task, user, frozenset({scans[0].id}))
+    assert scan and scan.id == scans[1].id
+
+
+def test_get_random_scan__labeled_scans(prepare_environment: Any, mocker: Any) -> None:
+    """Test for fetching random Scan when some of them were labeled by the User."""
+    # Step 1. Prepare a structure for the test
+    task, user, scans = _prepare_available_scans([0.2, 0.4, 0.6])
+    other_user_id = UsersRepository.add_new_user(User('other@medtagger', 'HASH', 'Other', 'User'))
+    other_user = UsersRepository.get_user_by_id(other_user_id)
+    mocker.patch.object(ScansRepository.random, 'random', return_value=0.1)
+
+    # Step 2. Label Scans by both Users and check that only Scans labeled by the same User are excluded
+    LabelsRepository.add_new_label(scans[0].id, task.key, user, LabelingTime(0), is_predefined=False)
+    LabelsRepository.add_new_label(scans[1].id, task.key, other_user, LabelingTime(0), is_predefined=False)
+    scan = ScansRepository.get_random_scan(task, user, frozenset({scans[0].id}))
+    assert scan and scan.id == scans[1].id
+    scan = ScansRepository.get_random_scan(task, other_user, frozenset({scans[1].id}))
+    assert scan and scan.id == scans[0].id
+
+    # Step 3. Check that there is no Scan once the User labeled all of them
+    LabelsRepository.add_new_label(scans[1].id, task.key, user, LabelingTime(0), is_predefined=False)
+    LabelsRepository.add_new_label(scans[2].id, task.key, user, LabelingTime(0), is_predefined=False)
+    assert not ScansRepository.get_random_scan(task, user, frozenset(scan.id for scan in scans))
+
+
+def test_get_random_scan__predefined_labels(prepare_environment: Any, mocker: Any) -> None:
+    """Test for fetching random Scan which has a Predefined Label added by the User."""
+    # Step 1. Prepare a structure for the test
+    task, user, scans = _prepare_available_scans([0.2])
+    mocker.patch.object(ScansRepository.random, 'random', return_value=0.1)
+
+    # Step 2. Add Predefined Label and check that the Scan is still returned
+    LabelsRepository.add_new_label(scans[0].id, task.key, user, LabelingTime(0), is_predefined=True)
+    scan = ScansRepository.get_random_scan(task, user)
+    assert scan and scan.id == scans[0].id
+    assert not ScansRepository.is_scan_labeled_by_user(scans[0].id, user, task)
+
+
+def test_get_random_scan__task_filter(prepare_environment: Any, mocker: Any) -> None:
+    """Test for fetching random Scan only from Datasets assigned to given Task."""
+    # Step 1. Prepare a structure for the test
+    task, user, scans = _prepare_available_scans([0.2])
+    other_dataset = DatasetsRepository.add_new_dataset('LUNGS', 'Lungs')
+    other_task = TasksRepository.add_task('MARK_LUNGS', 'Mark Lungs', 'path/to/image', ['LUNGS'], '', [], [])
+    other_scan = ScansRepository.add_new_scan(other_dataset, 0)
+    other_scan.random_key = 0.3
+    other_scan.update_status(ScanStatus.AVAILABLE)
+    not_available_scan = ScansRepository.add_new_scan(other_dataset, 0)
+    not_available_scan.random_key = 0.4
+    not_available_scan.save()
+    mocker.patch.object(ScansRepository.random, 'random', return_value=0.25)
+
+    # Step 2. Check that only Scans from given Task are returned (and any available Scan without Task)
+    scan = ScansRepository.get_random_scan(task, user)
+    assert scan and scan.id == scans[0].id
+    scan = ScansRepository.get_random_scan(other_task, user)
+    assert scan and scan.id == other_scan.id
+    scan = ScansRepository.get_random_scan()
+    assert scan and scan.id == other_scan.id
+
+    # Step 3. Check that Labels from other Tasks do not exclude a Scan
+    LabelsRepository.add_new_label(scans[0].id, other_task.key, user, LabelingTime(0), is_predefined=False)
+    scan = ScansRepository.get_random_scan(task, user)
+    assert scan and scan.id == scans[0].id
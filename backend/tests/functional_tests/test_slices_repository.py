@@ -0,0 +1,32 @@
+"""Tests Slices Repository."""
+from typing import Any
+
+from medtagger.database import db_transaction_session
+from medtagger.database.models import Slice
+from medtagger.repositories import (
+    datasets as DatasetsRepository,
+    scans as ScansRepository,
+    slices as SlicesRepository,
+)
+from medtagger.types import SliceLocation
+
+
+def test_get_ordered_slices_ids(prepare_environment: Any) -> None:
+    """Test for fetching ordered IDs of Slices, which are cached until any of the Slices changes."""
+    # Step 1. Prepare a structure for the test
+    dataset = DatasetsRepository.add_new_dataset('KIDNEYS', 'Kidneys')
+    scan = ScansRepository.add_new_scan(dataset, 3)
+    locations = [SliceLocation(2.0), SliceLocation(0.0), SliceLocation(1.0)]
+    first_id, second_id, third_id = scan.add_slices(3, locations=locations)
+
+    # Step 2. Check that IDs are ordered by location
+    assert SlicesRepository.get_ordered_slices_ids(scan.id) == [second_id, third_id, first_id]
+
+    # Step 3. Change location without invalidating the cache (e.g. in a worker) and check that order is updated
+    SlicesRepository.get_slice_by_id(first_id).update_location(SliceLocation(0.5))
+    assert SlicesRepository.get_ordered_slices_ids(scan.id) == [second_id, first_id, third_id]
+
+    # Step 4. Remove a Slice from database and check that it is not returned anymore
+    with db_transaction_session() as session:
+        session.query(Slice).filter(Slice.id == second_id).delete()
+    assert SlicesRepository.get_ordered_slices_ids(scan.id) == [first_id, third_id]
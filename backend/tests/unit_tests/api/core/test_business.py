@@ -1,4 +1,7 @@
 """Unit tests for medtagger/api/core/business.py."""
+from typing import Any
+
+from medtagger.api.core import business
 from medtagger.api.core.business import success
 
 
@@ -7,3 +10,17 @@ def test_success() -> None:
     response = success()
     assert isinstance(response, dict)
     assert response['success']
+
+
+def test_get_health(mocker: Any) -> None:
+    """Check if API is healthy only if all services are alive."""
+    database_check = mocker.Mock(get_status=mocker.Mock(return_value={'alive': True, 'latency': {}}))
+    database_check.name = 'database'
+    storage_check = mocker.Mock(get_status=mocker.Mock(return_value={'alive': False, 'latency': {}}))
+    storage_check.name = 'storage'
+    mocker.patch.object(business, 'health_checks', [database_check, storage_check])
+
+    health = business.get_health()
+
+    assert health == {'healthy': False, 'database': {'alive': True, 'latency': {}},
+                      'storage': {'alive': False, 'latency': {}}}
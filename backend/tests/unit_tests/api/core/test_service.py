@@ -24,3 +24,21 @@ def test_status_endpoint(mocker: Any, success_fixture: Any) -> None:
 
     json_response = json.loads(response.data)
     assert json_response == {'success': True}
+
+
+def test_health_endpoint_when_service_is_not_alive(mocker: Any) -> None:
+    """Check if health endpoint reports unavailable service with its latency."""
+    mocked_get_health = mocker.patch('medtagger.api.core.business.get_health')
+    latency = {'p50': 1.0, 'p90': 2.0, 'p99': 3.0}
+    mocked_get_health.return_value = {
+        'healthy': False,
+        'database': {'alive': True, 'latency': latency},
+        'storage': {'alive': False, 'latency': latency},
+    }
+    client = get_test_application(mocker)
+
+    response = client.get('/api/v1/core/health')
+    assert response.status_code == 503
+
+    json_response = json.loads(response.data)
+    assert json_response == mocked_get_health.return_value
@@ -0,0 +1,123 @@
+"""Unit tests for medtagger/api/scans/prefetch.py."""
+from typing import Any, Iterable, List, Tuple
+
+import gevent
+import pytest
+
+from medtagger.api.scans import prefetch
+from medtagger.api.scans.prefetch import SlicesPrefetcher, SliceWindow
+from medtagger.definitions import SliceCodec, SliceOrientation
+from medtagger.types import ScanID
+
+NUMBER_OF_SLICES = 60
+
+
+def _get_slices_for_scan(_scan_id: ScanID, begin: int, count: int, reversed_order: bool = False,
+                         **_: Any) -> Iterable[Tuple[int, bytes, SliceCodec]]:
+    """Return fake Slices with their indices as images (switching to other greenlets as if waiting for storage)."""
+    indices = range(begin, min(begin + count, NUMBER_OF_SLICES))
+    for index in reversed(indices) if reversed_order else indices:
+        gevent.sleep(0)
+        yield index, bytes([index]), SliceCodec.PNG
+
+
+@pytest.fixture
+def get_slices_for_scan(mocker: Any) -> Any:
+    """Mock fetching Slices from databases."""
+    mocker.patch.object(prefetch, 'Session')
+    mocker.patch.object(prefetch, 'statistics', {'hits': 0, 'misses': 0})
+    return mocker.patch.object(prefetch.business, 'get_slices_for_scan', side_effect=_get_slices_for_scan)
+
+
+def _get_indices(slices: Iterable[Tuple[int, bytes, SliceCodec]]) -> List[int]:
+    """Return indices of given Slices and check that their images match them."""
+    slices = list(slices)
+    assert all(image == bytes([index]) for index, image, _ in slices)
+    return [index for index, _, _ in slices]
+
+
+def test_next_window_is_prefetched_while_current_one_is_sent(get_slices_for_scan: Any) -> None:
+    """Check if next window survives sending the current one with default cache size (same order as WebSocket API)."""
+    prefetcher = SlicesPrefetcher()
+    window = SliceWindow(ScanID('SCAN'), 0, 25, SliceOrientation.Z, None)
+
+    first_slices = prefetcher.get_slices(window)
+    prefetcher.prefetch_next_window(window)
+    first_indices = _get_indices(first_slices)
+    second_slices = prefetcher.get_slices(window._replace(begin=25))
+
+    assert first_indices == list(range(0, 25))
+    assert _get_indices(second_slices) == list(range(25, 50))
+    assert get_slices_for_scan.call_count == 2
+    assert (prefetcher.hits, prefetcher.misses) == (25, 25)
+
+
+def test_next_window_is_served_from_cache(get_slices_for_scan: Any) -> None:
+    """Check if next window in the direction of scrolling is prefetched in background."""
+    prefetcher = SlicesPrefetcher(max_size=50)
+    window = SliceWindow(ScanID('SCAN'), 0, 25, SliceOrientation.Z, None)
+
+    first_slices = _get_indices(prefetcher.get_slices(window))
+    prefetcher.prefetch_next_window(window)
+    second_slices = prefetcher.get_slices(window._replace(begin=25))
+
+    assert first_slices == list(range(0, 25))
+    assert _get_indices(second_slices) == list(range(25, 50))
+    assert get_slices_for_scan.call_count == 2
+    assert (prefetcher.hits, prefetcher.misses) == (25, 25)
+    assert prefetch.statistics == {'hits': 25, 'misses': 25}
+
+
+def test_previous_window_is_prefetched_in_reversed_order(get_slices_for_scan: Any) -> None:
+    """Check if previous window is prefetched if User scrolls in reversed order (without negative indices)."""
+    prefetcher = SlicesPrefetcher(max_size=50)
+    window = SliceWindow(ScanID('SCAN'), 10, 25, SliceOrientation.Z, None)
+
+    list(prefetcher.get_slices(window, reversed_order=True))
+    prefetcher.prefetch_next_window(window, reversed_order=True)
+    previous_slices = prefetcher.get_slices(window._replace(begin=0, count=10), reversed_order=True)
+
+    assert _get_indices(previous_slices) == list(range(9, -1, -1))
+    assert get_slices_for_scan.call_args[0][1:3] == (0, 10)
+    assert prefetcher.hits == 10
+
+
+def test_only_missing_slices_are_fetched(get_slices_for_scan: Any) -> None:
+    """Check if partially prefetched window fetches only missing Slices and only prefetched ones are cached."""
+    prefetcher = SlicesPrefetcher(max_size=30)
+    window = SliceWindow(ScanID('SCAN'), 40, 25, SliceOrientation.Z, 256)
+
+    prefetcher.prefetch_next_window(window._replace(begin=10, count=20))
+    slices = prefetcher.get_slices(window)
+
+    assert _get_indices(slices) == list(range(40, NUMBER_OF_SLICES))
+    assert get_slices_for_scan.call_args[0][1:3] == (50, 15)
+    assert get_slices_for_scan.call_args[1]['resolution'] == 256
+    assert len(prefetcher._slices) == 20  # pylint: disable=protected-access
+
+
+def test_disabled_prefetch(get_slices_for_scan: Any) -> None:
+    """Check if Slices are still returned if prefetching was disabled."""
+    prefetcher = SlicesPrefetcher(max_size=0)
+    window = SliceWindow(ScanID('SCAN'), 0, 5, SliceOrientation.Z, None)
+
+    slices = _get_indices(prefetcher.get_slices(window))
+    prefetcher.prefetch_next_window(window)
+
+    assert slices == list(range(5))
+    assert get_slices_for_scan.call_count == 1
+
+
+def test_slices_are_returned_as_soon_as_they_arrive(get_slices_for_scan: Any) -> None:
+    """Check if Slices are returned one by one in order, merging cached ones with the ones being fetched."""
+    prefetcher = SlicesPrefetcher(max_size=50)
+    window = SliceWindow(ScanID('SCAN'), 5, 10, SliceOrientation.Z, None)
+    prefetcher.prefetch_next_window(window._replace(begin=4, count=4))
+
+    slices = prefetcher.get_slices(window, reversed_order=True)
+    first_index, _, _ = next(slices)
+
+    assert first_index == 14
+    assert get_slices_for_scan.call_args[1]['reversed_order'] is True
+    assert _get_indices(slices) == list(range(13, 4, -1))
+    assert (prefetcher.hits, prefetcher.misses) == (4, 6)
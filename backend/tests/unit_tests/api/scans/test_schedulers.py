@@ -0,0 +1,76 @@
+"""Unit tests for medtagger/api/scans/schedulers.py."""
+from typing import Any
+
+from medtagger.api.scans import schedulers
+from medtagger.api.scans.schedulers import CoverageScanScheduler, ScansCoverage
+from medtagger.definitions import ScanStatus
+from medtagger.types import ScanID, TaskID
+
+
+def test_scans_coverage_prefers_scans_with_the_lowest_priority() -> None:
+    """Check if Scans with fewer Labels (and fewer skips) are chosen first and priorities are updated."""
+    coverage = ScansCoverage([
+        (ScanID('LABELED'), 1, 0),
+        (ScanID('SKIPPED'), 0, schedulers.SKIPS_PER_LABEL),
+        (ScanID('NEW'), 0, 0),
+    ])
+
+    assert coverage.choose(set()) == 'NEW'
+    assert coverage.choose({ScanID('NEW')}) in {'LABELED', 'SKIPPED'}
+
+    coverage.add_label(ScanID('NEW'))
+    coverage.add_label(ScanID('NEW'))
+    coverage.add_skip(ScanID('LABELED'))
+    coverage.remove(ScanID('SKIPPED'))
+
+    assert coverage.choose(set()) == 'LABELED'
+    assert coverage.choose({ScanID('LABELED')}) == 'NEW'
+    assert coverage.choose({ScanID('LABELED'), ScanID('NEW')}) is None
+
+
+def test_coverage_scheduler_skips_scans_that_are_no_longer_available(mocker: Any) -> None:
+    """Check if coverage is loaded once, updated with new Labels and unavailable Scans are dropped from it."""
+    get_coverage = mocker.patch.object(schedulers.ScansRepository, 'get_available_scans_coverage', return_value=[
+        (ScanID('DELETED'), 0, 0),
+        (ScanID('FIRST'), 1, 0),
+        (ScanID('SECOND'), 1, 0),
+    ])
+    get_scan_by_id = mocker.patch.object(schedulers.ScansRepository, 'get_scan_by_id', side_effect=[
+        schedulers.NoResultFound(),
+        mocker.Mock(id=ScanID('FIRST'), status=ScanStatus.AVAILABLE),
+        mocker.Mock(id=ScanID('SECOND'), status=ScanStatus.AVAILABLE),
+    ])
+    mocker.patch.object(schedulers.ScansRepository, 'is_scan_labeled_by_user', return_value=False)
+    task = mocker.Mock(id=TaskID(1))
+    user = mocker.Mock(id=1)
+    scheduler = CoverageScanScheduler(ttl=60)
+
+    first_scan = scheduler.get_next_scan(task, user, {ScanID('SECOND')})
+    scheduler.on_label_added(task.id, ScanID('FIRST'))
+    second_scan = scheduler.get_next_scan(task, user, set())
+
+    assert first_scan and first_scan.id == 'FIRST'
+    assert second_scan and second_scan.id == 'SECOND'
+    assert [call[0][0] for call in get_scan_by_id.call_args_list] == ['DELETED', 'FIRST', 'SECOND']
+    assert get_coverage.call_count == 1
+
+
+def test_coverage_scheduler_skips_scans_labeled_by_user_in_another_process(mocker: Any) -> None:
+    """Check if Scan labeled by the User is not returned even if it is missing from given labeled Scans."""
+    mocker.patch.object(schedulers.ScansRepository, 'get_available_scans_coverage', return_value=[
+        (ScanID('LABELED'), 0, 0),
+        (ScanID('NOT_LABELED'), 1, 0),
+    ])
+    mocker.patch.object(schedulers.ScansRepository, 'get_scan_by_id', side_effect=lambda scan_id: mocker.Mock(
+        id=scan_id, status=ScanStatus.AVAILABLE,
+    ))
+    is_scan_labeled_by_user = mocker.patch.object(schedulers.ScansRepository, 'is_scan_labeled_by_user',
+                                                  side_effect=lambda scan_id, user, task: scan_id == 'LABELED')
+    task = mocker.Mock(id=TaskID(1))
+    user = mocker.Mock(id=1)
+    scheduler = CoverageScanScheduler(ttl=60)
+
+    scan = scheduler.get_next_scan(task, user, set())
+
+    assert scan and scan.id == 'NOT_LABELED'
+    assert [call[0][0] for call in is_scan_labeled_by_user.call_args_list] == ['LABELED', 'NOT_LABELED']
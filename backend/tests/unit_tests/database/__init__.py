@@ -0,0 +1 @@
+"""Module responsible for all Unit Tests related to relational database."""
@@ -0,0 +1,31 @@
+"""Unit tests for medtagger/database/models.py."""
+from typing import Any
+
+from sqlalchemy.dialects import postgresql
+
+from medtagger.database import models
+from medtagger.definitions import SliceOrientation
+from medtagger.types import ScanID, SliceLocation
+
+
+def test_add_slices_with_bulk_inserts(mocker: Any) -> None:
+    """Check if new Slices are added with a single INSERT statement for each batch."""
+    mocker.patch.object(models, 'SLICES_INSERT_BATCH_SIZE', 2)
+    session = mocker.patch.object(models, 'db_transaction_session').return_value.__enter__.return_value
+    scan = models.Scan(models.Dataset('KIDNEYS', 'Kidneys'), declared_number_of_slices=3, user=None)
+    scan.id = ScanID('SCAN_ID')
+    locations = [SliceLocation(0.0), SliceLocation(50.0), SliceLocation(100.0)]
+
+    slices_ids = scan.add_slices(3, SliceOrientation.Y, locations=locations, size=(64, 128))
+
+    statements = [call[0][0].compile(dialect=postgresql.dialect()) for call in session.execute.call_args_list]
+    assert len(statements) == 2
+    assert all(str(statement).startswith('INSERT INTO "Slices"') for statement in statements)
+    assert statements[0].params['id_m0'] == slices_ids[0]
+    assert statements[0].params['id_m1'] == slices_ids[1]
+    assert statements[1].params['id_m0'] == slices_ids[2]
+    assert statements[1].params['location_m0'] == 100.0
+    assert all(statement.params['scan_id_m0'] == 'SCAN_ID' for statement in statements)
+    assert all(statement.params['orientation_m0'] == SliceOrientation.Y for statement in statements)
+    assert all(statement.params['height_m0'] == 64 and statement.params['width_m0'] == 128
+               for statement in statements)
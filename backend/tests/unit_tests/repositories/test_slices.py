@@ -0,0 +1,30 @@
+"""Unit tests for medtagger/repositories/slices.py."""
+from typing import Any, Iterator, List, Optional, Tuple
+
+from medtagger.definitions import SliceCodec
+from medtagger.repositories import slices as SlicesRepository
+from medtagger.types import SliceID
+
+
+def test_previews_are_returned_as_soon_as_they_arrive(mocker: Any) -> None:
+    """Check if previews are returned one by one and full images are fetched only for Slices without previews."""
+    fetched_previews: List[str] = []
+
+    def _iterate_previews(slices_ids: List[str], _resolution: int, **_: Any) -> Iterator[Optional[Tuple]]:
+        for slice_id in slices_ids:
+            fetched_previews.append(slice_id)
+            yield None if slice_id == 'WITHOUT_PREVIEW' else (slice_id.encode(), 'WEBP')
+
+    mocker.patch.object(SlicesRepository.previews, 'iterate_many', side_effect=_iterate_previews)
+    get_converted_image = mocker.patch.object(SlicesRepository, 'get_slice_converted_image_with_codec',
+                                              return_value=(b'FULL', SliceCodec.PNG))
+    slices_ids = [SliceID('FIRST'), SliceID('WITHOUT_PREVIEW'), SliceID('LAST')]
+
+    images = SlicesRepository.iterate_slices_converted_images_with_codec(slices_ids, resolution=128)
+    first_image = next(images)
+
+    assert first_image == (b'FIRST', SliceCodec.WEBP)
+    assert fetched_previews == ['FIRST']
+    assert not get_converted_image.called
+    assert list(images) == [(b'FULL', SliceCodec.PNG), (b'LAST', SliceCodec.WEBP)]
+    get_converted_image.assert_called_once_with('WITHOUT_PREVIEW')
@@ -0,0 +1,37 @@
+"""Unit tests for scripts/import_data.py."""
+from typing import Any
+
+from medtagger.types import ScanID
+from scripts import import_data as script
+
+
+def test_load_manifest_without_previous_import(tmpdir: Any) -> None:
+    """Check if import starts from scratch if there is no manifest file."""
+    imported_directories, partially_imported_scans = script.load_manifest(str(tmpdir.join('manifest.jsonl')))
+
+    assert imported_directories == set()
+    assert partially_imported_scans == {}
+
+
+def test_load_manifest_after_interrupted_import(tmpdir: Any) -> None:
+    """Check if manifest properly distinguishes fully and partially imported Scans."""
+    manifest_path = str(tmpdir.join('manifest.jsonl'))
+    script.append_to_manifest(manifest_path, 'scans/first', ScanID('FIRST'), finished=False)
+    script.append_to_manifest(manifest_path, 'scans/second', ScanID('SECOND'), finished=False)
+    script.append_to_manifest(manifest_path, 'scans/first', ScanID('FIRST'), finished=True)
+
+    imported_directories, partially_imported_scans = script.load_manifest(manifest_path)
+
+    assert imported_directories == {'scans/first'}
+    assert partially_imported_scans == {'scans/second': 'SECOND'}
+
+
+def test_get_directories_to_import(tmpdir: Any) -> None:
+    """Check if already imported directories and regular files are skipped."""
+    tmpdir.mkdir('first')
+    tmpdir.mkdir('second')
+    tmpdir.join('README.md').write('Not a Scan.')
+
+    directories = script.get_directories_to_import(str(tmpdir) + '/', {str(tmpdir.join('first'))})
+
+    assert directories == [str(tmpdir.join('second'))]
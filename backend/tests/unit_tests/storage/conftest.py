@@ -0,0 +1,51 @@
+"""Module for fixtures shared by Unit Tests related to Storage."""
+from typing import Any, Dict, Iterable, Iterator, Mapping, Optional, Sequence, Set, Tuple
+
+import pytest
+
+from medtagger.storage import blobs
+
+
+class FakeBlobs:
+    """Rows of all tables kept in memory (by table name) instead of the Storage."""
+
+    def __init__(self) -> None:
+        """Initialize empty tables."""
+        self.tables: Dict[str, Dict[str, Dict[str, Any]]] = {}
+
+    def iterate_many(self, model: Any, rows_ids: Iterable[str],
+                     columns: Sequence[str] = blobs.DEFAULT_COLUMNS) -> Iterator[Optional[Tuple]]:
+        """Fetch given columns for each of given rows."""
+        table = self.tables.get(model.__table_name__, {})
+        for row_id in rows_ids:
+            yield tuple(table[row_id][column] for column in columns) if row_id in table else None
+
+    def put_one(self, model: Any, row_id: str, values: Tuple, columns: Sequence[str] = blobs.DEFAULT_COLUMNS) -> None:
+        """Insert a single row."""
+        self.put_many(model, {row_id: values}, columns)
+
+    def put_many(self, model: Any, rows: Mapping[str, Tuple],
+                 columns: Sequence[str] = blobs.DEFAULT_COLUMNS) -> Set[str]:
+        """Insert all given rows."""
+        table = self.tables.setdefault(model.__table_name__, {})
+        for row_id, values in rows.items():
+            table[row_id] = dict(zip(columns, values))
+        return set()
+
+    def delete_many(self, model: Any, rows_ids: Iterable[str]) -> None:
+        """Delete all given rows."""
+        for row_id in rows_ids:
+            self.tables.get(model.__table_name__, {}).pop(row_id, None)
+
+    def delete_one(self, model: Any, row_id: str) -> None:
+        """Delete a single row."""
+        self.delete_many(model, [row_id])
+
+
+@pytest.fixture
+def fake_blobs(mocker: Any) -> FakeBlobs:
+    """Return in-memory tables used instead of the Storage."""
+    _fake_blobs = FakeBlobs()
+    for function in ('iterate_many', 'put_one', 'put_many', 'delete_many', 'delete_one'):
+        mocker.patch.object(blobs, function, side_effect=getattr(_fake_blobs, function))
+    return _fake_blobs
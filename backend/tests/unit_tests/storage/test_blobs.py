@@ -0,0 +1,103 @@
+"""Unit tests for medtagger/storage/blobs.py."""
+from typing import Any, Dict, Optional, Tuple
+
+import pytest
+
+from medtagger.storage import blobs
+from medtagger.storage.models import OriginalSlice, ProcessedSlice
+
+
+class _FakeResponse:
+    """Response for a single asynchronous query that counts how many queries are in flight."""
+
+    def __init__(self, session: '_FakeSession', row: Optional[Dict[str, Any]]) -> None:
+        self.session = session
+        self.row = row
+
+    def result(self) -> '_FakeResponse':
+        """Wait for the response."""
+        self.session.requests_in_flight -= 1
+        return self
+
+    def one(self) -> Optional[Dict[str, Any]]:
+        """Return a single row from the response."""
+        return self.row
+
+
+class _FakeSession:  # pylint: disable=too-few-public-methods
+    """Session with rows kept in memory."""
+
+    def __init__(self, rows: Dict[str, Dict[str, Any]]) -> None:
+        self.rows = rows
+        self.requests_in_flight = 0
+        self.max_requests_in_flight = 0
+
+    def execute_async(self, statement: str, parameters: Tuple) -> _FakeResponse:
+        """Execute query asynchronously."""
+        assert statement.startswith('SELECT')
+        self.requests_in_flight += 1
+        self.max_requests_in_flight = max(self.max_requests_in_flight, self.requests_in_flight)
+        return _FakeResponse(self, self.rows.get(parameters[0]))
+
+
+@pytest.fixture
+def session(mocker: Any) -> _FakeSession:
+    """Return fake Session with processed Slices, which is used by Storage."""
+    fake_session = _FakeSession({
+        'SLICE_{}'.format(index): {'image': 'IMAGE_{}'.format(index).encode(), 'codec': 'PNG'} for index in range(10)
+    })
+    mocker.patch.object(blobs.connection, 'get_session', return_value=fake_session)
+    mocker.patch.object(blobs.storage, 'get_prepared_statement', side_effect=lambda query: query)
+    mocker.patch.object(blobs.storage, 'max_concurrent_requests', 3)
+    return fake_session
+
+
+def test_iterate_many_with_bounded_number_of_requests_in_flight(session: _FakeSession) -> None:
+    """Check if rows are returned in order of IDs while only a few requests are in flight."""
+    rows_ids = ['SLICE_{}'.format(index) for index in (7, 2, 9, 0, 4, 1)] + ['MISSING']
+
+    rows = list(blobs.iterate_many(ProcessedSlice, rows_ids, columns=('image', 'codec')))
+
+    assert rows[:3] == [(b'IMAGE_7', 'PNG'), (b'IMAGE_2', 'PNG'), (b'IMAGE_9', 'PNG')]
+    assert len(rows) == 7
+    assert rows[-1] is None
+    assert session.max_requests_in_flight == 3
+
+
+def test_get_many_skips_missing_rows(session: _FakeSession) -> None:  # pylint: disable=unused-argument
+    """Check if rows that do not exist are skipped."""
+    rows = blobs.get_many(OriginalSlice, ['SLICE_1', 'MISSING', 'SLICE_3'])
+
+    assert rows == {'SLICE_1': (b'IMAGE_1',), 'SLICE_3': (b'IMAGE_3',)}
+
+
+def test_get_one_for_missing_row(session: _FakeSession) -> None:  # pylint: disable=unused-argument
+    """Check if missing row is reported the same way as in cqlengine."""
+    with pytest.raises(OriginalSlice.DoesNotExist):
+        blobs.get_one(OriginalSlice, 'MISSING')
+
+
+def test_put_many_returns_rows_that_could_not_be_inserted(mocker: Any) -> None:
+    """Check if rows are inserted with a prepared statement and failed inserts are reported."""
+    mocker.patch.object(blobs.connection, 'get_session')
+    mocker.patch.object(blobs.storage, 'get_prepared_statement', side_effect=lambda query: query)
+    execute_concurrent = mocker.patch.object(blobs, 'execute_concurrent_with_args',
+                                             return_value=[(True, None), (False, Exception('Timeout'))])
+    rows = {'SLICE_0': (b'IMAGE_0', 'PNG'), 'SLICE_1': (b'IMAGE_1', 'PNG')}
+
+    failed_rows_ids = blobs.put_many(ProcessedSlice, rows, columns=('image', 'codec'))
+
+    statement, parameters = execute_concurrent.call_args[0][1:]
+    assert statement == 'INSERT INTO medtagger.processed_slices (id, image, codec) VALUES (?, ?, ?)'
+    assert parameters == [('SLICE_0', b'IMAGE_0', 'PNG'), ('SLICE_1', b'IMAGE_1', 'PNG')]
+    assert failed_rows_ids == {'SLICE_1'}
+
+
+def test_delete_one_with_prepared_statement(mocker: Any) -> None:
+    """Check if row is removed with a prepared statement (without fetching it at first)."""
+    session = mocker.patch.object(blobs.connection, 'get_session').return_value
+    mocker.patch.object(blobs.storage, 'get_prepared_statement', side_effect=lambda query: query)
+
+    blobs.delete_one(OriginalSlice, 'SLICE_1')
+
+    session.execute.assert_called_once_with('DELETE FROM medtagger.original_slices WHERE id = ?', ('SLICE_1',))
@@ -0,0 +1,51 @@
+"""Unit tests for medtagger/storage/chunks.py."""
+from typing import Any
+
+import pytest
+
+from medtagger.storage import chunks
+from medtagger.storage.models import ProcessedSlice, ProcessedSliceChunk
+from tests.unit_tests.storage.conftest import FakeBlobs
+
+
+@pytest.fixture(autouse=True)
+def small_chunk_size(mocker: Any) -> None:
+    """Split images into chunks of 4 bytes."""
+    mocker.patch.object(chunks.storage, 'chunk_size', 4)
+
+
+def test_put_many_and_get_many_with_chunks(fake_blobs: FakeBlobs) -> None:
+    """Check if only images bigger than chunk size are split into chunks and are joined back on read."""
+    rows = {'SMALL': (b'1234', 'PNG'), 'BIG': (b'0123456789', 'WEBP')}
+
+    failed_rows_ids = chunks.put_many(ProcessedSlice, rows, columns=('image', 'codec'))
+
+    assert not failed_rows_ids
+    assert fake_blobs.tables[ProcessedSlice.__table_name__]['SMALL'] == {'image': b'1234', 'codec': 'PNG',
+                                                                         'chunks': 0}
+    assert fake_blobs.tables[ProcessedSlice.__table_name__]['BIG'] == {'image': b'', 'codec': 'WEBP', 'chunks': 3}
+    assert fake_blobs.tables[ProcessedSliceChunk.__table_name__] == {
+        'BIG:0': {'image': b'0123'},
+        'BIG:1': {'image': b'4567'},
+        'BIG:2': {'image': b'89'},
+    }
+    assert chunks.get_many(ProcessedSlice, ['BIG', 'MISSING', 'SMALL'], columns=('image', 'codec')) == rows
+
+
+def test_get_one_when_chunk_is_missing(fake_blobs: FakeBlobs) -> None:
+    """Check if partially stored image is reported as missing instead of being returned truncated."""
+    chunks.put_many(ProcessedSlice, {'BIG': (b'0123456789',)})
+    del fake_blobs.tables[ProcessedSliceChunk.__table_name__]['BIG:1']
+
+    with pytest.raises(ProcessedSlice.DoesNotExist):
+        chunks.get_one(ProcessedSlice, 'BIG')
+
+
+def test_delete_one_removes_chunks(fake_blobs: FakeBlobs) -> None:
+    """Check if deleting a row removes all chunks of its image."""
+    chunks.put_many(ProcessedSlice, {'BIG': (b'0123456789',), 'OTHER': (b'abcdefgh',)})
+
+    chunks.delete_one(ProcessedSlice, 'BIG')
+
+    assert list(fake_blobs.tables[ProcessedSlice.__table_name__]) == ['OTHER']
+    assert list(fake_blobs.tables[ProcessedSliceChunk.__table_name__]) == ['OTHER:0', 'OTHER:1']
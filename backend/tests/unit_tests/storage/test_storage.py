@@ -0,0 +1,75 @@
+"""Unit tests for medtagger/storage/__init__.py."""
+from typing import Any
+
+import pytest
+from cassandra.policies import DCAwareRoundRobinPolicy, HostDistance, RoundRobinPolicy, TokenAwarePolicy
+
+from medtagger import storage
+
+
+@pytest.mark.parametrize('local_datacenter, child_policy_class', [
+    ('', RoundRobinPolicy),
+    ('DC1', DCAwareRoundRobinPolicy),
+])
+def test_get_cluster_options_with_token_aware_policy(mocker: Any, local_datacenter: str,
+                                                     child_policy_class: type) -> None:
+    """Check if queries are always routed with token aware policy."""
+    mocker.patch.object(storage, 'local_datacenter', local_datacenter)
+    mocker.patch.object(storage, 'protocol_version', 4)
+    mocker.patch.object(storage, 'compression', 'none')
+
+    options = storage._get_cluster_options(use_gevent=False)  # pylint: disable=protected-access
+
+    assert isinstance(options['load_balancing_policy'], TokenAwarePolicy)
+    assert isinstance(options['load_balancing_policy']._child_policy,  # pylint: disable=protected-access
+                      child_policy_class)
+    assert options['protocol_version'] == 4
+    assert options['compression'] is False
+
+
+def test_get_cluster_options_with_unknown_compression(mocker: Any) -> None:
+    """Check if misconfigured compression is reported."""
+    mocker.patch.object(storage, 'compression', 'gzip')
+
+    with pytest.raises(ValueError):
+        storage._get_cluster_options(use_gevent=False)  # pylint: disable=protected-access
+
+
+@pytest.mark.parametrize('protocol_version, is_configured', [(2, True), (4, False)])
+def test_configure_connections_per_host(mocker: Any, protocol_version: int, is_configured: bool) -> None:
+    """Check if connections per host are set only for protocol versions which support them."""
+    mocker.patch.object(storage, 'core_connections_per_host', 2)
+    mocker.patch.object(storage, 'max_connections_per_host', 8)
+    cluster = mocker.Mock(protocol_version=protocol_version)
+
+    storage._configure_connections_per_host(cluster)  # pylint: disable=protected-access
+
+    assert cluster.set_core_connections_per_host.called == is_configured
+    if is_configured:
+        cluster.set_core_connections_per_host.assert_called_once_with(HostDistance.LOCAL, 2)
+        cluster.set_max_connections_per_host.assert_called_once_with(HostDistance.LOCAL, 8)
+
+
+def test_log_pool_state(mocker: Any) -> None:
+    """Check if open connections and requests in flight are logged for each host."""
+    logger = mocker.patch.object(storage, 'logger')
+    session = mocker.Mock()
+    session.get_pool_state.return_value = {'10.0.0.1': {'shutdown': False, 'open_count': 2, 'in_flights': [3, 5]}}
+
+    storage.log_pool_state(session)
+
+    assert logger.info.call_args[0][1:] == ('10.0.0.1', 2, 8, 5, storage.max_concurrent_requests)
+
+
+def test_is_alive_without_connection(mocker: Any) -> None:
+    """Check if health check creates its own Session (only once) if connection was not created (e.g. in scripts)."""
+    mocker.patch.object(storage.connection, 'get_session', side_effect=storage.CQLEngineException)
+    mocker.patch.object(storage, '_health_check_session', None)
+    session = mocker.Mock()
+    create_session = mocker.patch.object(storage, 'create_session', side_effect=[ConnectionError, session])
+
+    assert not storage.is_alive()
+    assert storage.is_alive()
+    assert storage.is_alive()
+    assert create_session.call_count == 2
+    assert session.execute.call_count == 2
@@ -0,0 +1,49 @@
+"""Unit tests for medtagger/storage/volumes.py."""
+from typing import Any
+
+import pytest
+
+from medtagger.storage import volumes
+from medtagger.storage.models import ScanVolume, ScanVolumeChunk
+from tests.unit_tests.storage.conftest import FakeBlobs
+
+
+@pytest.fixture(autouse=True)
+def small_volume_chunks(mocker: Any) -> None:
+    """Split packed volumes into chunks of 4 bytes, stored in batches of 2 chunks."""
+    mocker.patch.object(volumes, 'VOLUME_CHUNK_SIZE', 4)
+    mocker.patch.object(volumes.storage, 'max_concurrent_requests', 2)
+
+
+def test_put_one_splits_stream_into_chunks(fake_blobs: FakeBlobs) -> None:
+    """Check if parts of any size are regrouped into chunks of fixed size."""
+    failed_chunks_ids = volumes.put_one('SCAN', [b'0', b'123456', b'', b'789'])
+
+    assert not failed_chunks_ids
+    assert fake_blobs.tables[ScanVolume.__table_name__] == {'SCAN': {'size': 10, 'chunk_size': 4}}
+    assert fake_blobs.tables[ScanVolumeChunk.__table_name__] == {
+        'SCAN:0': {'image': b'0123'},
+        'SCAN:1': {'image': b'4567'},
+        'SCAN:2': {'image': b'89'},
+    }
+
+
+@pytest.mark.parametrize('start, stop', [(0, 10), (0, 4), (3, 5), (5, 6), (4, 8), (9, 10)])
+def test_iterate_range(fake_blobs: FakeBlobs, start: int, stop: int) -> None:
+    """Check if any range of bytes is read back from chunks which overlap with it."""
+    volumes.put_one('SCAN', [b'0123456789'])
+    info = volumes.get_info('SCAN')
+
+    assert info == volumes.VolumeInfo(size=10, chunk_size=4)
+    assert b''.join(volumes.iterate_range('SCAN', info, start, stop)) == b'0123456789'[start:stop]
+    assert len(list(volumes.iterate_range('SCAN', info, start, stop))) == (stop - 1) // 4 - start // 4 + 1
+
+
+def test_volume_is_not_visible_if_chunks_could_not_be_stored(fake_blobs: FakeBlobs, mocker: Any) -> None:
+    """Check if row of packed volume is not stored if any of its chunks could not be inserted."""
+    mocker.patch.object(volumes.blobs, 'put_many', return_value={'SCAN:0'})
+
+    failed_chunks_ids = volumes.put_one('SCAN', [b'0123456789'])
+
+    assert failed_chunks_ids == {'SCAN:0'}
+    assert ScanVolume.__table_name__ not in fake_blobs.tables
@@ -0,0 +1,66 @@
+"""Unit tests for medtagger/cache.py."""
+from typing import Any
+
+from medtagger import cache
+from medtagger.cache import LRUCache
+
+
+def test_lru_cache_loads_expired_entries_again(mocker: Any) -> None:
+    """Check if value is loaded again only after cached entry has expired."""
+    monotonic = mocker.patch.object(cache.time, 'monotonic', return_value=100.0)
+    load = mocker.Mock(side_effect=[['SLICE_1'], ['SLICE_1', 'SLICE_2']])
+    lru_cache: LRUCache[str, Any] = LRUCache(max_size=2, ttl=60)
+
+    first_value = lru_cache.get_or_load('SCAN', load)
+    monotonic.return_value = 159.0
+    second_value = lru_cache.get_or_load('SCAN', load)
+    monotonic.return_value = 160.0
+    third_value = lru_cache.get_or_load('SCAN', load)
+
+    assert load.call_count == 2
+    assert first_value is second_value
+    assert third_value == ['SLICE_1', 'SLICE_2']
+
+
+def test_lru_cache_evicts_least_recently_used_entries() -> None:
+    """Check if only a limited number of the most recently used entries is kept."""
+    lru_cache: LRUCache[str, str] = LRUCache(max_size=2, ttl=60)
+    lru_cache.get_or_load('SCAN_1', lambda: 'FIRST')
+    lru_cache.get_or_load('SCAN_2', lambda: 'SECOND')
+    lru_cache.get_or_load('SCAN_1', lambda: 'NOT LOADED')
+    lru_cache.get_or_load('SCAN_3', lambda: 'THIRD')
+
+    assert lru_cache.get_or_load('SCAN_1', lambda: 'NOT LOADED') == 'FIRST'
+    assert lru_cache.get_or_load('SCAN_2', lambda: 'LOADED AGAIN') == 'LOADED AGAIN'
+
+
+def test_lru_cache_invalidation() -> None:
+    """Check if invalidated entries are loaded again and values loaded during invalidation are not cached."""
+    lru_cache: LRUCache[str, str] = LRUCache(max_size=2, ttl=60)
+    lru_cache.get_or_load('SCAN', lambda: 'OLD')
+    lru_cache.invalidate('SCAN')
+
+    def _load_with_concurrent_invalidation() -> str:
+        lru_cache.invalidate('OTHER_SCAN')
+        return 'LOADED BEFORE CHANGE'
+
+    assert lru_cache.get_or_load('SCAN', _load_with_concurrent_invalidation) == 'LOADED BEFORE CHANGE'
+    assert lru_cache.get_or_load('SCAN', lambda: 'NEW') == 'NEW'
+    assert lru_cache.get_or_load('SCAN', lambda: 'NOT LOADED') == 'NEW'
+
+
+def test_lru_cache_updates_only_cached_entries() -> None:
+    """Check if update changes cached values only and values loaded during update are not cached."""
+    lru_cache: LRUCache[str, frozenset] = LRUCache(max_size=2, ttl=60)
+    lru_cache.put('USER', frozenset({'SCAN_1'}))
+    lru_cache.update('USER', lambda scans: scans | {'SCAN_2'})
+    lru_cache.update('OTHER_USER', lambda scans: scans | {'SCAN_2'})
+
+    def _load_with_concurrent_update() -> frozenset:
+        lru_cache.update('USER', lambda scans: scans | {'SCAN_3'})
+        return frozenset()
+
+    assert lru_cache.items() == [('USER', frozenset({'SCAN_1', 'SCAN_2'}))]
+    assert lru_cache.get_or_load('OTHER_USER', _load_with_concurrent_update) == frozenset()
+    assert lru_cache.get_or_load('OTHER_USER', lambda: frozenset({'SCAN_4'})) == frozenset({'SCAN_4'})
+    assert lru_cache.get_or_load('USER', frozenset) == frozenset({'SCAN_1', 'SCAN_2', 'SCAN_3'})
@@ -0,0 +1,62 @@
+"""Unit tests for medtagger/codecs.py."""
+import numpy as np
+import pytest
+
+from medtagger.codecs import encode_slice, decode_slice, encode_volume, decode_volume, encode_slices_batch, \
+    decode_slices_batch
+from medtagger.definitions import SliceCodec
+
+
+@pytest.mark.parametrize('codec', list(SliceCodec))
+@pytest.mark.parametrize('compression_level', [None, 0, 100])
+def test_encode_and_decode_slice(codec: SliceCodec, compression_level: int) -> None:
+    """Check if all codecs are lossless for any compression level."""
+    slice_pixels = np.arange(64 * 48, dtype=np.uint32).reshape(64, 48).astype(np.uint8)
+
+    image = encode_slice(slice_pixels, codec, compression_level)
+    decoded_slice_pixels = decode_slice(image, codec, shape=(64, 48))
+
+    assert decoded_slice_pixels.dtype == np.uint8
+    assert np.array_equal(decoded_slice_pixels, slice_pixels)
+
+
+def test_encode_slice_as_png_by_default() -> None:
+    """Check if Slices are encoded as PNG if codec was not chosen."""
+    image = encode_slice(np.zeros((4, 4), dtype=np.uint8))
+
+    assert image.startswith(b'\x89PNG\r\n\x1a\n')
+
+
+def test_encode_slice_with_compression_level() -> None:
+    """Check if higher compression level produces smaller raw images."""
+    slice_pixels = np.tile(np.arange(256, dtype=np.uint8), (64, 1))
+
+    uncompressed_image = encode_slice(slice_pixels, SliceCodec.RAW_ZLIB, compression_level=0)
+    compressed_image = encode_slice(slice_pixels, SliceCodec.RAW_ZLIB, compression_level=9)
+
+    assert len(compressed_image) < len(uncompressed_image)
+
+
+def test_encode_and_decode_volume() -> None:
+    """Check if packed volume keeps its header and pixels of all Slices."""
+    slices_pixels = np.arange(3 * 4 * 5, dtype=np.uint8).reshape(3, 4, 5)
+    header = {'shape': [3, 4, 5], 'slices_ids': ['SLICE_0', 'SLICE_1', 'SLICE_2']}
+
+    volume = b''.join(encode_volume(header, iter(slices_pixels)))
+    decoded_header, decoded_slices_pixels = decode_volume(volume)
+
+    assert decoded_header == header
+    assert np.array_equal(decoded_slices_pixels, slices_pixels)
+
+
+def test_encode_and_decode_slices_batch() -> None:
+    """Check if batch of Slices keeps its header and all images in order."""
+    slices = [(5, b'FIFTH', SliceCodec.PNG), (4, b'', SliceCodec.WEBP), (3, b'THIRD', SliceCodec.RAW_ZLIB)]
+
+    batch = encode_slices_batch({'scan_id': 'SCAN'}, iter(slices))
+    header, decoded_slices = decode_slices_batch(batch)
+
+    assert header['scan_id'] == 'SCAN'
+    assert header['indices'] == [5, 4, 3]
+    assert header['offsets'] == [0, 5, 5]
+    assert decoded_slices == slices
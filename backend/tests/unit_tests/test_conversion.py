@@ -0,0 +1,154 @@
+"""Unit tests for medtagger/conversion.py."""
+import glob
+from typing import Any
+
+import numpy as np
+import pytest
+import SimpleITK as sitk
+
+from medtagger.conversion import convert_dicoms_to_volume, convert_volume_to_normalized_8bit_array, \
+    normalize_volume_slices, get_reformatted_shape, reformat_volume, split_into_tiles, \
+    downscale_slice
+from medtagger.definitions import SliceOrientation
+from medtagger.types import TilePosition
+
+
+def test_convert_dicoms_to_volume() -> None:
+    """Check if pixels from all Dicom images are read into a single int16 volume."""
+    file_names = sorted(glob.glob('tests/assets/example_scan/*.dcm'))
+    dicom_images = []
+    for file_name in file_names:
+        with open(file_name, 'rb') as dicom_file:
+            dicom_images.append(dicom_file.read())
+
+    volume = convert_dicoms_to_volume(iter(dicom_images), len(dicom_images))
+
+    assert volume.dtype == np.int16
+    assert volume.shape == (3, 512, 512)
+    for slice_pixels, file_name in zip(volume, file_names):
+        assert np.array_equal(slice_pixels, sitk.GetArrayFromImage(sitk.ReadImage(file_name))[0])
+
+
+@pytest.mark.parametrize('on_disk', [False, True])
+def test_convert_dicoms_to_volume_with_float_pixels(mocker: Any, tmpdir: Any, on_disk: bool) -> None:
+    """Check if volume switches to float32 once any Slice cannot be represented with integers."""
+    slices_pixels = [np.full((2, 2), 7, dtype=np.int16), np.full((2, 2), 0.5, dtype=np.float32)]
+    mocker.patch('medtagger.conversion.read_dicom_pixels', side_effect=slices_pixels)
+
+    volume = convert_dicoms_to_volume([b'first', b'second'], 2, directory=str(tmpdir) if on_disk else None)
+
+    assert volume.dtype == np.float32
+    assert isinstance(volume, np.memmap) == on_disk
+    assert np.array_equal(volume, np.stack(slices_pixels))
+
+
+def test_convert_dicoms_to_volume_on_disk(mocker: Any, tmpdir: Any) -> None:
+    """Check if volume can be stored in a temporary file that does not outlive the volume."""
+    mocker.patch('medtagger.conversion.read_dicom_pixels', side_effect=lambda _: np.ones((4, 4), dtype=np.int16))
+
+    volume = convert_dicoms_to_volume([b'first', b'second', b'third'], 3, directory=str(tmpdir))
+
+    assert isinstance(volume, np.memmap)
+    assert volume.shape == (3, 4, 4)
+    assert volume.all()
+    assert not tmpdir.listdir()  # Temporary file was removed right away and exists only as long as the volume
+
+
+def test_convert_volume_to_normalized_8bit_array() -> None:
+    """Check if all Slices are normalized with the same intensity scaling and values below Air are clipped."""
+    volume = np.array([
+        [[-2000, -1000], [-1000, -1000]],
+        [[0, 20], [40, 60]],
+    ], dtype=np.int16)
+
+    normalized_volume = convert_volume_to_normalized_8bit_array(volume)
+
+    assert normalized_volume.dtype == np.uint8
+    assert np.array_equal(normalized_volume, np.array([
+        [[0, 0], [0, 0]],
+        [[240, 245], [250, 255]],
+    ], dtype=np.uint8))
+
+
+def test_normalize_volume_slices_lazily() -> None:
+    """Check if Slices are normalized one by one with a window for the whole volume."""
+    volume = np.array([[[0, 100]], [[200, 255]]], dtype=np.int16)
+
+    normalized_slices = normalize_volume_slices(volume)
+
+    assert np.array_equal(next(normalized_slices), np.array([[0, 100]], dtype=np.uint8))
+    assert np.array_equal(next(normalized_slices), np.array([[200, 255]], dtype=np.uint8))
+    assert next(normalized_slices, None) is None
+
+
+def test_convert_volume_to_normalized_8bit_array_for_constant_volume() -> None:
+    """Check if volume with the same value in all pixels does not break normalization."""
+    volume = np.full((2, 3, 3), 100, dtype=np.int16)
+
+    normalized_volume = convert_volume_to_normalized_8bit_array(volume)
+
+    assert not normalized_volume.any()
+
+
+@pytest.mark.parametrize('orientation, expected_shape', [
+    (SliceOrientation.Y, (128, 150, 256)),
+    (SliceOrientation.X, (256, 150, 128)),
+])
+def test_get_reformatted_shape(orientation: SliceOrientation, expected_shape: Any) -> None:
+    """Check if reformatted Slices keep real proportions of the Scan and fit maximum size."""
+    shape = get_reformatted_shape((100, 256, 512), orientation, thickness=3.0, spacing=1.0, max_size=256)
+
+    assert shape == expected_shape
+
+
+def test_reformat_volume_interpolates_only_along_thickness_axis(mocker: Any) -> None:
+    """Check if reformatted Slices are interpolated linearly between Slices from top to the bottom of the Scan."""
+    mocker.patch('medtagger.conversion.REFORMAT_CHUNK_SIZE', 2)
+    normalized_volume = np.zeros((2, 3, 5), dtype=np.uint8)
+    normalized_volume[0] = 200  # The lowest Slice
+    normalized_volume[1, :, 1] = 100  # Slice at the top
+
+    y_slices = list(reformat_volume(normalized_volume, SliceOrientation.Y, thickness=3.0, spacing=1.0))
+    x_slices = list(reformat_volume(normalized_volume, SliceOrientation.X, thickness=3.0, spacing=1.0))
+
+    assert len(y_slices) == 3
+    assert all(np.array_equal(y_slice, y_slices[0]) for y_slice in y_slices)
+    assert np.array_equal(y_slices[0][:, 0], [0, 40, 80, 120, 160, 200])
+    assert np.array_equal(y_slices[0][:, 1], [100, 120, 140, 160, 180, 200])
+    assert len(x_slices) == 5
+    assert all(x_slice.shape == (6, 3) for x_slice in x_slices)
+    assert np.array_equal(x_slices[1][:, 0], y_slices[0][:, 1])
+
+
+def test_reformat_volume_with_maximum_size() -> None:
+    """Check if volume is subsampled to fit maximum size."""
+    normalized_volume = np.arange(4 * 8 * 6, dtype=np.uint8).reshape(4, 8, 6)
+
+    y_slices = list(reformat_volume(normalized_volume, SliceOrientation.Y, thickness=1.0, spacing=1.0, max_size=4))
+
+    assert len(y_slices) == 4
+    assert y_slices[0].shape == (2, 3)
+    assert np.array_equal(y_slices[1], normalized_volume[::-3, 2, ::2])
+
+
+def test_split_into_tiles() -> None:
+    """Check if Slice is split into tiles in row-major order with smaller tiles at the edges."""
+    slice_pixels = np.arange(5 * 7, dtype=np.uint8).reshape(5, 7)
+
+    tiles = dict(split_into_tiles(slice_pixels, tile_size=4))
+
+    assert list(tiles) == [TilePosition(0, 0), TilePosition(0, 1), TilePosition(1, 0), TilePosition(1, 1)]
+    assert tiles[TilePosition(0, 1)].shape == (4, 3)
+    assert tiles[TilePosition(1, 0)].shape == (1, 4)
+    assert np.array_equal(np.block([[tiles[TilePosition(0, 0)], tiles[TilePosition(0, 1)]],
+                                    [tiles[TilePosition(1, 0)], tiles[TilePosition(1, 1)]]]), slice_pixels)
+
+
+def test_downscale_slice() -> None:
+    """Check if Slice is downscaled with averaging and keeps its proportions."""
+    slice_pixels = np.kron(np.array([[0, 100], [200, 50]], dtype=np.uint8), np.ones((4, 2), dtype=np.uint8))
+
+    preview = downscale_slice(slice_pixels, max_size=2)
+
+    assert np.array_equal(preview, np.array([[50], [125]], dtype=np.uint8))
+    assert downscale_slice(slice_pixels, max_size=8) is slice_pixels
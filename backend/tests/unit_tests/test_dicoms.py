@@ -0,0 +1,111 @@
+"""Unit tests for medtagger/dicoms.py."""
+import glob
+import struct
+
+import numpy as np
+import pytest
+import SimpleITK as sitk
+
+from medtagger.definitions import DicomTag
+from medtagger.dicoms import read_dicom_header, read_dicom_pixels, read_float, read_int, read_list
+from medtagger.exceptions import InvalidDicomException
+
+
+def _implicit_vr_element(group: int, element: int, value: bytes) -> bytes:
+    """Encode single Data Element with Implicit VR Little Endian."""
+    return struct.pack('<HHI', group, element, len(value)) + value
+
+
+def test_read_dicom_header_the_same_way_as_simpleitk() -> None:
+    """Check if DICOM header parsed in memory returns the same values as SimpleITK's reader."""
+    for file_name in glob.glob('tests/assets/example_scan/*.dcm'):
+        reader = sitk.ImageFileReader()
+        reader.SetFileName(file_name)
+        reader.ReadImageInformation()
+        with open(file_name, 'rb') as dicom_file:
+            header = read_dicom_header(dicom_file.read())
+
+        for tag in DicomTag:
+            assert header.HasMetaDataKey(tag.value) == reader.HasMetaDataKey(tag.value)
+            if reader.HasMetaDataKey(tag.value):
+                assert header.GetMetaData(tag.value) == reader.GetMetaData(tag.value)
+
+
+def test_read_dicom_header_with_implicit_vr_and_without_preamble() -> None:
+    """Check if DICOM header without preamble and encoded with Implicit VR can be read."""
+    data = b''.join([
+        _implicit_vr_element(0x0008, 0x0060, b'CT'),
+        _implicit_vr_element(0x0009, 0x0010, b'\xff' * 6),  # Private Tag that should be skipped
+        _implicit_vr_element(0x0020, 0x0032, b'1.5\\-2\\3.25'),
+        _implicit_vr_element(0x0028, 0x0010, struct.pack('<H', 64)),
+        _implicit_vr_element(0x0028, 0x0011, struct.pack('<H', 32)),
+        _implicit_vr_element(0x7FE0, 0x0010, b'\x00\x01' * 16),
+    ])
+
+    header = read_dicom_header(data)
+
+    assert read_list(header, DicomTag.IMAGE_POSITION_PATIENT) == ['1.5', '-2', '3.25']
+    assert read_int(header, DicomTag.ROWS) == 64
+    assert read_int(header, DicomTag.COLUMNS) == 32
+    assert read_float(header, DicomTag.SLICE_LOCATION) is None
+
+
+def test_read_dicom_header_stops_before_pixel_data() -> None:
+    """Check if parser does not touch any bytes after the last requested Tag."""
+    with open('tests/assets/example_scan/slice_1.dcm', 'rb') as dicom_file:
+        data = dicom_file.read()
+
+    # Corrupt whole file right after Rows & Columns, so parser would fail if it reached Pixel Data
+    columns_offset = data.index(b'\x28\x00\x11\x00US')
+    corrupted_data = data[:columns_offset + 10] + b'\xff' * (len(data) - columns_offset - 10)
+    header = read_dicom_header(corrupted_data, tags=[DicomTag.ROWS, DicomTag.COLUMNS])
+
+    assert read_int(header, DicomTag.ROWS) == 512
+    assert read_int(header, DicomTag.COLUMNS) == 512
+    assert not header.HasMetaDataKey(DicomTag.PIXEL_SPACING.value)
+
+
+@pytest.mark.parametrize('data', [b'', b'\x89PNG\r\n\x1a\n' + b'\x00' * 64, b'\x00' * 128 + b'DICM' + b'\x02\x00'])
+def test_read_dicom_header_for_invalid_file(data: bytes) -> None:
+    """Check if parser raises an exception for files that are not DICOMs."""
+    with pytest.raises(InvalidDicomException):
+        read_dicom_header(data)
+
+
+def test_read_dicom_pixels_the_same_way_as_simpleitk() -> None:
+    """Check if pixels read in memory are the same as pixels decoded by SimpleITK."""
+    for file_name in glob.glob('tests/assets/example_scan/*.dcm'):
+        with open(file_name, 'rb') as dicom_file:
+            pixels = read_dicom_pixels(dicom_file.read())
+
+        assert pixels.dtype == np.int16
+        assert np.array_equal(pixels, sitk.GetArrayFromImage(sitk.ReadImage(file_name))[0])
+
+
+def test_read_dicom_pixels_with_non_integral_rescale() -> None:
+    """Check if pixels with non-integral Rescale Slope are returned as floats."""
+    data = b''.join([
+        _implicit_vr_element(0x0008, 0x0060, b'PT'),
+        _implicit_vr_element(0x0028, 0x0002, struct.pack('<H', 1)),
+        _implicit_vr_element(0x0028, 0x0010, struct.pack('<H', 2)),
+        _implicit_vr_element(0x0028, 0x0011, struct.pack('<H', 2)),
+        _implicit_vr_element(0x0028, 0x0100, struct.pack('<H', 16)),
+        _implicit_vr_element(0x0028, 0x0103, struct.pack('<H', 0)),
+        _implicit_vr_element(0x0028, 0x1052, b'-1'),
+        _implicit_vr_element(0x0028, 0x1053, b'0.5 '),
+        _implicit_vr_element(0x7FE0, 0x0010, struct.pack('<4H', 0, 1, 2, 65535)),
+    ])
+
+    pixels = read_dicom_pixels(data)
+
+    assert pixels.dtype == np.float32
+    assert np.array_equal(pixels, np.array([[-1.0, -0.5], [0.0, 32766.5]], dtype=np.float32))
+
+
+def test_read_dicom_pixels_for_truncated_pixel_data() -> None:
+    """Check if parser raises an exception if Pixel Data is shorter than expected."""
+    with open('tests/assets/example_scan/slice_1.dcm', 'rb') as dicom_file:
+        data = dicom_file.read()
+
+    with pytest.raises(InvalidDicomException):
+        read_dicom_pixels(data[:-1024])
@@ -0,0 +1,34 @@
+"""Unit tests for medtagger/health.py."""
+from typing import Any
+
+from medtagger import health
+from medtagger.health import HealthCheck, get_latency_percentiles
+
+
+def test_health_check_caches_result(mocker: Any) -> None:
+    """Check if service is checked again only after cached result has expired."""
+    monotonic = mocker.patch.object(health.time, 'monotonic', return_value=100.0)
+    probe = mocker.Mock(return_value=True)
+    health_check = HealthCheck('storage', probe, ttl=5)
+
+    first_status = health_check.get_status()
+    monotonic.return_value = 104.0
+    second_status = health_check.get_status()
+    monotonic.return_value = 105.0
+    probe.return_value = False
+    third_status = health_check.get_status()
+
+    assert probe.call_count == 2
+    assert first_status is second_status
+    assert first_status['alive']
+    assert not third_status['alive']
+    assert set(third_status['latency']) == {'p50', 'p90', 'p99'}
+
+
+def test_get_latency_percentiles() -> None:
+    """Check if percentiles are computed over all given latencies."""
+    percentiles = get_latency_percentiles(range(1, 101))
+
+    assert percentiles['p50'] == 50.5
+    assert round(percentiles['p90'], 2) == 90.1
+    assert round(percentiles['p99'], 2) == 99.01
@@ -0,0 +1,136 @@
+"""Unit tests for medtagger/workers/conversion.py."""
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterator
+
+import numpy as np
+import pytest
+
+from medtagger.codecs import decode_slice, decode_volume
+from medtagger.database.models import Dataset
+from medtagger.definitions import SliceCodec
+from medtagger.types import SliceID, TilePosition
+from medtagger.workers import conversion
+
+
+@pytest.mark.parametrize('pool, codec', [('thread', SliceCodec.PNG), ('process', SliceCodec.RAW_ZLIB)])
+def test_convert_and_store_in_batches(mocker: Any, pool: str, codec: SliceCodec) -> None:
+    """Check if all Slices are converted in a pool with Dataset's codec and stored in batches."""
+    mocker.patch.object(conversion, 'CONVERSION_POOL', pool)
+    mocker.patch.object(conversion, 'STORE_BATCH_SIZE', 2)
+    repository = mocker.patch.object(conversion, 'SlicesRepository')
+    repository.store_converted_images.return_value = set()
+    slices_ids = [SliceID('SLICE_{}'.format(index)) for index in range(5)]
+    slices_pixels = np.arange(5 * 4 * 3, dtype=np.uint8).reshape(5, 4, 3)
+
+    dataset = Dataset('KIDNEYS', 'Kidneys', slices_codec=codec)
+
+    conversion._convert_and_store(slices_ids, slices_pixels, dataset)  # pylint: disable=protected-access
+
+    stored_batches = [call[0][0] for call in repository.store_converted_images.call_args_list]
+    assert [list(batch) for batch in stored_batches] == [['SLICE_0', 'SLICE_1'], ['SLICE_2', 'SLICE_3'], ['SLICE_4']]
+    assert all(call[0][1] == codec for call in repository.store_converted_images.call_args_list)
+    assert all(not call[0][2] for call in repository.store_converted_images.call_args_list)
+    for index, slice_id in enumerate(slices_ids):
+        image = stored_batches[index // 2][slice_id]
+        assert np.array_equal(decode_slice(image, codec, shape=(4, 3)), slices_pixels[index])
+    assert repository.mark_slices_as_processed.call_count == 3
+
+
+def test_convert_and_store_when_storage_fails(mocker: Any) -> None:
+    """Check if Slices are not marked as processed if their images could not be stored."""
+    repository = mocker.patch.object(conversion, 'SlicesRepository')
+    repository.store_converted_images.return_value = {'SLICE_0'}
+    slices_ids = [SliceID('SLICE_0')]
+    slices_pixels = np.zeros((1, 2, 2), dtype=np.uint8)
+    dataset = Dataset('KIDNEYS', 'Kidneys')
+
+    with pytest.raises(conversion.InternalErrorException):
+        conversion._convert_and_store(slices_ids, slices_pixels, dataset)  # pylint: disable=protected-access
+
+    repository.mark_slices_as_processed.assert_not_called()
+
+
+def test_convert_and_store_with_tiles(mocker: Any) -> None:
+    """Check if only Slices bigger than tile size are additionally stored as tiles."""
+    mocker.patch.object(conversion, 'TILE_SIZE', 3)
+    repository = mocker.patch.object(conversion, 'SlicesRepository')
+    repository.store_converted_images.return_value = set()
+    slices_ids = [SliceID('BIG'), SliceID('SMALL')]
+    slices_pixels = [np.arange(4 * 5, dtype=np.uint8).reshape(4, 5), np.zeros((3, 3), dtype=np.uint8)]
+    dataset = Dataset('KIDNEYS', 'Kidneys', slices_codec=SliceCodec.RAW_ZLIB)
+
+    conversion._convert_and_store(slices_ids, slices_pixels, dataset)  # pylint: disable=protected-access
+
+    images, codec, images_tiles, tile_size, images_previews = repository.store_converted_images.call_args[0]
+    assert list(images) == ['BIG', 'SMALL']
+    assert codec == SliceCodec.RAW_ZLIB
+    assert tile_size == 3
+    assert not images_previews
+    assert list(images_tiles) == ['BIG']
+    tiles = images_tiles['BIG']
+    assert list(tiles) == [TilePosition(0, 0), TilePosition(0, 1), TilePosition(1, 0), TilePosition(1, 1)]
+    tile = decode_slice(tiles[TilePosition(1, 1)], SliceCodec.RAW_ZLIB, shape=(1, 2))
+    assert np.array_equal(tile, slices_pixels[0][3:, 3:])
+
+
+def test_convert_and_store_with_previews(mocker: Any) -> None:
+    """Check if previews are stored only in resolutions lower than resolution of a Slice."""
+    mocker.patch.object(conversion.previews, 'RESOLUTIONS', [2, 4, 8])
+    repository = mocker.patch.object(conversion, 'SlicesRepository')
+    repository.store_converted_images.return_value = set()
+    slices_ids = [SliceID('BIG'), SliceID('SMALL')]
+    slices_pixels = [np.full((6, 3), 200, dtype=np.uint8), np.zeros((2, 2), dtype=np.uint8)]
+    dataset = Dataset('KIDNEYS', 'Kidneys', slices_codec=SliceCodec.RAW_ZLIB)
+
+    conversion._convert_and_store(slices_ids, slices_pixels, dataset)  # pylint: disable=protected-access
+
+    images_previews = repository.store_converted_images.call_args[0][4]
+    assert list(images_previews) == ['BIG']
+    assert sorted(images_previews['BIG']) == [2, 4]
+    preview = decode_slice(images_previews['BIG'][4], SliceCodec.RAW_ZLIB, shape=(4, 2))
+    assert np.array_equal(preview, np.full((4, 2), 200, dtype=np.uint8))
+
+
+def test_pack_and_store_volume(mocker: Any) -> None:
+    """Check if all Slices are packed into a single volume with their shape, spacing and order."""
+    stored_volumes: Dict[str, bytes] = {}
+    repository = mocker.patch.object(conversion, 'ScansRepository')
+    repository.store_packed_volume.side_effect = lambda scan_id, parts: stored_volumes.update({
+        scan_id: b''.join(parts),
+    })
+    mocker.patch.object(conversion, '_get_scan_voxel_size', return_value=(2.5, 0.5))
+    slices = [mocker.Mock(id=SliceID('SLICE_{}'.format(index))) for index in range(3)]
+    scan = mocker.Mock(id='SCAN')
+    slices_pixels = np.arange(3 * 4 * 2, dtype=np.uint8).reshape(3, 4, 2)
+
+    conversion._pack_and_store_volume(iter(slices_pixels), slices_pixels.shape,  # pylint: disable=protected-access
+                                      slices, scan)
+
+    header, volume = decode_volume(stored_volumes['SCAN'])
+    assert header == {'shape': [3, 4, 2], 'spacing': [2.5, 0.5, 0.5], 'slices_ids': ['SLICE_0', 'SLICE_1', 'SLICE_2']}
+    assert np.array_equal(volume, slices_pixels)
+
+
+def test_create_conversion_pool_with_unknown_pool(mocker: Any) -> None:
+    """Check if misconfigured conversion pool is reported."""
+    mocker.patch.object(conversion, 'CONVERSION_POOL', 'greenlet')
+
+    with pytest.raises(ValueError):
+        conversion._create_conversion_pool()  # pylint: disable=protected-access
+
+
+def test_map_lazily_with_bounded_number_of_pending_slices(mocker: Any) -> None:
+    """Check if Slices are consumed lazily and results are returned in order."""
+    mocker.patch.object(conversion, 'MAX_PENDING_SLICES', 3)
+    consumed_slices = []
+
+    def _slices_pixels() -> Iterator[np.ndarray]:
+        for index in range(10):
+            consumed_slices.append(index)
+            yield np.full((1, 1), index, dtype=np.uint8)
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        results = conversion._map_lazily(pool, bytes, _slices_pixels())  # pylint: disable=protected-access
+        assert next(results) == bytes([0])
+        assert len(consumed_slices) == 3
+        assert list(results) == [bytes([index]) for index in range(1, 10)]
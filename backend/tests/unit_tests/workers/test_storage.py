@@ -0,0 +1,55 @@
+"""Unit tests for medtagger/workers/storage.py."""
+from typing import Any
+
+import pytest
+
+from medtagger.types import ScanID
+from medtagger.workers import storage
+
+
+@pytest.fixture
+def parsing_task(mocker: Any) -> Any:
+    """Return mocked Celery task that parses uploaded Slices."""
+    return mocker.patch.object(storage, 'parse_dicoms_and_update_slices')
+
+
+@pytest.mark.parametrize('number_of_slices', [storage.SLICES_BATCH_SIZE, 2 * storage.SLICES_BATCH_SIZE, 180])
+def test_schedule_slices_parsing_for_full_batch(parsing_task: Any, number_of_slices: int) -> None:
+    """Check if Slices are parsed right away once batch is full or all Slices were uploaded."""
+    storage.schedule_slices_parsing(ScanID('SCAN_ID'), number_of_slices, declared_number_of_slices=180)
+
+    parsing_task.delay.assert_called_once_with('SCAN_ID')
+    parsing_task.apply_async.assert_not_called()
+
+
+def test_schedule_slices_parsing_for_first_slice_in_batch(parsing_task: Any) -> None:
+    """Check if first Slice in a batch schedules parsing after flush window."""
+    storage.schedule_slices_parsing(ScanID('SCAN_ID'), storage.SLICES_BATCH_SIZE + 1, declared_number_of_slices=180)
+
+    parsing_task.delay.assert_not_called()
+    parsing_task.apply_async.assert_called_once_with(args=['SCAN_ID'], countdown=storage.SLICES_FLUSH_WINDOW)
+
+
+def test_schedule_slices_parsing_in_the_middle_of_batch(parsing_task: Any) -> None:
+    """Check if Slices in the middle of a batch do not send any messages to the broker."""
+    storage.schedule_slices_parsing(ScanID('SCAN_ID'), storage.SLICES_BATCH_SIZE + 2, declared_number_of_slices=180)
+
+    parsing_task.delay.assert_not_called()
+    parsing_task.apply_async.assert_not_called()
+
+
+def test_parse_dicoms_and_update_slices_with_invalid_files(mocker: Any) -> None:
+    """Check if locked Slices are updated and invalid ones are removed within a single transaction."""
+    transaction = mocker.patch.object(storage, 'db_transaction_session')
+    repository = mocker.patch.object(storage, 'SlicesRepository')
+    repository.get_new_slices_ids_for_update.return_value = ['VALID', 'INVALID', 'NOT_UPLOADED']
+    repository.get_slices_original_images.return_value = {'VALID': b'DICOM', 'INVALID': b'TEXT'}
+    metadata = mocker.Mock()
+    mocker.patch.object(storage, 'read_slice_metadata', side_effect=[metadata, storage.InvalidDicomException()])
+    mocker.patch.object(storage, 'trigger_scan_conversion_if_needed')
+
+    storage.parse_dicoms_and_update_slices(ScanID('SCAN_ID'))
+
+    assert transaction.call_count == 1
+    repository.update_parsed_slices.assert_called_once_with('SCAN_ID', {'VALID': metadata}, {'INVALID'})
+    repository.delete_original_images.assert_called_once_with({'INVALID'})